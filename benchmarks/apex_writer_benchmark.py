@@ -0,0 +1,109 @@
+"""
+Benchmark de la sauvegarde APEX d'une analyse de soumission (review_ia.py).
+
+Un serveur HTTP local joue les endpoints ORDS (latence configurable, chaque
+POST renvoie un identifiant). La même sauvegarde est rejouée avec un seul
+POST en vol, comme l'ancienne boucle séquentielle, puis avec le pipeline
+borné d'ApexWriter.
+
+    python benchmarks/apex_writer_benchmark.py --latency-ms 60 --errors 8 --chapters 6
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from features.common.apex_writer import APEX_WRITE_CONCURRENCY, ApexWriter  # noqa: E402
+from features.cours_management.agents.review_ia import CorrectedPedagogicalAgent  # noqa: E402
+
+_ID_KEYS = {"review_roadmap": "roadmap_id", "weakness_point": "weakness_id", "practice_quiz": "quiz_id"}
+
+
+def _stub(latency: float):
+    ids = itertools.count(1)
+    posts = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            endpoint = self.path.strip("/")
+            posts.append(endpoint)
+            body = json.dumps({_ID_KEYS.get(endpoint, "id"): next(ids)}).encode()
+            self.send_response(201)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler, posts
+
+
+def _submission(errors: int, chapters: int) -> dict:
+    topics = ["deep learning", "neural network", "convolutional", "recurrent", "training"]
+    return {
+        "submission_id": 1, "student_id": 1, "score": 40,
+        "course": {"course_id": 1, "course_title": "Deep Learning", "chapters": [
+            {"chapter_id": c + 1, "chapter_title": f"Chapitre {c + 1} {topics[c % len(topics)]}",
+             "contents": [{"content": f"<p>{topics[c % len(topics)]} model training data</p>"}]}
+            for c in range(chapters)]},
+        "responses": [{"question_text": f"Question {topics[i % len(topics)]} {i}", "is_correct": "N"}
+                      for i in range(errors)],
+    }
+
+
+async def _save(agent: CorrectedPedagogicalAgent, submission: dict) -> float:
+    analysis = await agent._quick_concept_analysis(submission)
+    summaries = await agent._generate_fast_summaries(submission)
+    roadmap = await agent._create_efficient_roadmap(submission, analysis)
+    quizzes = await agent._generate_unique_quizzes(submission)
+    start = time.perf_counter()
+    await agent._save_to_apex_corrected(submission, analysis, summaries, roadmap, quizzes)
+    return time.perf_counter() - start
+
+
+async def _run(base: str, concurrency: int, submission: dict) -> float:
+    agent = CorrectedPedagogicalAgent("unused")
+    endpoints = {name: f"{base}/{name}/" for name in agent.apex_endpoints}
+    async with ApexWriter(endpoints, concurrency=concurrency) as writer:
+        agent.writer = writer
+        return await _save(agent, submission)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=60.0, help="latence simulée d'un POST APEX")
+    parser.add_argument("--errors", type=int, default=8, help="réponses fausses de la soumission")
+    parser.add_argument("--chapters", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=APEX_WRITE_CONCURRENCY)
+    args = parser.parse_args()
+
+    handler, posts = _stub(args.latency_ms / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    submission = _submission(args.errors, args.chapters)
+
+    print(f"POST à {args.latency_ms:.0f} ms, {args.errors} erreurs, {args.chapters} chapitres")
+    print(f"{'mode':<22}{'POST':>6}{'durée s':>9}")
+    for label, concurrency in (("séquentiel", 1), (f"pipeline {args.concurrency}", args.concurrency)):
+        posts.clear()
+        seconds = asyncio.run(_run(base, concurrency, submission))
+        print(f"{label:<22}{len(posts):>6}{seconds:>9.2f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark du planificateur de rappels.
+
+Planifie N rappels (100 000 par défaut) répartis sur quelques secondes, puis
+mesure la mémoire occupée (tracemalloc) et la précision de déclenchement
+(retard entre échéance et envoi). `--baseline` mesure aussi l'ancienne
+approche, une tâche asyncio endormie par rappel.
+
+    python benchmarks/reminder_scheduler_benchmark.py --count 100000 --spread 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from features.common.reminder_scheduler import ReminderScheduler  # noqa: E402
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+async def _bench_scheduler(count: int, spread: float, lead: float) -> dict:
+    lateness = []
+    done = asyncio.Event()
+
+    async def deliver(reminder):
+        lateness.append(time.time() - reminder.due)
+        if len(lateness) == count:
+            done.set()
+        return True
+
+    scheduler = ReminderScheduler(deliver=deliver)
+    await scheduler.start()
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    start = time.time() + lead
+    for i in range(count):
+        scheduler.schedule(user_id=i % 5000, session_id=i, when=start + spread * i / count)
+    schedule_time = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    await asyncio.wait_for(done.wait(), timeout=lead + spread + 60)
+    await scheduler.stop()
+    return {"schedule_s": schedule_time, "memory": memory, "lateness": lateness}
+
+
+async def _bench_sleeping_tasks(count: int, spread: float, lead: float) -> dict:
+    lateness = []
+    done = asyncio.Event()
+
+    async def remind(due):
+        await asyncio.sleep(due - time.time())
+        lateness.append(time.time() - due)
+        if len(lateness) == count:
+            done.set()
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    start = time.time() + lead
+    tasks = [asyncio.create_task(remind(start + spread * i / count)) for i in range(count)]
+    schedule_time = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    await asyncio.wait_for(done.wait(), timeout=lead + spread + 60)
+    await asyncio.gather(*tasks)
+    return {"schedule_s": schedule_time, "memory": memory, "lateness": lateness}
+
+
+def _report(name: str, count: int, r: dict) -> None:
+    lat = r["lateness"]
+    print(f"{name:<16}{r['schedule_s']:>10.2f}{r['memory'] / 1e6:>10.1f}{r['memory'] / count:>9.0f}"
+          f"{statistics.median(lat) * 1e3:>9.1f}{_percentile(lat, 0.99) * 1e3:>9.1f}{max(lat) * 1e3:>9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--spread", type=float, default=5.0, help="fenêtre des échéances (s)")
+    parser.add_argument("--lead", type=float, default=2.0, help="délai avant la première échéance (s)")
+    parser.add_argument("--baseline", action="store_true", help="compare avec une tâche endormie par rappel")
+    args = parser.parse_args()
+
+    print(f"{args.count} rappels sur {args.spread:.0f}s")
+    print(f"{'approche':<16}{'planif s':>10}{'mém. MB':>10}{'o/rappel':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    _report("tas + minuterie", args.count, asyncio.run(_bench_scheduler(args.count, args.spread, args.lead)))
+    if args.baseline:
+        _report("tâche/rappel", args.count, asyncio.run(_bench_sleeping_tasks(args.count, args.spread, args.lead)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark de la tâche Web Push (features/common/send_reminders.py).
+
+Un serveur HTTP local joue à la fois APEX (liste paginée des rappels, PUT
+d'état, endpoint groupé) et le service de push (latence configurable, une
+part d'abonnements expirés et, en option, d'endpoints indisponibles en 503). La même charge est exécutée en série (1 worker)
+puis avec le pool, pour comparer le débit.
+
+    python benchmarks/send_reminders_benchmark.py --count 2000 --latency-ms 40
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import requests  # noqa: E402
+
+from features.common import send_reminders  # noqa: E402
+
+
+class _Stub:
+    def __init__(self, count: int, latency: float, expired_every: int, unavailable_every: int = 0):
+        due = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+        self.latency = latency
+        self.reminders = [{
+            "ID": i, "SESSION_ID": i % 50, "STATUS": "active", "REMINDER_TIME": due,
+            "PUSH_ENDPOINT": f"/push/{_kind(i, expired_every, unavailable_every)}/{i}",
+            "PUSH_P256DH": "stub", "PUSH_AUTH": "stub",
+        } for i in range(count)]
+        self.status_writes = 0
+        self.lock = threading.Lock()
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, code: int, body=None):
+                data = json.dumps(body or {}).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                qs = parse_qs(urlparse(self.path).query)
+                limit, offset = int(qs["limit"][0]), int(qs["offset"][0])
+                items = stub.reminders[offset:offset + limit]
+                self._reply(200, {"items": items, "hasMore": offset + limit < len(stub.reminders)})
+
+            def do_PUT(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub.lock:
+                    stub.status_writes += 1
+                self._reply(200)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.startswith("/push/"):
+                    time.sleep(stub.latency)
+                    self._reply(410 if "/gone/" in self.path else 503 if "/down/" in self.path else 201)
+                    return
+                with stub.lock:
+                    stub.status_writes += len(json.loads(body)["items"])
+                self._reply(200)
+
+        return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256     # la file par défaut (5) fait échouer les connexions du pool
+
+
+def _kind(i: int, expired_every: int, unavailable_every: int) -> str:
+    if expired_every and i % expired_every == 0:
+        return "gone"
+    if unavailable_every and i % unavailable_every == 1:
+        return "down"
+    return "ok"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="latence simulée du service de push")
+    parser.add_argument("--expired-every", type=int, default=20, help="un abonnement expiré tous les N")
+    parser.add_argument("--unavailable-every", type=int, default=0,
+                        help="un endpoint en 503 tous les N (reste actif après les relances)")
+    parser.add_argument("--workers", type=int, default=send_reminders.PUSH_WORKERS)
+    args = parser.parse_args()
+
+    stub = _Stub(args.count, args.latency_ms / 1000, args.expired_every, args.unavailable_every)
+    server = _Server(("127.0.0.1", 0), stub.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.workers)
+    http.mount("http://", adapter)
+
+    def sender(subscription, message):
+        resp = http.post(base + subscription["endpoint"], data=message.encode(), timeout=10)
+        if resp.status_code >= 400:
+            raise send_reminders.WebPushException(f"push {resp.status_code}", response=resp)
+
+    print(f"{args.count} rappels, push à {args.latency_ms:.0f} ms")
+    print(f"{'mode':<22}{'durée s':>9}{'push/s':>9}{'sent':>7}{'expired':>9}{'failed':>8}{'retry':>7}{'états':>7}")
+    for label, workers, batch_url in (("série, PUT unitaires", 1, None),
+                                      (f"pool {args.workers}, PUT", args.workers, None),
+                                      (f"pool {args.workers}, lots", args.workers, base + "/batch")):
+        stub.status_writes = 0
+        r = send_reminders.run(sender=sender, workers=workers, url=base + "/reminders/", batch_url=batch_url)
+        print(f"{label:<22}{r['seconds']:>9.2f}{args.count / r['seconds']:>9.0f}"
+              f"{r['sent']:>7}{r['expired']:>9}{r['failed']:>8}{r['retry']:>7}{stub.status_writes:>7}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark du démarrage à froid de l'application.
+
+Chaque mesure se fait dans un processus neuf : temps d'import de `main`
+(ce que paie uvicorn avant d'accepter la première requête), puis temps de
+construction des services restants (préchauffage). Le mode « eager »
+(SERVICES_EAGER=1) reproduit l'ancienne construction à l'import.
+
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from infrastructure.service_container import services
+services.warm_up()
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "warm_up": t2 - t1, "services": services.status()}))
+"""
+
+
+def _probe(eager: bool) -> dict:
+    env = {**os.environ, "SERVICES_EAGER": "1" if eager else "0"}
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--details", action="store_true", help="durée de construction par service")
+    args = parser.parse_args()
+
+    report = {}
+    for mode, eager in (("eager", True), ("lazy", False)):
+        samples = [_probe(eager) for _ in range(args.runs)]
+        report[mode] = {
+            "import": statistics.median(s["import"] for s in samples),
+            "warm_up": statistics.median(s["warm_up"] for s in samples),
+        }
+        if args.details:
+            report[mode]["services"] = samples[-1]["services"]
+
+    print(f"{'mode':<8}{'import (s)':>12}{'préchauffage (s)':>18}")
+    for mode, r in report.items():
+        print(f"{mode:<8}{r['import']:>12.2f}{r['warm_up']:>18.2f}")
+    gain = report["eager"]["import"] - report["lazy"]["import"]
+    print(f"\nDémarrage à froid réduit de {gain:.2f}s "
+          f"({gain / report['eager']['import']:.0%}) sur {args.runs} exécutions (médiane)")
+    if args.details:
+        print(json.dumps({m: r["services"] for m, r in report.items()}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from datetime import datetime
 from langchain_core.tools import Tool
 from features.chatbot.agents.chatbot_agent import ChatbotAgent
+from infrastructure.llm_rate_limiter import LLMBackpressureError
 
 
 class ChatbotTools:
@@ -29,6 +30,8 @@ class ChatbotTools:
                 return "❌ Mauvais format pour le message."
 
             return self.chatbot_agent.get_response(message)
+        except LLMBackpressureError:
+            raise
         except Exception as e:
             return f"❌ Erreur dans handle_chat: {str(e)}"
 
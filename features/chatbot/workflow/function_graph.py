@@ -5,7 +5,7 @@ from typing import List, TypedDict, Annotated
 
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.tools import Tool
@@ -53,7 +53,7 @@ TOOLS = [
 
 
 # LLM + agent -----------------------------------------------------------------
-llm = ChatGroq(model_name="llama3-8b-8192", temperature=0)
+llm = get_llm("llama3-8b-8192", temperature=0)
 agent = create_openai_functions_agent(llm, TOOLS)
 executor = AgentExecutor(agent=agent, tools=TOOLS, verbose=True)
 
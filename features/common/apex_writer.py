@@ -0,0 +1,143 @@
+"""
+Écritures vers les services REST Oracle APEX (ORDS) depuis la boucle asyncio.
+
+Une seule session aiohttp (connexions réutilisées) et un sémaphore bornent le
+nombre de POST en vol ; les écritures sans dépendance partent ensemble, celles
+qui ont besoin de l'identifiant d'un parent (étapes d'un roadmap, options d'un
+quiz…) attendent uniquement ce parent, via `post_then`.
+
+Un POST n'est relancé que si APEX ne l'a vraisemblablement pas traité : erreur
+de connexion, délai dépassé, 429, 502, 503 ou 504. Un 500 peut avoir créé la
+ligne, il n'est donc pas rejoué.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+import aiohttp
+
+_LOG = logging.getLogger(__name__)
+
+APEX_WRITE_CONCURRENCY = int(os.getenv("APEX_WRITE_CONCURRENCY", "8"))
+APEX_WRITE_RETRIES = 2
+APEX_WRITE_BACKOFF = 0.3     # secondes, doublé à chaque tentative
+APEX_WRITE_TIMEOUT = 30
+
+_RETRYABLE = {429, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json",
+    "Content-Type": "application/json; charset=utf-8",
+}
+
+
+class ApexWriter:
+    """
+    Pipeline d'écriture partagé, à utiliser comme contexte asynchrone :
+
+        async with ApexWriter(endpoints) as writer:
+            await writer.post_then("review_roadmap", data, "roadmap_id",
+                                   lambda rid: [writer.post("roadmap_step", {...})])
+
+    Un même writer peut servir à plusieurs analyses concurrentes : la limite de
+    parallélisme est alors globale.
+    """
+
+    def __init__(self, endpoints: Dict[str, str], headers: Optional[Dict[str, str]] = None,
+                 concurrency: int = APEX_WRITE_CONCURRENCY, retries: int = APEX_WRITE_RETRIES,
+                 backoff: float = APEX_WRITE_BACKOFF, timeout: float = APEX_WRITE_TIMEOUT):
+        self.endpoints = endpoints
+        self.headers = dict(headers or DEFAULT_HEADERS)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self._posts = 0
+        self._retried = 0
+        self._failed = 0
+        self._busy = 0.0
+
+    # ───────────────────── PUBLIC
+    async def __aenter__(self) -> "ApexWriter":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                                 timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def post(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST vers l'endpoint nommé.
+
+        Returns:
+            Corps JSON de la réponse, {"success": True} si elle n'en a pas,
+            {} en cas d'échec (journalisé, jamais levé)
+        """
+        url = self.endpoints[endpoint]
+        async with self._slots:
+            start = time.perf_counter()
+            try:
+                return await self._post_with_retry(endpoint, url, data)
+            finally:
+                self._posts += 1
+                self._busy += time.perf_counter() - start
+
+    async def post_then(self, endpoint: str, data: Dict[str, Any], id_key: str,
+                        children: Callable[[Any], Iterable[Awaitable]]) -> Any:
+        """
+        Crée le parent puis lance en parallèle les écritures qui dépendent de
+        son identifiant (`children(parent_id)`). Sans identifiant en retour,
+        les enfants ne sont pas écrits.
+
+        Returns:
+            L'identifiant du parent, ou None
+        """
+        parent_id = (await self.post(endpoint, data)).get(id_key)
+        if parent_id is not None:
+            await asyncio.gather(*children(parent_id))
+        return parent_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {"posts": self._posts, "retried": self._retried, "failed": self._failed,
+                "mean_ms": round(1000 * self._busy / self._posts, 1) if self._posts else 0.0}
+
+    # ───────────────────── INTERNAL
+    async def _post_with_retry(self, endpoint: str, url: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                async with self.session.post(url, json=data) as response:
+                    if response.status in (200, 201):
+                        try:
+                            return await response.json(content_type=None) or {"success": True}
+                        except ValueError:
+                            return {"success": True}
+                    error_text = await response.text()
+                    if response.status not in _RETRYABLE or last:
+                        _LOG.warning("Erreur APEX %s: %s - %s", endpoint, response.status, error_text[:200])
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if last:
+                    _LOG.warning("Exception APEX %s: %s", endpoint, e or type(e).__name__)
+                    break
+            self._retried += 1
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+        self._failed += 1
+        return {}
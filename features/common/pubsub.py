@@ -0,0 +1,247 @@
+"""
+Bus de publication entre workers uvicorn.
+Les sockets WebSocket vivent dans le processus qui les a acceptées : pour
+qu'un message publié par n'importe quel worker atteigne l'utilisateur, le
+hub le livre localement puis le publie sur le bus, que les autres workers
+relaient à leurs propres connexions. Le bus tient aussi la présence (qui a
+une connexion ouverte, tous workers confondus) et de courts baux pour les
+tâches à n'exécuter qu'une fois (chargement des rappels). Un bail est
+renouvelé en le réclamant à nouveau, rendu par `release` ou à l'arrêt du
+worker, et repris par un autre dès que son titulaire n'émet plus de
+battement.
+
+Backends (PUBSUB_BACKEND) :
+- `memory` : un seul processus, aucune écriture (par défaut) ;
+- `sqlite` : fichier partagé en WAL (PUBSUB_PATH), interrogé toutes les
+  PUBSUB_POLL_MS millisecondes ; suffisant pour plusieurs workers d'une même
+  machine, sans broker à déployer.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_LOG = logging.getLogger(__name__)
+
+_BACKEND = os.getenv("PUBSUB_BACKEND", "memory").lower()
+_PATH = os.getenv("PUBSUB_PATH", "pubsub.db")
+_POLL_INTERVAL = int(os.getenv("PUBSUB_POLL_MS", "50")) / 1000
+_MESSAGE_TTL = 60.0        # messages plus anciens purgés
+_WORKER_TTL = 15.0         # worker sans battement depuis ce délai : sa présence est ignorée
+_HOUSEKEEPING_EVERY = 5.0
+_BATCH = 500
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+class InProcessBus:
+    """Un seul worker : la livraison locale du hub suffit, la présence reste en mémoire."""
+
+    distributed = False
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._presence: Dict[Tuple[str, str], int] = {}
+
+    async def start(self, handler: Handler) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        pass
+
+    def set_presence(self, user_id: str, channel: str, count: int) -> None:
+        self._presence[(user_id, channel)] = count
+
+    async def online(self, user_id: str, channel: str) -> bool:
+        return self._presence.get((user_id, channel), 0) > 0
+
+    async def claim(self, name: str, ttl: float) -> bool:
+        return True
+
+    async def release(self, name: str) -> None:
+        pass
+
+
+class SQLiteBus:
+    """
+    Bus adossé à un fichier SQLite partagé par les workers d'une machine.
+    Toutes les opérations passent par un thread dédié : la boucle d'événements
+    n'attend jamais le disque, et la connexion n'est utilisée que par lui.
+    """
+
+    distributed = True
+
+    def __init__(self, path: str = _PATH, poll_interval: float = _POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pubsub")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+
+    # ───────────────────── PUBLIC
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        await self._run(self._open)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_loop(), name="pubsub-poll")
+        _LOG.info("Bus pub/sub SQLite %s (worker %s)", self.path, self.worker_id)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._run(self._close)
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        """Publication sans attente (écriture dans le thread du bus)."""
+        body = json.dumps(message, ensure_ascii=False, default=str)
+        self._executor.submit(self._write, "INSERT INTO messages (origin, body, created) VALUES (?, ?, ?)",
+                              (self.worker_id, body, time.time()))
+
+    def set_presence(self, user_id: str, channel: str, count: int) -> None:
+        if count > 0:
+            sql, args = ("INSERT OR REPLACE INTO presence (user_id, channel, worker, count) VALUES (?, ?, ?, ?)",
+                         (user_id, channel, self.worker_id, count))
+        else:
+            sql, args = ("DELETE FROM presence WHERE user_id = ? AND channel = ? AND worker = ?",
+                         (user_id, channel, self.worker_id))
+        self._executor.submit(self._write, sql, args)
+
+    async def online(self, user_id: str, channel: str) -> bool:
+        """L'utilisateur a une connexion ouverte sur ce canal, dans un worker vivant."""
+        row = await self._run(self._read_one,
+                              """SELECT 1 FROM presence p JOIN workers w ON w.worker = p.worker
+                                 WHERE p.user_id = ? AND p.channel = ? AND p.count > 0 AND w.seen > ?
+                                 LIMIT 1""",
+                              (user_id, channel, time.time() - _WORKER_TTL))
+        return row is not None
+
+    async def claim(self, name: str, ttl: float) -> bool:
+        """
+        Bail exclusif `name` pour `ttl` secondes ; True si ce worker l'obtient
+        ou le détient déjà (le bail est alors prolongé). Le bail d'un worker
+        sans battement depuis _WORKER_TTL est libre.
+        """
+        return await self._run(self._claim, name, ttl)
+
+    async def release(self, name: str) -> None:
+        """Rend le bail s'il appartient à ce worker."""
+        await self._run(self._write, "DELETE FROM leases WHERE name = ? AND worker = ?", (name, self.worker_id))
+
+    # ───────────────────── INTERNAL (thread du bus)
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _open(self) -> None:
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                 origin TEXT NOT NULL, body TEXT NOT NULL, created REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS presence (user_id TEXT NOT NULL, channel TEXT NOT NULL,
+                                                 worker TEXT NOT NULL, count INTEGER NOT NULL,
+                                                 PRIMARY KEY (user_id, channel, worker));
+            CREATE TABLE IF NOT EXISTS workers  (worker TEXT PRIMARY KEY, seen REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS leases   (name TEXT PRIMARY KEY, worker TEXT NOT NULL, expires REAL NOT NULL);
+        """)
+        self._conn = conn
+        # seuls les messages publiés après le démarrage de ce worker le concernent
+        self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        self._housekeeping()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM presence WHERE worker = ?", (self.worker_id,))
+            self._conn.execute("DELETE FROM leases WHERE worker = ?", (self.worker_id,))
+            self._conn.execute("DELETE FROM workers WHERE worker = ?", (self.worker_id,))
+            self._conn.close()
+            self._conn = None
+
+    def _write(self, sql: str, args: tuple) -> None:
+        try:
+            self._conn.execute(sql, args)
+        except Exception as e:
+            _LOG.warning("Bus pub/sub : écriture impossible (%s)", e)
+
+    def _read_one(self, sql: str, args: tuple):
+        return self._conn.execute(sql, args).fetchone()
+
+    def _fetch(self) -> list:
+        rows = self._conn.execute(
+            "SELECT id, origin, body FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+            (self._last_id, _BATCH)).fetchall()
+        if rows:
+            self._last_id = rows[-1][0]
+        return [json.loads(body) for _, origin, body in rows if origin != self.worker_id]
+
+    def _housekeeping(self) -> None:
+        now = time.time()
+        self._conn.execute("INSERT OR REPLACE INTO workers (worker, seen) VALUES (?, ?)", (self.worker_id, now))
+        self._conn.execute("DELETE FROM messages WHERE created < ?", (now - _MESSAGE_TTL,))
+        dead = "SELECT worker FROM workers WHERE seen < ?"
+        self._conn.execute(f"DELETE FROM presence WHERE worker IN ({dead})", (now - 4 * _WORKER_TTL,))
+        self._conn.execute("DELETE FROM workers WHERE seen < ?", (now - 4 * _WORKER_TTL,))
+        self._conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+
+    def _claim(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                """SELECT l.worker, l.expires, w.seen FROM leases l LEFT JOIN workers w ON w.worker = l.worker
+                   WHERE l.name = ?""", (name,)).fetchone()
+            if row and row[0] != self.worker_id and row[1] > now and (row[2] or 0) > now - _WORKER_TTL:
+                return False
+            self._conn.execute("INSERT OR REPLACE INTO leases (name, worker, expires) VALUES (?, ?, ?)",
+                               (name, self.worker_id, now + ttl))
+            return True
+        finally:
+            self._conn.execute("COMMIT")
+
+    # ───────────────────── INTERNAL (boucle)
+    async def _poll_loop(self) -> None:
+        last_housekeeping = time.monotonic()
+        while True:
+            try:
+                for message in await self._run(self._fetch):
+                    result = self._handler(message)
+                    if inspect.isawaitable(result):
+                        await result
+                if time.monotonic() - last_housekeeping >= _HOUSEKEEPING_EVERY:
+                    await self._run(self._housekeeping)
+                    last_housekeeping = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _LOG.warning("Bus pub/sub : lecture impossible (%s)", e)
+            await asyncio.sleep(self.poll_interval)
+
+
+def create_bus(backend: str = _BACKEND):
+    """Backend configuré par PUBSUB_BACKEND (`memory` ou `sqlite`)."""
+    if backend == "sqlite":
+        return SQLiteBus()
+    if backend not in {"memory", "", "inprocess"}:
+        _LOG.warning("PUBSUB_BACKEND=%s inconnu, bus en mémoire", backend)
+    return InProcessBus()
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import APIRouter, WebSocket
 from datetime import datetime, timezone
 import asyncio
 import httpx
 
+from features.common.reminder_scheduler import ReminderScheduler, Reminder
+from features.common.websocket_manager import hub, REMINDER
+
 router = APIRouter()
-clients = {}  # user_id → WebSocket
 
 ORACLE_REMINDER_API = "https://apex.oracle.com/pls/apex/naxxum/reminders/"
 HEADERS = {
@@ -12,20 +14,71 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0"
 }
 
-# ─────────── WebSocket: Connexion client ───────────
+# ─────────── WebSocket: Connexion client (plusieurs onglets par utilisateur) ───────────
 @router.websocket("/ws/reminder/{user_id}")
 async def reminder_ws(websocket: WebSocket, user_id: int):
-    await websocket.accept()
-    clients[user_id] = websocket
+    conn = await hub.connect(websocket, user_id, channel=REMINDER, as_json=True)
+    await hub.serve(conn)
+
+# ─────────── Planificateur (une minuterie pour tous les rappels) ───────────
+async def _deliver(reminder: Reminder):
+    # après une reprise du bail, un rappel peut être planifié dans deux workers : un seul l'envoie
+    if not str(reminder.reminder_id).startswith("local-") and \
+            not await hub.bus.claim(f"reminder:{reminder.reminder_id}", _SENT_LEASE_SECONDS):
+        return None
+    return await send_reminder(reminder.user_id, f"⏰ Your session {reminder.session_id} is about to start!")
+
+async def _persist(reminder: Reminder, status: str) -> None:
+    async with httpx.AsyncClient(timeout=10) as client:
+        resp = await client.put(f"{ORACLE_REMINDER_API}{reminder.reminder_id}",
+                                json={"status": status}, headers=HEADERS)
+        resp.raise_for_status()
+
+scheduler = ReminderScheduler(deliver=_deliver, persist=_persist)
+
+_LOAD_LEASE = "reminders:load"
+_LOAD_LEASE_SECONDS = 30      # sans renouvellement, un autre worker reprend le chargement
+_LEASE_RENEW_SECONDS = 10
+_SENT_LEASE_SECONDS = 3600
+
+async def load_reminders() -> None:
+    """
+    Chargement de tous les rappels actifs (paginé, hors chemin critique).
+    Avec plusieurs workers, un seul les charge (bail sur le bus) : les autres
+    n'envoient que les rappels créés chez eux. Le titulaire renouvelle le bail
+    tant qu'il vit ; s'il s'arrête ou ne bat plus, un autre le reprend et
+    recharge les rappels. Tourne jusqu'à l'arrêt de l'application.
+    """
+    leader = False
+    while True:
+        try:
+            owned = await hub.bus.claim(_LOAD_LEASE, _LOAD_LEASE_SECONDS)
+        except Exception as e:
+            print(f"🔥 Reminder lease unavailable: {str(e)}")
+            owned = False
+        if owned and not leader:
+            print("🔁 Loading reminders from Oracle APEX...")
+            try:
+                count = await scheduler.load_from_apex(ORACLE_REMINDER_API, headers=HEADERS)
+                print(f"⏳ {count} reminders scheduled")
+                leader = True
+            except Exception as e:
+                print(f"🔥 Error loading reminders: {str(e)}")  # nouvel essai au prochain tour
+        elif leader and not owned:
+            print("🔁 Reminder lease taken over by another worker")
+            leader = False
+        await asyncio.sleep(_LEASE_RENEW_SECONDS)
+
+async def release_reminders() -> None:
+    """À l'arrêt : rend le bail pour qu'un worker redémarré recharge aussitôt les rappels."""
     try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        clients.pop(user_id, None)
+        await hub.bus.release(_LOAD_LEASE)
+    except Exception as e:
+        print(f"🔥 Reminder lease release failed: {str(e)}")
 
 # ─────────── Rappel planifié et persisté ───────────
 @router.post("/reminders/")
-async def create_reminder(data: dict, background_tasks: BackgroundTasks):
+async def create_reminder(data: dict):
     user_id = data["user_id"]
     session_id = data["session_id"]
     reminder_time = datetime.fromisoformat(data["reminder_time"])
@@ -37,38 +90,34 @@ async def create_reminder(data: dict, background_tasks: BackgroundTasks):
     if reminder_time.tzinfo is None:
         reminder_time = reminder_time.replace(tzinfo=timezone.utc)
 
-    now = datetime.now(timezone.utc)
-    delay = (reminder_time - now).total_seconds()
-
-    # Sauvegarder dans Oracle APEX
+    # Sauvegarder dans Oracle APEX (l'identifiant créé sert aux transitions d'état)
     async with httpx.AsyncClient() as client:
-        await client.post(ORACLE_REMINDER_API, json=data, headers=HEADERS)
+        resp = await client.post(ORACLE_REMINDER_API, json=data, headers=HEADERS)
+    try:
+        reminder_id = {k.lower(): v for k, v in resp.json().items()}.get("id")
+    except Exception:
+        reminder_id = None
 
-    if delay > 0:
-        background_tasks.add_task(schedule_reminder, user_id, session_id, delay)
-    else:
-        background_tasks.add_task(send_reminder, user_id, f"⚠️ Session {session_id} is starting now!")
+    # échéance passée : le planificateur l'envoie immédiatement
+    scheduler.schedule(user_id, session_id, reminder_time, reminder_id=reminder_id)
 
     return {"status": "Reminder scheduled", "user_id": user_id, "session_id": session_id}
 
+@router.get("/reminders/scheduler")
+async def reminder_scheduler_status():
+    return scheduler.stats()
+
 # ─────────── Tâche planifiée asynchrone ───────────
 async def schedule_reminder(user_id: int, session_id: int, delay: float):
-    await asyncio.sleep(delay)
-    await send_reminder(user_id, f"⏰ Your session {session_id} is about to start!")
+    """Compatibilité : planifie via la minuterie commune plutôt qu'une tâche endormie."""
+    scheduler.schedule(user_id, session_id, datetime.now(timezone.utc).timestamp() + delay)
 
 # ─────────── Notification temps réel + fallback ───────────
-async def send_reminder(user_id: int, message: str):
-    ws = clients.get(user_id)
-    if ws:
-        print(f"[📢] Sending reminder to user {user_id}: {message}")
-        await ws.send_json({"type": "reminder", "message": message})
-    else:
-        print(f"[❌] WebSocket inactive. Logging reminder for user {user_id}")
-        # Fallback: log as missed in Oracle APEX
-        async with httpx.AsyncClient() as client:
-            await client.post(ORACLE_REMINDER_API, json={
-                "user_id": user_id,
-                "session_id": 0,
-                "reminder_time": datetime.now(timezone.utc).isoformat(),
-                "status": "missed"
-            }, headers=HEADERS)
+async def send_reminder(user_id: int, message: str) -> bool:
+    # présence vue par tous les workers : la socket peut être ouverte sur un autre
+    if not await hub.online(user_id, REMINDER):
+        print(f"[❌] WebSocket inactive. Reminder for user {user_id} marked as missed")
+        return False
+    hub.publish(user_id, {"type": "reminder", "message": message}, channel=REMINDER, droppable=False)
+    print(f"[📢] Sending reminder to user {user_id}: {message}")
+    return True
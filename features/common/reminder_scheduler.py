@@ -0,0 +1,235 @@
+"""
+Planificateur de rappels de sessions live.
+Une seule boucle de minuterie sur un tas binaire des échéances remplace la
+tâche asyncio endormie par rappel : la mémoire par rappel se limite à une
+entrée de tas et un petit objet, et la boucle se réveille à la prochaine
+échéance (ou plus tôt si un rappel plus proche est ajouté). Les rappels
+actifs sont chargés page par page depuis Oracle APEX au démarrage et chaque
+transition d'état (sent, missed) y est persistée hors de la boucle.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import httpx
+
+_LOG = logging.getLogger(__name__)
+
+ACTIVE, SENT, MISSED, CANCELLED = "active", "sent", "missed", "cancelled"
+
+_MAX_SLEEP = 30.0        # réveil périodique, borne les dérives d'horloge murale
+_PAGE_SIZE = 500         # taille des pages APEX (ORDS : limit/offset, hasMore)
+_PERSIST_CONCURRENCY = 8
+_COMPACT_RATIO = 0.5     # reconstruit le tas quand la moitié des entrées est annulée
+_FIRE_BATCH = 1_000      # échéances traitées avant de rendre la main à la boucle
+
+
+class Reminder:
+    """Rappel planifié (échéance en secondes epoch UTC)."""
+
+    __slots__ = ("reminder_id", "user_id", "session_id", "due", "status")
+
+    def __init__(self, reminder_id: Any, user_id: Any, session_id: Any, due: float, status: str = ACTIVE):
+        self.reminder_id = reminder_id
+        self.user_id = user_id
+        self.session_id = session_id
+        self.due = due
+        self.status = status
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.reminder_id,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "reminder_time": datetime.fromtimestamp(self.due, timezone.utc).isoformat(),
+            "status": self.status,
+        }
+
+
+def _timestamp(when: Union[datetime, str, float, int]) -> float:
+    """Échéance en secondes epoch ; une date sans fuseau est lue en UTC."""
+    if isinstance(when, (int, float)):
+        return float(when)
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when.replace("Z", "+00:00"))
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+class ReminderScheduler:
+    """
+    Minuterie unique sur un tas (échéance, séquence, identifiant).
+
+    Args:
+        deliver: Coroutine d'envoi d'un rappel ; retourne True s'il a été remis, False s'il
+            est manqué, None s'il est pris en charge ailleurs (aucune transition)
+        persist: Coroutine de persistance d'une transition (rappel, nouvel état), optionnelle
+        grace_seconds: Au chargement, un rappel échu depuis moins longtemps part encore
+    """
+
+    def __init__(self, deliver: Callable[[Reminder], Awaitable[bool]],
+                 persist: Optional[Callable[[Reminder, str], Awaitable[None]]] = None,
+                 grace_seconds: float = 300.0):
+        self.deliver = deliver
+        self.persist = persist
+        self.grace_seconds = grace_seconds
+        self._heap: List[tuple] = []
+        self._reminders: Dict[Any, Reminder] = {}
+        self._seq = itertools.count()
+        self._local_ids = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._persist_slots = asyncio.Semaphore(_PERSIST_CONCURRENCY)
+        self._stats = {"scheduled": 0, "fired": 0, "delivered": 0, "missed": 0, "cancelled": 0,
+                       "skipped": 0, "lateness_max": 0.0}
+
+    # ───────────────────── PUBLIC
+    def schedule(self, user_id: Any, session_id: Any, when: Union[datetime, str, float],
+                 reminder_id: Any = None) -> Reminder:
+        """Ajoute (ou replanifie) un rappel ; à appeler depuis la boucle d'événements."""
+        if reminder_id is None:
+            reminder_id = f"local-{next(self._local_ids)}"  # non persisté dans APEX
+        if reminder_id in self._reminders:
+            self._reminders.pop(reminder_id)  # l'ancienne entrée du tas devient obsolète
+        reminder = Reminder(reminder_id, user_id, session_id, _timestamp(when))
+        self._reminders[reminder_id] = reminder
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (reminder.due, next(self._seq), reminder_id))
+        self._stats["scheduled"] += 1
+        if earliest is None or reminder.due < earliest:
+            self._wakeup.set()
+        return reminder
+
+    def cancel(self, reminder_id: Any) -> bool:
+        """Annule un rappel ; son entrée reste dans le tas jusqu'à la prochaine compaction."""
+        reminder = self._reminders.pop(reminder_id, None)
+        if reminder is None:
+            return False
+        reminder.status = CANCELLED
+        self._stats["cancelled"] += 1
+        self._maybe_compact()
+        return True
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def load_from_apex(self, url: str, headers: Optional[dict] = None,
+                             page_size: int = _PAGE_SIZE) -> int:
+        """
+        Charge tous les rappels actifs, page par page (`limit`/`offset`, `hasMore`).
+        Les rappels échus depuis plus de `grace_seconds` sont marqués « missed ».
+
+        Returns:
+            Nombre de rappels planifiés
+        """
+        now = time.time()
+        loaded = offset = 0
+        async with httpx.AsyncClient(timeout=15) as client:
+            while True:
+                resp = await client.get(url, params={"limit": page_size, "offset": offset}, headers=headers)
+                resp.raise_for_status()
+                data = resp.json()
+                items = data.get("items", data) if isinstance(data, dict) else data
+                for raw in items:
+                    r = {k.lower(): v for k, v in raw.items()}  # colonnes APEX en majuscules ou minuscules
+                    if r.get("status") != ACTIVE or not r.get("reminder_time"):
+                        continue
+                    due = _timestamp(r["reminder_time"])
+                    if due < now - self.grace_seconds:
+                        missed = Reminder(r.get("id"), r.get("user_id"), r.get("session_id"), due)
+                        self._transition(missed, MISSED)
+                        continue
+                    self.schedule(r.get("user_id"), r.get("session_id"), due, reminder_id=r.get("id"))
+                    loaded += 1
+                if not (isinstance(data, dict) and data.get("hasMore")) or not items:
+                    break
+                offset += len(items)
+        _LOG.info("Rappels chargés depuis APEX : %d planifiés (%d en attente au total)", loaded, len(self._reminders))
+        return loaded
+
+    def pending(self) -> int:
+        return len(self._reminders)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "pending": len(self._reminders), "heap": len(self._heap),
+                "next_due_in": round(self._heap[0][0] - time.time(), 3) if self._heap else None}
+
+    # ───────────────────── INTERNAL
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            batch = 0
+            while self._heap and self._heap[0][0] <= now and batch < _FIRE_BATCH:
+                due, _, reminder_id = heapq.heappop(self._heap)
+                reminder = self._reminders.get(reminder_id)
+                if reminder is None or reminder.due != due:
+                    continue  # annulé ou replanifié
+                del self._reminders[reminder_id]
+                batch += 1
+                self._stats["fired"] += 1
+                self._stats["lateness_max"] = max(self._stats["lateness_max"], now - due)
+                self._spawn(self._fire(reminder))
+
+            timeout = min(self._heap[0][0] - time.time(), _MAX_SLEEP) if self._heap else _MAX_SLEEP
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(0)  # rend la main entre deux salves d'échéances
+
+    async def _fire(self, reminder: Reminder) -> None:
+        try:
+            delivered = await self.deliver(reminder)
+        except Exception as e:
+            _LOG.error("Envoi du rappel %s impossible : %s", reminder.reminder_id, e)
+            delivered = False
+        if delivered is None:
+            self._stats["skipped"] += 1
+            return
+        self._stats["delivered" if delivered else "missed"] += 1
+        self._transition(reminder, SENT if delivered else MISSED)
+
+    def _transition(self, reminder: Reminder, status: str) -> None:
+        reminder.status = status
+        if self.persist is not None and not str(reminder.reminder_id).startswith("local-") \
+                and reminder.reminder_id is not None:
+            self._spawn(self._persist(reminder, status))
+
+    async def _persist(self, reminder: Reminder, status: str) -> None:
+        async with self._persist_slots:
+            try:
+                await self.persist(reminder, status)
+            except Exception as e:
+                _LOG.warning("Persistance du rappel %s (%s) impossible : %s", reminder.reminder_id, status, e)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 1024 and len(self._reminders) < len(self._heap) * _COMPACT_RATIO:
+            self._heap = [(r.due, next(self._seq), rid) for rid, r in self._reminders.items()]
+            heapq.heapify(self._heap)
@@ -1,27 +1,201 @@
+"""
+Envoi des rappels par Web Push (tâche batch, à lancer périodiquement).
+
+    python -m features.common.send_reminders
+
+1. les rappels actifs échus sont lus page par page depuis APEX (filtre ORDS
+   côté serveur, revérifié ici) ;
+2. les notifications partent en parallèle depuis un pool de workers, avec
+   relance exponentielle par endpoint sur 429/5xx ; un abonnement expiré
+   (404/410) n'est pas relancé. Un rappel encore en erreur transitoire
+   (5xx, 429, connexion) après les relances reste actif et sera repris au
+   passage suivant ; seuls les refus définitifs sont marqués failed ;
+3. les changements d'état (sent, failed, expired) sont renvoyés à APEX par
+   lots : en un appel par lot si REMINDER_STATUS_BATCH_URL est défini, sinon
+   en PUT concurrents sur une session HTTP partagée.
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
 import requests
 from pywebpush import webpush, WebPushException
-from datetime import datetime
 
-VAPID_PRIVATE_KEY = "DGezJqZaqCCVbYRljEmAfpMTnzR40hoBqJRlD-Z779A"
-VAPID_CLAIMS = {"sub": "mailto:medazizlahmar@naxxum.fr"}
+_LOG = logging.getLogger(__name__)
+
+VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY", "DGezJqZaqCCVbYRljEmAfpMTnzR40hoBqJRlD-Z779A")
+VAPID_CLAIMS = {"sub": os.getenv("VAPID_SUBJECT", "mailto:medazizlahmar@naxxum.fr")}
+
+REMINDERS_URL = os.getenv("REMINDERS_URL", "https://apex.oracle.com/pls/apex/naxxum/reminders/")
+STATUS_BATCH_URL = os.getenv("REMINDER_STATUS_BATCH_URL")  # endpoint APEX optionnel (liste d'états)
+
+PAGE_SIZE = 500
+PUSH_WORKERS = int(os.getenv("PUSH_WORKERS", "32"))
+PUSH_RETRIES = 3
+PUSH_BACKOFF = 0.5           # secondes, doublé à chaque tentative
+PUSH_TTL = 3600              # durée de conservation côté service de push
+STATUS_BATCH_SIZE = 100
+STATUS_WORKERS = 8
+
+SENT, FAILED, EXPIRED = "sent", "failed", "expired"
+RETRY = "retry"              # pas d'écriture : le rappel reste actif pour le passage suivant
+_RETRYABLE = {429, 500, 502, 503, 504}
+_GONE = {404, 410}
+
+PushSender = Callable[[Dict[str, Any], str], None]
+
+
+def _parse_time(value: str) -> datetime:
+    when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+def fetch_due_reminders(session: requests.Session, now: datetime,
+                        url: str = REMINDERS_URL, page_size: int = PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Rappels actifs dont l'échéance est passée, page par page (clés en minuscules)."""
+    query = json.dumps({"status": "active",
+                        "reminder_time": {"$lte": {"$date": now.strftime("%Y-%m-%dT%H:%M:%SZ")}}})
+    offset = 0
+    while True:
+        resp = session.get(url, params={"q": query, "limit": page_size, "offset": offset}, timeout=15)
+        resp.raise_for_status()
+        data = resp.json()
+        items = data.get("items", [])
+        for raw in items:
+            r = {k.lower(): v for k, v in raw.items()}
+            if r.get("status") == "active" and r.get("reminder_time") and _parse_time(r["reminder_time"]) <= now:
+                yield r
+        if not data.get("hasMore") or not items:
+            return
+        offset += len(items)
+
+
+def webpush_sender(subscription: Dict[str, Any], message: str) -> None:
+    webpush(
+        subscription_info=subscription,
+        data=message,
+        vapid_private_key=VAPID_PRIVATE_KEY,
+        vapid_claims=dict(VAPID_CLAIMS),
+        ttl=PUSH_TTL,
+    )
+
 
-reminders = requests.get("https://apex.oracle.com/pls/apex/naxxum/reminders/").json()["items"]
-now = datetime.utcnow()
+def _status_code(error: Exception) -> Optional[int]:
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
 
-for r in reminders:
-    reminder_time = datetime.strptime(r["REMINDER_TIME"], "%Y-%m-%dT%H:%M:%S.%fZ")
-    if r["STATUS"] == "active" and reminder_time <= now:
-        subscription_info = {
-            "endpoint": r["PUSH_ENDPOINT"],
-            "keys": {"p256dh": r["PUSH_P256DH"], "auth": r["PUSH_AUTH"]}
-        }
+
+def push_with_retry(reminder: Dict[str, Any], sender: PushSender = webpush_sender,
+                    retries: int = PUSH_RETRIES, backoff: float = PUSH_BACKOFF) -> Tuple[Any, str]:
+    """
+    Envoie la notification d'un rappel ; retourne (id, nouvel état ou RETRY).
+    Une erreur propre au rappel (colonne manquante, clés invalides,
+    abonnement mal formé) le marque failed sans interrompre le passage.
+    """
+    reminder_id = reminder.get("id")
+    for attempt in range(retries + 1):
+        try:
+            subscription = {
+                "endpoint": reminder["push_endpoint"],
+                "keys": {"p256dh": reminder["push_p256dh"], "auth": reminder["push_auth"]},
+            }
+            sender(subscription, f"Votre session live '{reminder['session_id']}' commence bientôt !")
+            return reminder_id, SENT
+        except (WebPushException, requests.RequestException) as e:
+            code = _status_code(e)
+            if code in _GONE:
+                return reminder_id, EXPIRED
+            # WebPushException sans réponse : refusée avant l'envoi (abonnement mal formé)
+            if (code is None and isinstance(e, WebPushException)) or (code is not None and code not in _RETRYABLE):
+                _LOG.warning("Push du rappel %s refusé (%s)", reminder_id, e)
+                return reminder_id, FAILED
+            if attempt == retries:
+                _LOG.warning("Push du rappel %s reporté au prochain passage (%s)", reminder_id, e)
+                return reminder_id, RETRY
+            time.sleep(backoff * 2 ** attempt)
+        except Exception as e:
+            _LOG.warning("Rappel %s invalide (%s: %s)", reminder_id, type(e).__name__, e)
+            return reminder_id, FAILED
+    return reminder_id, RETRY
+
+
+def update_statuses(session: requests.Session, updates: List[Tuple[Any, str]],
+                    url: str = REMINDERS_URL, batch_url: Optional[str] = STATUS_BATCH_URL) -> int:
+    """Renvoie les nouveaux états à APEX par lots ; retourne le nombre d'états enregistrés."""
+    if not updates:
+        return 0
+    saved = 0
+    if batch_url:
+        for start in range(0, len(updates), STATUS_BATCH_SIZE):
+            chunk = updates[start:start + STATUS_BATCH_SIZE]
+            try:
+                session.post(batch_url, json={"items": [{"id": i, "status": s} for i, s in chunk]},
+                             timeout=30).raise_for_status()
+                saved += len(chunk)
+            except requests.RequestException as e:
+                _LOG.error("Mise à jour groupée de %d rappels impossible : %s", len(chunk), e)
+        return saved
+
+    def put(update: Tuple[Any, str]) -> bool:
+        reminder_id, status = update
         try:
-            webpush(
-                subscription_info=subscription_info,
-                data=f"Votre session live '{r['SESSION_ID']}' commence bientôt !",
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims=VAPID_CLAIMS
-            )
-            requests.put(f"https://apex.oracle.com/pls/apex/naxxum/reminders/{r['ID']}", json={"STATUS": "sent"})
-        except WebPushException as ex:
-            print("Erreur WebPush:", ex)
\ No newline at end of file
+            session.put(f"{url}{reminder_id}", json={"status": status}, timeout=15).raise_for_status()
+            return True
+        except requests.RequestException as e:
+            _LOG.error("Mise à jour du rappel %s impossible : %s", reminder_id, e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=STATUS_WORKERS) as pool:
+        return sum(pool.map(put, updates))
+
+
+def _session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json", "User-Agent": "Mozilla/5.0"})
+    return session
+
+
+def run(sender: PushSender = webpush_sender, workers: int = PUSH_WORKERS,
+        url: str = REMINDERS_URL, batch_url: Optional[str] = STATUS_BATCH_URL,
+        now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Exécute un passage complet. Les états sont renvoyés par lots pendant
+    l'envoi, sans attendre la fin de tous les push.
+
+    Returns:
+        Compteurs par état, nombre d'états enregistrés et durée
+    """
+    start = time.perf_counter()
+    now = now or datetime.now(timezone.utc)
+    counts = {SENT: 0, FAILED: 0, EXPIRED: 0, RETRY: 0}
+    saved = 0
+    pending: List[Tuple[Any, str]] = []
+
+    with _session(max(workers, STATUS_WORKERS)) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda r: push_with_retry(r, sender), fetch_due_reminders(session, now, url))
+        for reminder_id, status in results:
+            counts[status] += 1
+            if status == RETRY or reminder_id is None:
+                continue
+            pending.append((reminder_id, status))
+            if len(pending) >= STATUS_BATCH_SIZE:
+                saved += update_statuses(session, pending, url, batch_url)
+                pending = []
+        saved += update_statuses(session, pending, url, batch_url)
+
+    report = {**counts, "saved": saved, "seconds": round(time.perf_counter() - start, 3)}
+    _LOG.info("Rappels Web Push : %s", report)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(run())
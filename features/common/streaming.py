@@ -0,0 +1,93 @@
+"""
+Diffusion des tokens LLM vers le client (Server-Sent Events).
+Un endpoint active un `TokenStream` pour la durée d'une requête ; les agents
+qui produisent du texte libre appellent `stream_llm` : si un flux est actif,
+les tokens y sont poussés au fil de la génération, sinon l'appel reste un
+`invoke` classique. Le flux est porté par une ContextVar, il suit donc la
+requête jusque dans le thread d'exécution du graphe (asyncio.to_thread).
+"""
+
+import asyncio
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Optional
+
+_DONE = object()
+_current: ContextVar[Optional["TokenStream"]] = ContextVar("token_stream", default=None)
+
+
+class TokenStream:
+    """File de tokens alimentée depuis n'importe quel thread, consommée par la boucle."""
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def push(self, token: str) -> None:
+        if token:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, token)
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, _DONE)
+
+    @contextmanager
+    def activate(self):
+        """Rend ce flux courant pour le contexte (et les threads lancés depuis celui-ci)."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            yield item
+
+
+def current_stream() -> Optional[TokenStream]:
+    return _current.get()
+
+
+@contextmanager
+def suspend_stream():
+    """Désactive la diffusion pour le contexte courant (générations concurrentes)."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def stream_llm(runnable, payload: Any) -> str:
+    """
+    Exécute un modèle (ou une chaîne prompt | llm) et retourne le texte complet.
+    Les tokens sont diffusés au fur et à mesure si un TokenStream est actif.
+    """
+    stream = _current.get()
+    if stream is None:
+        result = runnable.invoke(payload)
+        return getattr(result, "content", result).strip()
+
+    parts = []
+    for chunk in runnable.stream(payload):
+        text = getattr(chunk, "content", chunk)
+        if isinstance(text, str) and text:
+            parts.append(text)
+            stream.push(text)
+    return "".join(parts).strip()
+
+
+def wants_stream(request) -> bool:
+    """Mode streaming demandé via `?stream=true` ou `Accept: text/event-stream`."""
+    if request.query_params.get("stream", "").lower() in {"1", "true", "yes"}:
+        return True
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formate un événement SSE ; les données sont sérialisées en JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
@@ -0,0 +1,66 @@
+"""
+Cache mémoire borné (LRU) avec expiration par entrée.
+Utilisé par l'authentification : fiches utilisateur le temps d'une vague de
+connexions, puis jetons vérifiés jusqu'à leur `exp`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Dictionnaire thread-safe : au plus `maxsize` entrées (la moins récemment
+    lue est évincée), chacune valable `ttl` secondes ou jusqu'à l'échéance
+    donnée à `set(..., expires_at=...)` (horloge `time.time()`).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # clé → (valeur, échéance)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None,
+            expires_at: Optional[float] = None) -> None:
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {"size": len(self._data), "hits": self._hits, "misses": self._misses,
+                    "hit_rate": round(self._hits / total, 3) if total else 0.0}
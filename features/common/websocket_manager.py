@@ -1,25 +1,289 @@
+"""
+Hub des connexions WebSocket.
+Chaque utilisateur peut avoir plusieurs connexions (onglets), indexées par
+utilisateur et conversation, sur un canal (`progress` pour l'avancement des
+créations de cours, `reminder` pour les rappels). Publier ne fait que déposer
+le message dans la file bornée de chaque connexion : une tâche d'envoi par
+connexion la vide, un client lent ne bloque donc jamais le producteur. Quand
+une file est pleine, les messages de progression les plus anciens sont
+abandonnés (ou remplacés par le plus récent de même clé). La vivacité des
+sockets repose sur le ping/pong du protocole WebSocket (uvicorn,
+WS_PING_INTERVAL/WS_PING_TIMEOUT) : un client parti fait échouer la lecture.
+Les sockets JSON (rappels) reçoivent en plus un ping applicatif et sont
+fermées si elles restent muettes ; les sockets de progression, dont les
+clients n'envoient jamais rien, ne sont pas fermées pour inactivité. Avec plusieurs workers, chaque message est
+aussi relayé par le bus pub/sub (voir pubsub.py) aux connexions des autres.
+
+La cible des messages de progression suit la requête : l'endpoint l'active
+avec `progress_target(user_id, conversation_id)` (ContextVar, propagée dans
+asyncio.to_thread), `send_progress` / `notify_progress` n'ont rien à passer.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Set, Tuple
+
 from fastapi import WebSocket, WebSocketDisconnect
 
-clients = {}
+from features.common.pubsub import create_bus
+from features.user_management.auth import verify_token
+
+_LOG = logging.getLogger(__name__)
+
+PROGRESS, REMINDER = "progress", "reminder"
+
+_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "64"))
+_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# développement uniquement : accepte `?user_id=` sans jeton
+_ALLOW_USER_ID = os.getenv("WS_ALLOW_USER_ID", "0").lower() in {"1", "true", "yes"}
+
+_target: ContextVar[Optional[Tuple[str, Optional[str]]]] = ContextVar("progress_target", default=None)
+
+
+class Connection:
+    """Une socket ouverte et sa file d'envoi bornée."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, user_id: str, conversation_id: Optional[str],
+                 channel: str, as_json: bool, maxsize: int = _QUEUE_SIZE):
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.channel = channel
+        self.as_json = as_json
+        self.maxsize = maxsize
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self._queue: deque = deque()  # (payload, coalesce_key, droppable)
+        self._ready = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def offer(self, payload: Any, key: Optional[str] = None, droppable: bool = True) -> bool:
+        """
+        Dépose un message sans attendre.
+        Même clé en attente → remplacée ; file pleine → la plus ancienne progression
+        est abandonnée. Retourne False si le message n'a pas pu être mis en file.
+        """
+        if self.closed:
+            return False
+        if key is not None:
+            for i, (_, pending_key, _) in enumerate(self._queue):
+                if pending_key == key:
+                    self._queue[i] = (payload, key, droppable)
+                    return True
+        if len(self._queue) >= self.maxsize:
+            victim = next((i for i, item in enumerate(self._queue) if item[2]), None)
+            if victim is None and droppable:
+                self.dropped += 1
+                return False
+            if victim is None:  # que des messages importants : on sacrifie le plus ancien
+                victim = 0
+            del self._queue[victim]
+            self.dropped += 1
+        self._queue.append((payload, key, droppable))
+        self._ready.set()
+        return True
+
+    def start(self, on_close) -> None:
+        self._sender = asyncio.create_task(self._send_loop(on_close))
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+        self._ready.set()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _send_loop(self, on_close) -> None:
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._queue and not self.closed:
+                    payload, _, _ = self._queue.popleft()
+                    send = self.websocket.send_json if self.as_json else self.websocket.send_text
+                    await asyncio.wait_for(send(payload), _SEND_TIMEOUT)
+                    self.last_seen = time.monotonic()
+        except Exception as e:  # client parti, ou trop lent pour suivre
+            _LOG.info("WS %s/%s fermée à l'envoi (%s)", self.user_id, self.id, type(e).__name__)
+        finally:
+            await on_close(self)
+
+
+class ConnectionHub:
+    """Connexions par utilisateur ; diffusion non bloquante vers tous ses onglets."""
+
+    def __init__(self, bus=None):
+        self._by_user: Dict[str, Set[Connection]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.bus = bus if bus is not None else create_bus()
+
+    # ───────────────────── PUBLIC
+    async def start(self) -> None:
+        """Abonnement au bus : les messages publiés par les autres workers sont livrés ici."""
+        self._loop = asyncio.get_running_loop()
+        await self.bus.start(lambda message: self._deliver(**message))
+
+    async def stop(self) -> None:
+        await self.bus.stop()
+
+    async def connect(self, websocket: WebSocket, user_id: str, conversation_id: Optional[str] = None,
+                      channel: str = PROGRESS, as_json: bool = False) -> Connection:
+        await websocket.accept()
+        self._loop = asyncio.get_running_loop()
+        conn = Connection(websocket, str(user_id), conversation_id, channel, as_json)
+        self._by_user.setdefault(conn.user_id, set()).add(conn)
+        self._update_presence(conn)
+        conn.start(self.disconnect)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        _LOG.info("WS %s/%s ouverte (%s, %d connexion(s))", conn.user_id, conn.id, channel,
+                  len(self._by_user[conn.user_id]))
+        return conn
+
+    async def disconnect(self, conn: Connection) -> None:
+        conns = self._by_user.get(conn.user_id)
+        if conns is not None and conn in conns:
+            conns.discard(conn)
+            if not conns:
+                self._by_user.pop(conn.user_id, None)
+            self._update_presence(conn)
+        if not conn.closed:
+            await conn.close()
+
+    async def serve(self, conn: Connection) -> None:
+        """Lit la socket jusqu'à sa fermeture ; tout message reçu (dont « pong ») la maintient vivante."""
+        try:
+            while True:
+                await conn.websocket.receive_text()
+                conn.last_seen = time.monotonic()
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            await self.disconnect(conn)
+
+    def publish(self, user_id: Any, payload: Any, channel: str = PROGRESS,
+                conversation_id: Optional[str] = None, key: Optional[str] = None,
+                droppable: bool = True) -> int:
+        """
+        Dépose `payload` dans la file des connexions de l'utilisateur sur ce canal
+        (limitées à la conversation si elle est donnée), ici et, via le bus, dans
+        les autres workers. À appeler depuis la boucle.
+
+        Returns:
+            Nombre de connexions locales qui ont accepté le message
+        """
+        message = {"user_id": str(user_id), "payload": payload, "channel": channel,
+                   "conversation_id": conversation_id, "key": key, "droppable": droppable}
+        if self.bus.distributed:
+            self.bus.publish(message)
+        return self._deliver(**message)
+
+    async def online(self, user_id: Any, channel: str = PROGRESS) -> bool:
+        """L'utilisateur a au moins une connexion ouverte sur ce canal, dans n'importe quel worker."""
+        if any(c.channel == channel for c in self._by_user.get(str(user_id), ())):
+            return True
+        return await self.bus.online(str(user_id), channel)
+
+    def publish_threadsafe(self, user_id: Any, payload: Any, **kwargs) -> None:
+        """Équivalent de `publish` depuis un thread de travail."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(lambda: self.publish(user_id, payload, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        conns = [c for cs in self._by_user.values() for c in cs]
+        return {"users": len(self._by_user), "connections": len(conns),
+                "queued": sum(len(c._queue) for c in conns), "dropped": sum(c.dropped for c in conns)}
+
+    # ───────────────────── INTERNAL
+    def _deliver(self, user_id: str, payload: Any, channel: str, conversation_id: Optional[str],
+                 key: Optional[str], droppable: bool) -> int:
+        delivered = 0
+        for conn in list(self._by_user.get(user_id, ())):
+            if conn.channel != channel:
+                continue
+            if conversation_id and conn.conversation_id and conn.conversation_id != conversation_id:
+                continue
+            delivered += conn.offer(payload, key, droppable)
+        return delivered
+
+    def _update_presence(self, conn: Connection) -> None:
+        count = sum(c.channel == conn.channel for c in self._by_user.get(conn.user_id, ()))
+        self.bus.set_presence(conn.user_id, conn.channel, count)
+
+    async def _heartbeat_loop(self) -> None:
+        while self._by_user:
+            await asyncio.sleep(_HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            for conn in [c for cs in self._by_user.values() for c in cs if c.as_json]:
+                idle = now - conn.last_seen
+                if idle > _IDLE_TIMEOUT:
+                    _LOG.info("WS %s/%s fermée (muette depuis %.0fs)", conn.user_id, conn.id, idle)
+                    await self.disconnect(conn)
+                elif idle > _HEARTBEAT_INTERVAL and conn.as_json:
+                    conn.offer({"type": "ping"}, key="ping")
+
+
+hub = ConnectionHub()
+
+
+def _user_from(websocket: WebSocket) -> Optional[str]:
+    """Utilisateur de la socket : jeton JWT (`?token=`) ; `?user_id=` seulement si WS_ALLOW_USER_ID."""
+    token = websocket.query_params.get("token")
+    if token:
+        try:
+            payload = verify_token(token) or {}
+        except Exception:
+            return None
+        user_id = payload.get("user_id") or payload.get("id")
+        return str(user_id) if user_id else None
+    return websocket.query_params.get("user_id") if _ALLOW_USER_ID else None
+
 
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    user_id=1
-    clients[user_id] = websocket
+    user_id = _user_from(websocket)
+    if not user_id:
+        await websocket.close(code=1008)  # policy violation : utilisateur inconnu
+        return
+    conn = await hub.connect(websocket, user_id, websocket.query_params.get("conversation_id"))
+    await hub.serve(conn)
+
+
+@contextmanager
+def progress_target(user_id: Any, conversation_id: Optional[str] = None):
+    """Destinataire des messages de progression pour le contexte courant."""
+    token = _target.set((str(user_id), conversation_id))
     try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        clients.pop(user_id, None)
+        yield
+    finally:
+        _target.reset(token)
 
-async def send_progress( message: str):
-    user_id=1
 
-    print(f"[WS] {user_id} ← {message}")  # ✅ Affiche dans la console
+async def send_progress(message: str, key: Optional[str] = None):
+    target = _target.get()
+    print(f"[WS] {target[0] if target else '-'} ← {message}")  # ✅ Affiche dans la console
+    if target:
+        hub.publish(target[0], message, conversation_id=target[1], key=key)
 
-    websocket = clients.get(user_id)
-    if websocket:
-        try:
-            await websocket.send_text(message)
-        except:
-            clients.pop(user_id, None)
+
+def notify_progress(message: str, key: Optional[str] = None) -> None:
+    """Équivalent synchrone de send_progress, appelable depuis un thread de travail."""
+    target = _target.get()
+    _LOG.debug("[WS] %s ← %s", target[0] if target else "-", message)
+    if target:
+        hub.publish_threadsafe(target[0], message, conversation_id=target[1], key=key)
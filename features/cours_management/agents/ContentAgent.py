@@ -1,18 +1,13 @@
-import os
 import json
 import re
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
 
 
 class ContentAgent:
     def __init__(self):
         load_dotenv()
-        self.llm = ChatGroq(
-            model_name="llama3-8b-8192",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.3  # Réduit pour plus de cohérence
-        )
+        self.llm = get_llm("llama3-8b-8192", temperature=0.3)  # Réduit pour plus de cohérence
 
     def generate_content_for_chapter(self, chapter: dict) -> dict:
         title = chapter.get("title", "Untitled Chapter")
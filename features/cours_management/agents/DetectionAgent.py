@@ -1,10 +1,9 @@
 import json
-import os
 import logging
 from dotenv import load_dotenv
 
 from typing import Dict, Any
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
 from langchain.prompts import (
     ChatPromptTemplate,
     SystemMessagePromptTemplate,
@@ -16,11 +15,7 @@ class DetectionAgent:
         """
         Initialise l'agent avec un modèle de langage.
         """
-        self.llm = ChatGroq(
-            model_name=model_name,
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=temperature
-        )
+        self.llm = get_llm(model_name, temperature=temperature)
 
         # Définir le prompt système
         self.system_prompt = SystemMessagePromptTemplate.from_template(
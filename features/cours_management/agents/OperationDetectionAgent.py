@@ -1,20 +1,19 @@
 from __future__ import annotations
-import json, os, re, textwrap, logging
-from typing import Dict, Any, Optional
+import json, re, textwrap, logging
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
-import requests
 
 from features.cours_management.memory_course.agent_memory import AgentMemory
+from infrastructure.langchain_setup import get_hedged_llm, GROQ, OPENROUTER
 
 load_dotenv()
 _LOG = logging.getLogger(__name__)
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-
 _PROMPT = textwrap.dedent("""
 Tu es un **Routeur d'opérations** (Operation Router) pour un chatbot e-learning.
 Ta seule mission : lire le message utilisateur + contexte, puis renvoyer EXACTEMENT
-un objet JSON compact à UNE seule clé : "category".
+un objet JSON compact : {"category": ...} pour une demande simple, ou
+{"categories": [...]} lorsque le message enchaîne plusieurs demandes distinctes.
 
 ══════════════════════════════════════════════════════════════════════════════
 CATEGORIES AUTORISÉES
@@ -44,6 +43,9 @@ EXEMPLES :
 • message = "Importer ce fichier PDF"          → {"category": "process_pdf"}
 • message = "Non, mieux que ça" (si last_agent_used='pdf_interaction') → {"category": "summarize"}
 • message = "Create new course about .NET"     → {"category": "course"}
+• message = "Montre mon calendrier et cherche des cours Python"
+  → {"categories": [{"category": "show_calendar", "message": "montre mon calendrier"},
+                    {"category": "course", "message": "cherche des cours Python"}]}
 
 IMPORTANT : Choisis la catégorie LA PLUS PERTINENTE selon l’intention du message,
 même si un fichier PDF est attaché. Prends en compte `last_agent_used` pour les demandes de suivi.
@@ -51,36 +53,65 @@ même si un fichier PDF est attaché. Prends en compte `last_agent_used` pour le
 RÈGLES DE SORTIE
 ────────────────
 Réponds strictement MINIFIÉ, JSON seul : {"category":"..."}.
+Demande composée : {"categories":[{"category":"...","message":"..."}, ...]}, dans l'ordre
+du message, chaque "message" reprenant la partie du texte qui concerne la catégorie.
+N'utilise "categories" que pour des demandes réellement distinctes (4 au maximum).
 """)
 
+MAX_OPERATIONS = 4
+VALID_CATEGORIES = {
+    "process_pdf", "show_calendar", "schedule_session",
+    "answer_course", "get_user_memories", "user",
+    "course", "chat", "summarize", "qa", "quiz"
+}
+
+def _parse_routes(raw: str, user_message: str) -> List[Tuple[str, str]]:
+    """(catégorie, partie du message) lues dans la réponse du routeur, sans filtrage."""
+    raw = re.sub(r"^```json|```$", "", raw.strip(), flags=re.IGNORECASE).strip()
+    routes: List[Tuple[str, str]] = []
+    try:
+        data = json.loads(raw)
+        if isinstance(data, dict) and isinstance(data.get("categories"), list):
+            for item in data["categories"]:
+                if isinstance(item, dict):
+                    routes.append((item.get("category", ""), item.get("message") or user_message))
+                elif isinstance(item, str):
+                    routes.append((item, user_message))
+        elif isinstance(data, dict) and "category" in data:
+            routes.append((data["category"], user_message))
+        elif isinstance(data, str):
+            routes.append((data.strip('"'), user_message))
+    except Exception:
+        for match in re.finditer(r'"category"\s*:\s*"([^"]+)"', raw):
+            routes.append((match.group(1), user_message))
+    return [(cat, text) for cat, text in routes if isinstance(cat, str) and cat.strip()]
+
+
+def _has_category(raw: str) -> bool:
+    """Réponse exploitable du routeur : toute forme que `_parse_routes` sait lire."""
+    return bool(_parse_routes(raw, ""))
+
+
 class OperationDetectionAgent:
     def __init__(self):
         self.memory = AgentMemory(agent_type="operation_detection")
+        # DeepSeek en principal ; Llama 3 (Groq) relance la requête si DeepSeek tarde
+        # au-delà de son p95, ou prend le relais quand son disjoncteur est ouvert
+        self.llm = get_hedged_llm("router", [
+            {"model": "deepseek/deepseek-chat:latest", "provider": OPENROUTER,
+             "temperature": 0, "timeout": 20, "max_retries": 0},
+            {"model": "llama3-8b-8192", "provider": GROQ,
+             "temperature": 0, "timeout": 10, "max_retries": 0},
+        ], validate=_has_category)
 
     def _call_deepseek(self, prompt: str) -> str:
         try:
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                data=json.dumps({
-                    "model": "deepseek/deepseek-chat:latest",
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ]
-                }),
-                timeout=20
-            )
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            return content.strip()
+            return self.llm.invoke(prompt)
         except Exception as e:
-            _LOG.error(f"[DeepSeek] API error: {e}")
+            _LOG.error(f"[Router] API error: {e}")
             return '{"category":"chat"}'
 
-    def detect_category(
+    def detect_categories(
         self,
         user_message: str,
         user_role: str = "public",
@@ -89,9 +120,15 @@ class OperationDetectionAgent:
         user_id: Optional[str] = None,
         conversation_id: Optional[str] = None,
         last_agent_used: Optional[str] = None
-    ) -> str:
+    ) -> List[Tuple[str, str]]:
+        """
+        Catégories d'une demande, éventuellement composée.
+
+        Returns:
+            Liste ordonnée de (catégorie, partie du message concernée), au moins un élément
+        """
         if not user_message or not user_message.strip():
-            return "chat"
+            return [("chat", user_message or "")]
 
         prompt = _PROMPT + textwrap.dedent(f"""
         Contexte :
@@ -102,29 +139,17 @@ class OperationDetectionAgent:
         • last_agent_used = {last_agent_used or 'null'}
         """)
 
-        raw = self._call_deepseek(prompt)
-        raw = re.sub(r"^```json|```$", "", raw, flags=re.IGNORECASE).strip()
-
-        valid = [
-            "process_pdf", "show_calendar", "schedule_session",
-            "answer_course", "get_user_memories", "user",
-            "course", "chat", "summarize", "qa", "quiz"
-        ]
+        routes = _parse_routes(self._call_deepseek(prompt), user_message)
 
-        cat = "chat"
-        try:
-            data = json.loads(raw)
-            if isinstance(data, dict) and "category" in data:
-                cat = data["category"]
-            elif isinstance(data, str):
-                cat = data.strip('"')
-        except Exception:
-            match = re.search(r'"category"\s*:\s*"([^"]+)"', raw)
-            if match:
-                cat = match.group(1)
-
-        if cat not in valid:
-            cat = "chat"
+        # catégories inconnues → chat ; doublons (même catégorie, même texte) retirés
+        cleaned: List[Tuple[str, str]] = []
+        for cat, text in routes:
+            route = (cat if cat in VALID_CATEGORIES else "chat", str(text).strip() or user_message)
+            if route not in cleaned:
+                cleaned.append(route)
+        if len(cleaned) > 1:  # une demande composée ne se replie pas sur le message entier
+            cleaned = [r for r in cleaned if r[0] != "chat"] or cleaned[:1]
+        cleaned = cleaned[:MAX_OPERATIONS] or [("chat", user_message)]
 
        # if user_id:
         #    self.memory.save_response(
@@ -135,8 +160,21 @@ class OperationDetectionAgent:
              #   metadata={"history": history}
             #)
 
-        _LOG.info(f"[Router] Message: {user_message} → Catégorie: {cat}")
-        return cat
+        _LOG.info(f"[Router] Message: {user_message} → Catégories: {[c for c, _ in cleaned]}")
+        return cleaned
+
+    def detect_category(
+        self,
+        user_message: str,
+        user_role: str = "public",
+        has_pdf: bool = False,
+        history: str = "",
+        user_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        last_agent_used: Optional[str] = None
+    ) -> str:
+        return self.detect_categories(user_message, user_role, has_pdf, history,
+                                      user_id, conversation_id, last_agent_used)[0][0]
 
     def detect_operation(
         self,
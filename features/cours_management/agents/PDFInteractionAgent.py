@@ -1,8 +1,9 @@
 # features/cours_management/agents/PDFInteractionAgent.py
-import os, logging, textwrap
+import logging, textwrap
 from typing import Optional
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
+from features.common.streaming import stream_llm
 
 from features.cours_management.memory_course.agent_memory import AgentMemory
 
@@ -16,11 +17,7 @@ class PDFInteractionAgent:
     """
 
     def __init__(self, model: str = "llama3-8b-8192"):
-        self.llm = ChatGroq(
-            model_name=model,
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.3
-        )
+        self.llm = get_llm(model, temperature=0.3)
         self.memory = AgentMemory(agent_type="pdf_agent")
 
     # ──────────────────────────────────────────────────────────────
@@ -72,7 +69,7 @@ class PDFInteractionAgent:
         prompt = self._build_prompt(question, context, last_answer)
 
         try:
-            response = self.llm.invoke(prompt).content.strip()
+            response = stream_llm(self.llm, prompt)
 
             # Sauvegarde dans la mémoire d’agent
             if user_id:
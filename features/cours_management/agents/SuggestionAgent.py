@@ -1,22 +1,22 @@
-import os
 import json
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
 from features.cours_management.prompts.prompt_suggestion import suggestion_prompt_template
 from features.cours_management.tools import suggestion_tools
+from features.cours_management.utils.concurrency import singleflight, make_key
 import re
 
 load_dotenv()
 
 class SuggestionAgent:
     def __init__(self):
-        self.llm = ChatGroq(
-            model_name="llama3-8b-8192",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.7
-        )
+        self.llm = get_llm("llama3-8b-8192", temperature=0.7)
 
     def suggest(self, user_id: str) -> list:
+        # un seul calcul (APEX + LLM) pour les demandes simultanées d'un même utilisateur
+        return singleflight.do(make_key("suggest", user_id), self._suggest, user_id)
+
+    def _suggest(self, user_id: str) -> list:
         role = suggestion_tools.get_user_role.invoke(user_id)
         history = suggestion_tools.get_user_memories.invoke(user_id)
 
@@ -1,15 +1,13 @@
 from __future__ import annotations
-import logging, os, re, textwrap, json
+import logging, re, textwrap, json
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import requests
 from features.cours_management.memory_course.agent_memory import AgentMemory
+from infrastructure.langchain_setup import get_llm, OPENROUTER
 
 load_dotenv()
 _LOG = logging.getLogger(__name__)
-
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 _CHUNK_CHARS = 8000
 _OVERLAP_CHARS = 600
 _RATIO_MIN = 0.05
@@ -21,25 +19,12 @@ class UnifiedCourseAgent:
             chunk_overlap=_OVERLAP_CHARS,
         )
         self.memory = AgentMemory(agent_type="pdf_interaction")
+        self.llm = get_llm("deepseek/deepseek-coder:6.7b", temperature=0.7,
+                           provider=OPENROUTER, timeout=30, max_retries=0)
 
     def _call_deepseek(self, prompt: str) -> str:
         try:
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                data=json.dumps({
-                    "model": "deepseek/deepseek-coder:6.7b",
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ]
-                }),
-                timeout=30
-            )
-            result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
+            return self.llm.invoke(prompt).content.strip()
         except Exception as e:
             _LOG.error(f"[DeepSeek] API error: {e}")
             return ""
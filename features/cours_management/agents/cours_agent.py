@@ -1,27 +1,46 @@
 import logging
-import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 import re
 
-from PyPDF2 import PdfReader, errors as pdf_errors
-import io
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm, BACKGROUND
 from langchain.chains import LLMChain
 from features.cours_management.prompts.cours_prompt import build_operation_prompt
 from features.cours_management.tools.course_qa_tools import answer_about_course
+from features.cours_management.utils.pdf_sections import split_pdf_sections
+from features.common.websocket_manager import notify_progress
+
+_MAX_PARALLEL_SECTIONS = 4
+_METADATA_SAMPLE_CHARS = 2000
+
+_SECTION_PROMPT = """Tu reçois un fragment d'un support de cours extrait d'un PDF.
+Mets-le en forme en HTML (<h3>, <p>, <ul>, <li>, <strong>, <pre><code>) pour une plateforme e-learning.
+Conserve exactement tout le contenu du fragment, ni plus ni moins, dans la langue originale,
+sans ajouter d'exemples ni d'informations supplémentaires.
+Titre détecté de la section : {title}
+Réponds uniquement par un JSON : {{"Title": "...", "Content": "..."}}
+
+Fragment :
+{text}"""
+
+_METADATA_PROMPT = """Tu prépares la fiche d'un cours e-learning importé depuis un PDF.
+Titres des sections : {titles}
+Début du document :
+{sample}
+
+Réponds uniquement par un JSON avec les clés :
+"TITLE", "DESCRIPTION", "PREREQUISITES", "TARGET_AUDIENCE", "TAGS", "LANGUAGE", "DURATION" (nombre), "PRICE" (nombre).
+Utilise la langue du document."""
 
 class CourseAgent:
     def __init__(self):
         load_dotenv()
 
-        self.llm = ChatGroq(
-            model_name="llama3-8b-8192",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.2
-        )
+        self.llm = get_llm("llama3-8b-8192", temperature=0.2, cache=True)
+        # import de PDF : appels en masse, servis après les tours de chat
+        self.bulk_llm = get_llm("llama3-8b-8192", temperature=0.2, cache=True, priority=BACKGROUND)
 
         self.prompt, self.parser = build_operation_prompt()
 
@@ -69,30 +88,83 @@ class CourseAgent:
             return self._fallback(e.__str__())
 
     def process_pdf(self, pdf_bytes: bytes):
+        """
+        Transforme un PDF en cours structuré.
+        Les sections sont détectées localement (sommaire, polices, titres) puis
+        mises en forme en parallèle : chaque appel LLM ne voit qu'une partie
+        du document, ce qui évite de dépasser le contexte du modèle.
+        """
         try:
-            with io.BytesIO(pdf_bytes) as pdf_stream:
-                pdf_reader = PdfReader(pdf_stream)
-
-                # Extraire le texte brut
-                full_text = "\n".join([page.extract_text() for page in pdf_reader.pages])
-
-                # Utiliser LLM pour structurer le contenu
-                structured_response = self.chain.invoke({
-                    "input": f"Structure le contenu suivant en chapitres de cours. Conserve exactement tout le contenu du PDF, ni plus ni moins, et dans la langue originale, sans ajouter d'exemples ou d'informations supplémentaires :\n{full_text}",
-                    "history": "",
-                    "memories": ""
-                })
-
-                start_json = structured_response.content.find("{")
-                formatted_response = AIMessage(content=structured_response.content[
-                                                       start_json:] if start_json >= 0 else structured_response.content)
-                output = self.parser.parse(formatted_response.content)
-
-            return output
+            sections = split_pdf_sections(pdf_bytes)
+            if not sections:
+                return {"error": "PDF processing error: aucun texte extractible"}
+
+            jobs = [(i, j, sec["title"], part)
+                    for i, sec in enumerate(sections)
+                    for j, part in enumerate(sec["parts"])]
+            notify_progress(f"📄 {len(sections)} sections détectées ({len(jobs)} parties à structurer)")
+
+            done = 0
+            chapters: Dict[int, Dict[int, Dict[str, str]]] = {}
+            with ThreadPoolExecutor(max_workers=_MAX_PARALLEL_SECTIONS) as pool:
+                meta_future = pool.submit(self._course_metadata, sections)
+                futures = {pool.submit(self._structure_part, title, part): (i, j)
+                           for i, j, title, part in jobs}
+                for future, (i, j) in futures.items():
+                    chapters.setdefault(i, {})[j] = future.result()
+                    done += 1
+                    notify_progress(f"✅ Partie {done}/{len(jobs)} structurée", key="structure")
+                course_data = meta_future.result()
+
+            course_data["Chapters"] = [
+                {
+                    "Title": parts[0]["Title"] or sections[i]["title"] or f"Chapitre {i + 1}",
+                    "Content": "\n".join(parts[j]["Content"] for j in sorted(parts))
+                }
+                for i, parts in sorted(chapters.items())
+            ]
+            notify_progress("📘 Structure du cours assemblée")
+            return {"operation": "create_course", "parameters": {"course_data": course_data}}
 
         except Exception as e:
             return {"error": f"PDF processing error: {str(e)}"}
 
+    def _structure_part(self, title: str, text: str) -> Dict[str, str]:
+        """Met en forme une partie de section ; en cas d'échec le texte brut est conservé."""
+        try:
+            raw = self.bulk_llm.invoke(_SECTION_PROMPT.format(title=title or "⟨aucun⟩", text=text)).content
+            data = self._extract_json(raw)
+            if isinstance(data, dict) and data.get("Content"):
+                return {"Title": str(data.get("Title") or title), "Content": str(data["Content"])}
+        except Exception as e:
+            logging.warning("Structuration de section échouée (%s): %s", title, e)
+        paragraphs = "".join(f"<p>{p.strip()}</p>" for p in text.split("\n\n") if p.strip())
+        return {"Title": title, "Content": paragraphs}
+
+    def _course_metadata(self, sections: List[Dict]) -> Dict:
+        """Génère les champs descriptifs du cours à partir des titres et du début du PDF."""
+        defaults = {
+            "INSTRUCTOR_ID": 1, "TITLE": sections[0]["title"] or "Cours importé",
+            "DESCRIPTION": "", "PREREQUISITES": "", "TARGET_AUDIENCE": "", "TAGS": "",
+            "LANGUAGE": "", "DURATION": 1.0, "PRICE": 0.0, "STATUS": "Draft"
+        }
+        titles = "; ".join(sec["title"] for sec in sections if sec["title"])
+        sample = sections[0]["parts"][0][:_METADATA_SAMPLE_CHARS]
+        try:
+            raw = self.bulk_llm.invoke(_METADATA_PROMPT.format(titles=titles or "⟨aucun⟩", sample=sample)).content
+            data = self._extract_json(raw)
+            if isinstance(data, dict):
+                defaults.update({k.upper(): v for k, v in data.items() if v not in (None, "")})
+        except Exception as e:
+            logging.warning("Génération des métadonnées du cours échouée: %s", e)
+        defaults["INSTRUCTOR_ID"], defaults["STATUS"] = 1, "Draft"
+        return defaults
+
+    @staticmethod
+    def _extract_json(text: str):
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        return json.loads(match.group(0) if match else text)
+
     def generate_pdf_suggestions(self, user_role: str = "public") -> str:
         """
         Utilise le LLM pour proposer des actions pertinentes sur le PDF
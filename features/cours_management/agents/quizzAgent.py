@@ -1,9 +1,8 @@
-import os
 import json
 import logging
 import re
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm, BACKGROUND
 from langchain_core.messages import AIMessage
 from langchain.chains import LLMChain
 from features.cours_management.prompts.cours_prompt import build_operation_prompt
@@ -13,11 +12,7 @@ from features.common.websocket_manager import send_progress
 class QuizAgent:
     def __init__(self):
         load_dotenv()
-        self.llm = ChatGroq(
-            model_name="llama3-8b-8192",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0
-        )
+        self.llm = get_llm("llama3-8b-8192", temperature=0, cache=True, priority=BACKGROUND)
         self.prompt, self.parser = build_operation_prompt()
         self.chain = self.prompt | self.llm
 
@@ -58,7 +53,8 @@ Format attendu :
 
             try:
                 await send_progress(f"📝 Generating quiz {idx + 1}...")
-                response = self.llm.invoke(prompt)
+                # appel asynchrone : l'attente du quota BACKGROUND se fait hors de la boucle
+                response = await self.llm.ainvoke(prompt)
                 print(f"📩 [LLM RESPONSE] →\n{response.content[:500]}...\n")
 
                 # On cherche le premier '{' pour localiser le début de l'objet JSON
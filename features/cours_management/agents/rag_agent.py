@@ -2,6 +2,8 @@ import logging
 from typing import Dict, List, Any, Optional, Tuple
 from langchain_core.messages import HumanMessage
 from features.cours_management.rag.qdrant_rag import QdrantRAG
+from features.cours_management.memory_course.memory_singleton import MemorySingleton
+from features.cours_management.utils.prompt_budget import count_tokens
 
 
 class RAGAgent:
@@ -11,7 +13,11 @@ class RAGAgent:
 
         # Initialisation du RAG avec gestion d'erreur
         try:
-            self.rag = QdrantRAG(host=host, port=port)
+            # même base que le reste de l'application : on partage l'instance (et son modèle d'embedding)
+            if (host, port) == ("localhost", 6333):
+                self.rag = MemorySingleton.get_qdrant_rag()
+            else:
+                self.rag = QdrantRAG(host=host, port=port)
             self.is_available = self.rag.is_available
             self.logger.info("RAGAgent initialisé avec succès")
         except Exception as e:
@@ -19,8 +25,11 @@ class RAGAgent:
             self.rag = None
             self.is_available = False
 
-    def process_query(self, query: str, history_context: str = "", k: int = 3) -> Dict[str, Any]:
-        """Traite une requête utilisateur avec RAG"""
+    def process_query(self, query: str, history_context: str = "", k: int = 3,
+                      max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Traite une requête utilisateur avec RAG.
+        `max_tokens` borne le contexte enrichi : les documents (par pertinence
+        décroissante) sont ajoutés entiers tant qu'ils tiennent dans le budget."""
         # Vérification des entrées
         if not query or not query.strip():
             self.logger.warning("Requête vide, retour d'un contexte vide")
@@ -54,17 +63,28 @@ class RAGAgent:
 
             # Construction du contexte enrichi
             context = ""
+            used_tokens = 0
             for i, doc in enumerate(relevant_docs):
                 if not hasattr(doc, 'page_content'):
                     continue
 
-                context += f"Document {i + 1}:\n{doc.page_content}\n\n"
+                block = f"Document {i + 1}:\n{doc.page_content}\n\n"
 
                 # Ajout des métadonnées pertinentes
                 if hasattr(doc, 'metadata') and doc.metadata:
-                    context += f"Source: {doc.metadata.get('title', 'Unknown')}\n"
+                    block += f"Source: {doc.metadata.get('title', 'Unknown')}\n"
                     if 'course_id' in doc.metadata:
-                        context += f"Course ID: {doc.metadata['course_id']}\n"
+                        block += f"Course ID: {doc.metadata['course_id']}\n"
+
+                # Respect du budget de tokens
+                if max_tokens is not None:
+                    cost = count_tokens(block)
+                    if used_tokens + cost > max_tokens:
+                        self.logger.info(f"Budget RAG atteint ({used_tokens}/{max_tokens} tokens), {len(relevant_docs) - i} document(s) ignoré(s)")
+                        break
+                    used_tokens += cost
+
+                context += block
 
             # Retourne le contexte enrichi et les documents
             return {
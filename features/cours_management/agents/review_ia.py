@@ -4,64 +4,94 @@ import logging
 import re
 import html
 import asyncio
-import aiohttp
+import os
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import time
 
+from features.common.apex_writer import ApexWriter
+from features.common.websocket_manager import send_progress
+from features.cours_management.memory_course.memory_singleton import MemorySingleton
+from features.cours_management.utils.concept_index import CourseConceptIndex, course_index
+
 # Configuration optimisée
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Revue par lot : soumissions analysées en parallèle, et liste des soumissions d'un examen
+REVIEW_BATCH_CONCURRENCY = int(os.getenv("REVIEW_BATCH_CONCURRENCY", "8"))
+EXAM_SUBMISSIONS_URL = os.getenv("EXAM_SUBMISSIONS_URL",
+                                 "https://apex.oracle.com/pls/apex/naxxum/elearning/exam_submissions/")
+EXAM_SUBMISSIONS_PAGE = 500
+
 
 class CorrectedPedagogicalAgent:
     """Agent pédagogique corrigé pour Oracle APEX"""
 
-    def __init__(self, openrouter_api_key: str, model_name: str = "deepseek/deepseek-chat"):
+    APEX_ENDPOINTS = {
+        "review_roadmap": "https://apex.oracle.com/pls/apex/naxxum/review_roadmap/",
+        "roadmap_insight": "https://apex.oracle.com/pls/apex/naxxum/roadmap_insight/",
+        "weakness_point": "https://apex.oracle.com/pls/apex/naxxum/weakness_point/",
+        "chapter_summary_detail": "https://apex.oracle.com/pls/apex/naxxum/chapter_summary_detail/",
+        "chapter_study_note": "https://apex.oracle.com/pls/apex/naxxum/chapter_study_note/",
+        "roadmap_step": "https://apex.oracle.com/pls/apex/naxxum/roadmap_step/",
+        "practice_quiz": "https://apex.oracle.com/pls/apex/naxxum/practice_quiz/",
+        "practice_quiz_option": "https://apex.oracle.com/pls/apex/naxxum/practice_quiz_option/"
+    }
+
+    def __init__(self, openrouter_api_key: str, model_name: str = "deepseek/deepseek-chat",
+                 writer: Optional[ApexWriter] = None, embeddings=None):
         self.api_key = openrouter_api_key
         self.model_name = model_name
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
-        self.apex_endpoints = {
-            "review_roadmap": "https://apex.oracle.com/pls/apex/naxxum/review_roadmap/",
-            "roadmap_insight": "https://apex.oracle.com/pls/apex/naxxum/roadmap_insight/",
-            "weakness_point": "https://apex.oracle.com/pls/apex/naxxum/weakness_point/",
-            "chapter_summary_detail": "https://apex.oracle.com/pls/apex/naxxum/chapter_summary_detail/",
-            "chapter_study_note": "https://apex.oracle.com/pls/apex/naxxum/chapter_study_note/",
-            "roadmap_step": "https://apex.oracle.com/pls/apex/naxxum/roadmap_step/",
-            "practice_quiz": "https://apex.oracle.com/pls/apex/naxxum/practice_quiz/",
-            "practice_quiz_option": "https://apex.oracle.com/pls/apex/naxxum/practice_quiz_option/"
-        }
+        self.apex_endpoints = dict(self.APEX_ENDPOINTS)
         self.session = requests.Session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0",
             "Accept": "application/json",
             "Content-Type": "application/json; charset=utf-8"
         })
+        # writer fourni : partagé avec d'autres analyses, fermé par son propriétaire
+        self.writer = writer or ApexWriter(self.apex_endpoints, dict(self.session.headers))
+        self._owns_writer = writer is None
+        # précalculs par cours (résumés, concepts clés, difficulté), partagés entre étudiants
+        self._summaries_by_course: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # écriture des résumés par cours : en cours ou réussie (True) ; retirée si elle échoue
+        self._summaries_saved: Dict[str, asyncio.Future] = {}
+        # modèle FastEmbed de l'index des concepts (celui de Qdrant par défaut)
+        self.embeddings = embeddings
 
     async def analyze_submission_corrected(self, submission_id: str) -> Dict[str, Any]:
         """Analyse corrigée avec sauvegarde en base"""
         start_time = time.time()
         logger.info(f"🚀 Début de l'analyse optimisée pour la soumission {submission_id}")
 
+        await self.writer.open()
         try:
             # 1. Récupération des données depuis l'API REST existante
             submission_data = await self._fetch_submission_data_async(submission_id)
 
-            # 2. Analyse rapide et efficace
-            concept_analysis = await self._quick_concept_analysis(submission_data)
-            summaries = await self._generate_fast_summaries(submission_data)
-            roadmap = await self._create_efficient_roadmap(submission_data, concept_analysis)
+            # 2. Analyse rapide et efficace (questions rattachées aux chapitres/concepts du cours)
+            index = await self._course_index(submission_data)
+            matches = await self._match_responses(submission_data, index)
+            concept_analysis = await self._quick_concept_analysis(submission_data, matches)
+            summaries = await self._course_summaries(submission_data, index)
+            roadmap = await self._create_efficient_roadmap(submission_data, concept_analysis, matches)
             quizzes = await self._generate_unique_quizzes(submission_data)
 
             # 3. Sauvegarde corrigée en base Oracle APEX
+            save_start = time.perf_counter()
             roadmap_id = await self._save_to_apex_corrected(
                 submission_data, concept_analysis, summaries, roadmap, quizzes
             )
+            save_seconds = round(time.perf_counter() - save_start, 3)
+            logger.info(f"💾 Sauvegarde APEX en {save_seconds:.2f}s ({self.writer.stats()})")
 
             # 4. Compilation finale
             result = self._compile_analysis(
                 submission_data, concept_analysis, summaries, roadmap, quizzes, roadmap_id
             )
+            result["metadata"]["apex_save_seconds"] = save_seconds
 
             elapsed_time = time.time() - start_time
             logger.info(f"✅ Analyse terminée en {elapsed_time:.2f} secondes")
@@ -71,29 +101,83 @@ class CorrectedPedagogicalAgent:
         except Exception as e:
             logger.error(f"❌ Erreur lors de l'analyse: {e}")
             raise
+        finally:
+            if self._owns_writer:
+                await self.writer.close()
 
     async def _fetch_submission_data_async(self, submission_id: str) -> Dict[str, Any]:
         """Récupération depuis l'API REST existante"""
         url = f"https://apex.oracle.com/pls/apex/naxxum/elearning/review/{submission_id}"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.session.headers, timeout=10) as response:
-                if response.status != 200:
-                    raise Exception(f"Erreur API: {response.status}")
+        async with self.writer.session.get(url, timeout=10) as response:
+            if response.status != 200:
+                raise Exception(f"Erreur API: {response.status}")
 
-                data = await response.json()
-                items = data.get("items", [])
+            data = await response.json()
+            items = data.get("items", [])
 
-                if not items:
-                    raise ValueError(f"Aucune soumission trouvée pour l'ID {submission_id}")
+            if not items:
+                raise ValueError(f"Aucune soumission trouvée pour l'ID {submission_id}")
 
-                submission_data = json.loads(items[0]["submission_json"])
-                logger.info(f"📊 Données récupérées: Score {submission_data.get('score')}%")
+            submission_data = json.loads(items[0]["submission_json"])
+            logger.info(f"📊 Données récupérées: Score {submission_data.get('score')}%")
 
-                return submission_data
+            return submission_data
 
-    async def _quick_concept_analysis(self, submission_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyse conceptuelle rapide"""
+    async def _fetch_exam_submission_ids(self, exam_id: str) -> List[str]:
+        """Identifiants des soumissions d'un examen, page par page (filtre ORDS)"""
+        query = json.dumps({"exam_id": exam_id})
+        ids, offset = [], 0
+        while True:
+            params = {"q": query, "limit": EXAM_SUBMISSIONS_PAGE, "offset": offset}
+            async with self.writer.session.get(EXAM_SUBMISSIONS_URL, params=params, timeout=15) as response:
+                if response.status != 200:
+                    raise Exception(f"Erreur API: {response.status}")
+                data = await response.json()
+            items = data.get("items", [])
+            ids.extend(str(item["submission_id"]) for item in items if item.get("submission_id") is not None)
+            if not data.get("hasMore") or not items:
+                return ids
+            offset += len(items)
+
+    async def _course_index(self, submission_data: Dict[str, Any]) -> Optional[CourseConceptIndex]:
+        """Index des chapitres et concepts du cours (None si le modèle d'embedding est indisponible)"""
+        try:
+            embeddings = self.embeddings or getattr(MemorySingleton.get_qdrant_rag(), "embeddings", None)
+            return await asyncio.to_thread(course_index, submission_data.get('course', {}), embeddings)
+        except Exception as e:
+            logger.warning(f"⚠️ Index des concepts indisponible, analyse par mots-clés: {e}")
+            return None
+
+    async def _match_responses(self, submission_data: Dict[str, Any],
+                               index: Optional[CourseConceptIndex]) -> Optional[List[Dict[str, Any]]]:
+        """Chapitre et concept de chaque réponse, dans l'ordre des réponses"""
+        if index is None:
+            return None
+        questions = [r.get('question_text', '') for r in submission_data.get('responses', [])]
+        try:
+            return await asyncio.to_thread(index.match, questions)
+        except Exception as e:
+            logger.warning(f"⚠️ Rattachement des questions impossible: {e}")
+            return None
+
+    async def _course_summaries(self, submission_data: Dict[str, Any],
+                                index: Optional[CourseConceptIndex] = None) -> Dict[str, Dict[str, Any]]:
+        """Résumés de chapitres du cours, calculés une fois par cours (avec l'index) pour la durée de l'agent"""
+        course_id = submission_data.get('course', {}).get('course_id')
+        if course_id is None:
+            return await self._generate_fast_summaries(submission_data, index)
+        summaries = self._summaries_by_course.get(str(course_id))
+        if summaries is None:
+            summaries = await self._generate_fast_summaries(submission_data, index)
+            # repli par mots-clés (index indisponible) : recalculé au prochain étudiant, pas figé
+            if index is not None:
+                self._summaries_by_course[str(course_id)] = summaries
+        return summaries
+
+    async def _quick_concept_analysis(self, submission_data: Dict[str, Any],
+                                      matches: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Analyse conceptuelle rapide (concepts de l'index du cours si `matches` est fourni)"""
         responses = submission_data.get('responses', [])
         correct_responses = [r for r in responses if r.get('is_correct') == 'Y']
         incorrect_responses = [r for r in responses if r.get('is_correct') == 'N']
@@ -103,27 +187,35 @@ class CorrectedPedagogicalAgent:
         concepts_bien_compris = []
         concepts_mal_compris = []
 
-        for response in correct_responses:
-            question = response.get('question_text', '').lower()
-            if 'deep learning' in question:
-                concepts_bien_compris.append("Concepts fondamentaux du Deep Learning")
-            elif 'neural network' in question:
-                concepts_bien_compris.append("Réseaux de neurones")
-            elif 'convolutional' in question:
-                concepts_bien_compris.append("Réseaux convolutionnels")
-            elif 'recurrent' in question:
-                concepts_bien_compris.append("Réseaux récurrents")
-
-        for response in incorrect_responses:
-            question = response.get('question_text', '').lower()
-            if 'deep learning' in question:
-                concepts_mal_compris.append("Concepts fondamentaux du Deep Learning")
-            elif 'neural network' in question:
-                concepts_mal_compris.append("Architecture des réseaux de neurones")
-            elif 'convolutional' in question:
-                concepts_mal_compris.append("Applications des réseaux convolutionnels")
-            elif 'recurrent' in question:
-                concepts_mal_compris.append("Fonctionnement des réseaux récurrents")
+        if matches:
+            for response, match in zip(responses, matches):
+                if response.get('is_correct') == 'Y':
+                    concepts_bien_compris.append(match['concept'])
+                elif response.get('is_correct') == 'N':
+                    concepts_mal_compris.append(match['concept'])
+        else:
+            # Repli sans modèle d'embedding : mots-clés du cours de Deep Learning
+            for response in correct_responses:
+                question = response.get('question_text', '').lower()
+                if 'deep learning' in question:
+                    concepts_bien_compris.append("Concepts fondamentaux du Deep Learning")
+                elif 'neural network' in question:
+                    concepts_bien_compris.append("Réseaux de neurones")
+                elif 'convolutional' in question:
+                    concepts_bien_compris.append("Réseaux convolutionnels")
+                elif 'recurrent' in question:
+                    concepts_bien_compris.append("Réseaux récurrents")
+
+            for response in incorrect_responses:
+                question = response.get('question_text', '').lower()
+                if 'deep learning' in question:
+                    concepts_mal_compris.append("Concepts fondamentaux du Deep Learning")
+                elif 'neural network' in question:
+                    concepts_mal_compris.append("Architecture des réseaux de neurones")
+                elif 'convolutional' in question:
+                    concepts_mal_compris.append("Applications des réseaux convolutionnels")
+                elif 'recurrent' in question:
+                    concepts_mal_compris.append("Fonctionnement des réseaux récurrents")
 
         return {
             "concepts_bien_compris": list(set(concepts_bien_compris)),
@@ -139,7 +231,8 @@ class CorrectedPedagogicalAgent:
             ]
         }
 
-    async def _generate_fast_summaries(self, submission_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    async def _generate_fast_summaries(self, submission_data: Dict[str, Any],
+                                       index: Optional[CourseConceptIndex] = None) -> Dict[str, Dict[str, Any]]:
         """Génération rapide de résumés détaillés"""
         chapters = submission_data.get('course', {}).get('chapters', [])
         summaries = {}
@@ -152,7 +245,8 @@ class CorrectedPedagogicalAgent:
             summary = {
                 "titre": chapter_title,
                 "resume_executif": f"Ce chapitre présente les concepts essentiels de {chapter_title}, incluant les définitions, applications pratiques et exemples concrets.",
-                "concepts_cles": self._extract_key_concepts_enhanced(content, chapter_title),
+                "concepts_cles": (index.chapter_concepts(chapter_id)[:5] if index
+                                  else self._extract_key_concepts_enhanced(content, chapter_title)),
                 "objectifs_apprentissage": [
                     f"Comprendre les principes fondamentaux de {chapter_title}",
                     f"Identifier les applications pratiques de {chapter_title}",
@@ -177,13 +271,17 @@ class CorrectedPedagogicalAgent:
         return summaries
 
     async def _create_efficient_roadmap(self, submission_data: Dict[str, Any],
-                                        concept_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+                                        concept_analysis: Dict[str, Any],
+                                        matches: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """Création d'un roadmap efficace basé sur les erreurs"""
-        incorrect_responses = [r for r in submission_data.get('responses', []) if r.get('is_correct') == 'N']
+        responses = submission_data.get('responses', [])
+        errors = [(r, m) for r, m in zip(responses, matches or [None] * len(responses)) if r.get('is_correct') == 'N']
+        incorrect_responses = [r for r, _ in errors]
         chapters = submission_data.get('course', {}).get('chapters', [])
 
         # Grouper les erreurs par chapitre
-        chapter_errors = self._group_errors_by_chapter_enhanced(incorrect_responses, chapters)
+        chapter_errors = self._group_errors_by_chapter_enhanced(
+            incorrect_responses, chapters, [m for _, m in errors] if matches else None)
 
         roadmap_steps = []
         step_number = 1
@@ -263,125 +361,121 @@ class CorrectedPedagogicalAgent:
                                       summaries: Dict[str, Dict[str, Any]],
                                       roadmap: List[Dict[str, Any]],
                                       quizzes: List[Dict[str, Any]]) -> int:
-        """Sauvegarde corrigée en base Oracle APEX"""
-
-        roadmap_id = None
+        """
+        Sauvegarde corrigée en base Oracle APEX.
+        Le roadmap est créé d'abord ; ses insights, étapes, points faibles et
+        les résumés de chapitres partent ensuite en parallèle, chaque quiz
+        après son point faible et ses options après le quiz.
+        """
+        writer = self.writer
+        # résumés de chapitres : une seule écriture réussie par cours pour la durée de l'agent
+        course_key = str(submission_data.get('course', {}).get('course_id'))
+        summaries_claim = await self._claim_summaries(course_key)
+        summaries_written = False
+
+        # 1. Roadmap principal
+        roadmap_data = {
+            "submission_id": submission_data.get('submission_id'),
+            "student_id": submission_data.get('student_id'),
+            "course_id": submission_data.get('course', {}).get('course_id'),
+            "ai_analysis": json.dumps(concept_analysis, ensure_ascii=False),
+            "learning_style": concept_analysis.get('style_apprentissage_detecte', 'visuel'),
+            "confidence_level": round(concept_analysis.get('niveau_confiance', 0) * 100, 2),
+            "estimated_completion_hours": len(roadmap) * 2,
+            "status": "Active",
+            "progress_percentage": 0
+        }
 
-        try:
-            # 1. Créer le roadmap principal
-            roadmap_data = {
-                "submission_id": submission_data.get('submission_id'),
-                "student_id": submission_data.get('student_id'),
-                "course_id": submission_data.get('course', {}).get('course_id'),
-                "ai_analysis": json.dumps(concept_analysis, ensure_ascii=False),
+        def roadmap_children(roadmap_id):
+            logger.info(f"✅ Roadmap créé avec ID: {roadmap_id}")
+            # 2. Insights du roadmap
+            yield writer.post("roadmap_insight", {
+                "roadmap_id": roadmap_id,
+                "strengths_count": len(concept_analysis.get('concepts_bien_compris', [])),
+                "improvement_count": len(concept_analysis.get('concepts_mal_compris', [])),
+                "encouragement": "Vous progressez bien ! Continuez vos efforts.",
+                "next_milestone": "Compléter la première étape du roadmap",
+                "confidence_boost": "Chaque concept maîtrisé vous rapproche du succès !",
+                "learning_journey": f"Votre parcours en {len(roadmap)} étapes",
                 "learning_style": concept_analysis.get('style_apprentissage_detecte', 'visuel'),
-                "confidence_level": round(concept_analysis.get('niveau_confiance', 0) * 100, 2),
-                "estimated_completion_hours": len(roadmap) * 2,
-                "status": "Active",
-                "progress_percentage": 0
-            }
+                "cognitive_load": "Optimisé",
+                "retention_strategy": "Révision espacée recommandée",
+                "engagement_level": "Élevé",
+                "personalization_score": 95.0
+            })
 
-            roadmap_response = await self._post_to_apex_safe("review_roadmap", roadmap_data)
-            if roadmap_response and 'roadmap_id' in roadmap_response:
-                roadmap_id = roadmap_response['roadmap_id']
-                logger.info(f"✅ Roadmap créé avec ID: {roadmap_id}")
-            else:
-                logger.warning("⚠️ Impossible de créer le roadmap principal")
-                return None
-
-            # 2. Sauvegarder les insights du roadmap
-            if roadmap_id:
-                insight_data = {
-                    "roadmap_id": roadmap_id,
-                    "strengths_count": len(concept_analysis.get('concepts_bien_compris', [])),
-                    "improvement_count": len(concept_analysis.get('concepts_mal_compris', [])),
-                    "encouragement": "Vous progressez bien ! Continuez vos efforts.",
-                    "next_milestone": "Compléter la première étape du roadmap",
-                    "confidence_boost": "Chaque concept maîtrisé vous rapproche du succès !",
-                    "learning_journey": f"Votre parcours en {len(roadmap)} étapes",
-                    "learning_style": concept_analysis.get('style_apprentissage_detecte', 'visuel'),
-                    "cognitive_load": "Optimisé",
-                    "retention_strategy": "Révision espacée recommandée",
-                    "engagement_level": "Élevé",
-                    "personalization_score": 95.0
-                }
-                await self._post_to_apex_safe("roadmap_insight", insight_data)
-
-            # 3. Sauvegarder les étapes du roadmap
+            # 3. Étapes du roadmap
             for step in roadmap:
-                if roadmap_id:
-                    step_data = {
-                        "roadmap_id": roadmap_id,
-                        "chapter_id": step.get('chapitre_id'),
-                        "step_order": step.get('etape'),
-                        "priority_level": step.get('niveau_priorite'),
-                        "estimated_duration": step.get('duree_estimee'),
-                        "objectives": '; '.join(step.get('objectifs_apprentissage', [])),
-                        "summary": step.get('resume_chapitre'),
-                        "study_notes": '; '.join(step.get('plan_action_detaille', [])),
-                        "exercises": "Exercices pratiques ciblés",
-                        "success_criteria": '; '.join(step.get('criteres_reussite', [])),
-                        "motivation": '; '.join(step.get('conseils_motivation', []))
-                    }
-                    await self._post_to_apex_safe("roadmap_step", step_data)
-
-            # 4. Sauvegarder les points faibles
+                yield writer.post("roadmap_step", {
+                    "roadmap_id": roadmap_id,
+                    "chapter_id": step.get('chapitre_id'),
+                    "step_order": step.get('etape'),
+                    "priority_level": step.get('niveau_priorite'),
+                    "estimated_duration": step.get('duree_estimee'),
+                    "objectives": '; '.join(step.get('objectifs_apprentissage', [])),
+                    "summary": step.get('resume_chapitre'),
+                    "study_notes": '; '.join(step.get('plan_action_detaille', [])),
+                    "exercises": "Exercices pratiques ciblés",
+                    "success_criteria": '; '.join(step.get('criteres_reussite', [])),
+                    "motivation": '; '.join(step.get('conseils_motivation', []))
+                })
+
+            # 4. Points faibles, puis leur quiz (5) et ses options (6)
             for i, concept in enumerate(concept_analysis.get('concepts_mal_compris', [])):
-                if roadmap_id:
-                    weakness_data = {
-                        "roadmap_id": roadmap_id,
-                        "chapter_id": roadmap[0].get('chapitre_id') if roadmap else None,
-                        "topic_name": concept,
-                        "difficulty_level": 3,
-                        "priority_order": i + 1,
-                        "concept_summary": f"Révision nécessaire pour {concept}",
-                        "improved_explanation": f"Explication détaillée et simplifiée de {concept}",
-                        "recommendation_tips": "Pratiquer régulièrement avec des exemples concrets",
-                        "success_criteria": "Maîtriser les concepts fondamentaux",
-                        "motivational_advice": "Chaque effort compte pour progresser",
-                        "memorization_techniques": "Utiliser des cartes mentales et des répétitions espacées"
-                    }
-                    weakness_response = await self._post_to_apex_safe("weakness_point", weakness_data)
-                    weakness_id = weakness_response.get('weakness_id') if weakness_response else None
-
-                    # 5. Sauvegarder les quiz pour ce point faible
-                    if weakness_id and i < len(quizzes):
-                        quiz = quizzes[i]
-                        quiz_data = {
-                            "weakness_id": weakness_id,
-                            "question_text": quiz.get('question_innovative'),
-                            "question_type": "multiple_choice",
-                            "difficulty_level": 3,
-                            "explanation": quiz.get('explication_detaillee')
-                        }
-                        quiz_response = await self._post_to_apex_safe("practice_quiz", quiz_data)
-                        quiz_db_id = quiz_response.get('quiz_id') if quiz_response else None
-
-                        # 6. Sauvegarder les options du quiz
-                        if quiz_db_id:
-                            for option in quiz.get('options', []):
-                                option_data = {
-                                    "quiz_id": quiz_db_id,
-                                    "option_text": option.get('texte_option'),
-                                    "is_correct": 'Y' if option.get('est_correcte') else 'N',
-                                    "explanation": option.get('explication_detaillee', '')
-                                }
-                                await self._post_to_apex_safe("practice_quiz_option", option_data)
-
-            # 7. Sauvegarder les résumés de chapitres
+                weakness_data = {
+                    "roadmap_id": roadmap_id,
+                    "chapter_id": roadmap[0].get('chapitre_id') if roadmap else None,
+                    "topic_name": concept,
+                    "difficulty_level": 3,
+                    "priority_order": i + 1,
+                    "concept_summary": f"Révision nécessaire pour {concept}",
+                    "improved_explanation": f"Explication détaillée et simplifiée de {concept}",
+                    "recommendation_tips": "Pratiquer régulièrement avec des exemples concrets",
+                    "success_criteria": "Maîtriser les concepts fondamentaux",
+                    "motivational_advice": "Chaque effort compte pour progresser",
+                    "memorization_techniques": "Utiliser des cartes mentales et des répétitions espacées"
+                }
+                quiz = quizzes[i] if i < len(quizzes) else None
+                yield writer.post_then("weakness_point", weakness_data, "weakness_id",
+                                       lambda weakness_id, quiz=quiz: quiz_writes(weakness_id, quiz))
+
+        def quiz_writes(weakness_id, quiz):
+            if quiz is None:
+                return []
+            quiz_data = {
+                "weakness_id": weakness_id,
+                "question_text": quiz.get('question_innovative'),
+                "question_type": "multiple_choice",
+                "difficulty_level": 3,
+                "explanation": quiz.get('explication_detaillee')
+            }
+            return [writer.post_then("practice_quiz", quiz_data, "quiz_id",
+                                     lambda quiz_db_id: option_writes(quiz_db_id, quiz))]
+
+        def option_writes(quiz_db_id, quiz):
+            return [writer.post("practice_quiz_option", {
+                "quiz_id": quiz_db_id,
+                "option_text": option.get('texte_option'),
+                "is_correct": 'Y' if option.get('est_correcte') else 'N',
+                "explanation": option.get('explication_detaillee', '')
+            }) for option in quiz.get('options', [])]
+
+        # 7. Résumés de chapitres et notes d'étude (indépendants du roadmap)
+        async def summary_writes():
+            nonlocal summaries_written
+            summaries_written = all(await asyncio.gather(*summary_posts()))
+
+        def summary_posts():
             for chapter_id, summary in summaries.items():
-                summary_data = {
+                yield writer.post("chapter_summary_detail", {
                     "chapter_id": int(chapter_id),
                     "executive_summary": summary.get('resume_executif'),
                     "key_concepts": '; '.join(summary.get('concepts_cles', [])),
                     "attention_points": '; '.join(summary.get('points_attention', [])),
                     "resources": '; '.join(summary.get('ressources_complementaires', [])),
                     "difficulty_level": summary.get('evaluation_difficulte', 3)
-                }
-                await self._post_to_apex_safe("chapter_summary_detail", summary_data)
-
-                # Sauvegarder les notes d'étude
-                note_data = {
+                })
+                yield writer.post("chapter_study_note", {
                     "chapter_id": int(chapter_id),
                     "main_notes": '; '.join(summary.get('concepts_cles', [])),
                     "examples": "Exemples pratiques et cas d'usage",
@@ -389,35 +483,52 @@ class CorrectedPedagogicalAgent:
                     "revision_tips": '; '.join(summary.get('points_attention', [])),
                     "memorization_methods": "Techniques de mémorisation adaptées",
                     "motivation": "Messages d'encouragement personnalisés"
-                }
-                await self._post_to_apex_safe("chapter_study_note", note_data)
+                })
 
-            logger.info("✅ Données sauvegardées en base Oracle APEX")
+        roadmap_id = None
+        try:
+            roadmap_id = await writer.post_then(
+                "review_roadmap", roadmap_data, "roadmap_id",
+                lambda rid: [*roadmap_children(rid), *([summary_writes()] if summaries_claim else [])])
+            if roadmap_id is None:
+                logger.warning("⚠️ Impossible de créer le roadmap principal")
+            else:
+                logger.info("✅ Données sauvegardées en base Oracle APEX")
             return roadmap_id
-
         except Exception as e:
             logger.error(f"❌ Erreur sauvegarde APEX: {e}")
             return roadmap_id
+        finally:
+            if summaries_claim is not None:
+                self._settle_summaries(course_key, summaries_claim, summaries_written)
+
+    async def _claim_summaries(self, course_key: str) -> Optional[asyncio.Future]:
+        """
+        Réserve l'écriture des résumés du cours. Si un autre étudiant du même
+        cours les écrit déjà, attend son résultat : rien à faire s'il a
+        réussi, nouvelle tentative (par le premier qui la réserve) sinon.
+
+        Returns:
+            Future à régler via `_settle_summaries`, ou None si déjà écrits
+        """
+        while True:
+            pending = self._summaries_saved.get(course_key)
+            if pending is None:
+                claim = asyncio.get_running_loop().create_future()
+                self._summaries_saved[course_key] = claim
+                return claim
+            if await asyncio.shield(pending):
+                return None
 
-    async def _post_to_apex_safe(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Post sécurisé vers Oracle APEX avec gestion d'erreurs"""
-        url = self.apex_endpoints[endpoint]
+    def _settle_summaries(self, course_key: str, claim: asyncio.Future, written: bool) -> None:
+        if not written and self._summaries_saved.get(course_key) is claim:
+            del self._summaries_saved[course_key]
+        if not claim.done():
+            claim.set_result(written)
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data, headers=self.session.headers, timeout=30) as response:
-                    if response.status in [200, 201]:
-                        try:
-                            return await response.json()
-                        except:
-                            return {"success": True}
-                    else:
-                        error_text = await response.text()
-                        logger.warning(f"Erreur APEX {endpoint}: {response.status} - {error_text}")
-                        return {}
-        except Exception as e:
-            logger.warning(f"Exception APEX {endpoint}: {e}")
-            return {}
+    async def _post_to_apex_safe(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Post sécurisé vers Oracle APEX avec gestion d'erreurs ({} en cas d'échec)"""
+        return await self.writer.post(endpoint, data)
 
     # Méthodes utilitaires améliorées
     def _extract_chapter_content(self, chapter: Dict[str, Any]) -> str:
@@ -485,22 +596,24 @@ class CorrectedPedagogicalAgent:
         else:
             return 3  # Difficulté par défaut
 
-    def _group_errors_by_chapter_enhanced(self, incorrect_responses: List[Dict], chapters: List[Dict]) -> Dict[
-        str, Dict]:
-        """Groupement amélioré des erreurs par chapitre"""
+    def _group_errors_by_chapter_enhanced(self, incorrect_responses: List[Dict], chapters: List[Dict],
+                                          matches: Optional[List[Dict]] = None) -> Dict[str, Dict]:
+        """Groupement amélioré des erreurs par chapitre (chapitre de l'index si `matches` est fourni)"""
         chapter_errors = {}
 
         # Créer un mapping des chapitres
         chapter_map = {str(ch.get('chapter_id')): ch for ch in chapters}
 
-        for response in incorrect_responses:
+        for i, response in enumerate(incorrect_responses):
             question = response.get('question_text', '').lower()
 
             # Logique améliorée pour associer question à chapitre
             matched_chapter = None
 
-            # Recherche par mots-clés spécifiques
-            if 'deep learning' in question:
+            # Chapitre le plus proche dans l'index, sinon recherche par mots-clés spécifiques
+            if matches:
+                matched_chapter = chapter_map.get(matches[i]['chapter_id'])
+            elif 'deep learning' in question:
                 matched_chapter = next((ch for ch in chapters if 'introduction' in ch.get('chapter_title', '').lower()),
                                        None)
             elif 'neural network' in question:
@@ -678,6 +791,71 @@ async def analyze_student_submission_corrected(submission_id: str, openrouter_ap
     return await agent.analyze_submission_corrected(submission_id)
 
 
+async def analyze_submissions_batch(openrouter_api_key: str,
+                                    submission_ids: Optional[List[str]] = None,
+                                    exam_id: Optional[str] = None,
+                                    concurrency: int = REVIEW_BATCH_CONCURRENCY,
+                                    include_results: bool = False) -> Dict[str, Any]:
+    """
+    Analyse d'un lot de soumissions (liste d'identifiants et/ou toutes celles
+    d'un examen). Un seul agent et un seul writer APEX servent tout le lot :
+    les résumés de chapitres sont calculés et écrits une fois par cours, les
+    écritures de tous les étudiants partagent la même limite de parallélisme.
+    L'avancement est publié sur le WebSocket de progression du contexte.
+
+    Returns:
+        Compteurs, une ligne par soumission réussie, les échecs avec leur
+        erreur, durée et statistiques d'écriture
+    """
+    start = time.perf_counter()
+    async with ApexWriter(CorrectedPedagogicalAgent.APEX_ENDPOINTS) as writer:
+        agent = CorrectedPedagogicalAgent(openrouter_api_key, writer=writer)
+        ids = [str(i) for i in submission_ids or []]
+        if exam_id is not None:
+            ids += await agent._fetch_exam_submission_ids(str(exam_id))
+        ids = list(dict.fromkeys(ids))
+
+        slots = asyncio.Semaphore(max(1, concurrency))
+        items, failures, results = [], [], []
+        done = 0
+
+        async def review(submission_id: str):
+            nonlocal done
+            async with slots:
+                try:
+                    result = await agent.analyze_submission_corrected(submission_id)
+                    meta = result["metadata"]
+                    items.append({"submission_id": submission_id, "student_id": meta.get("student_id"),
+                                  "roadmap_id": meta.get("roadmap_id"),
+                                  "score": result["performance_overview"].get("score"),
+                                  "apex_save_seconds": meta.get("apex_save_seconds")})
+                    if include_results:
+                        results.append(result)
+                except Exception as e:
+                    failures.append({"submission_id": submission_id, "error": str(e)})
+                    await send_progress(f"❌ Soumission {submission_id} : {e}")
+            done += 1
+            await send_progress(f"📝 Revues {done}/{len(ids)} ({len(failures)} échec(s))", key="review_batch")
+
+        await send_progress(f"🚀 Revue de {len(ids)} soumission(s)")
+        await asyncio.gather(*(review(i) for i in ids))
+
+    report = {
+        "total": len(ids),
+        "succeeded": len(items),
+        "failed": len(failures),
+        "items": items,
+        "failures": failures,
+        "courses": len(agent._summaries_by_course),
+        "seconds": round(time.perf_counter() - start, 3),
+        "apex": writer.stats(),
+    }
+    if include_results:
+        report["results"] = results
+    logger.info(f"✅ Lot de revues : {report['succeeded']}/{report['total']} en {report['seconds']:.2f}s")
+    return report
+
+
 # Test de l'agent corrigé
 if __name__ == "__main__":
     import asyncio
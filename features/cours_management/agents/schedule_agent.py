@@ -1,12 +1,13 @@
 # 📁 features/cours_management/agents/schedule_agent.py
 from __future__ import annotations
 
-import os, json, textwrap, requests, urllib.parse
+import json, textwrap, requests, urllib.parse
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
+from features.common.streaming import stream_llm
 
 from features.cours_management.prompts.schedule_prompt import schedule_prompt,Message_Response
 from features.cours_management.tools.schedule_tools import ScheduleTools
@@ -24,11 +25,7 @@ class ScheduleAgent:
     # ───────────────────────── init ─────────────────────────
     def __init__(self) -> None:
         load_dotenv()
-        self.llm = ChatGroq(
-            model_name="llama3-8b-8192",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.3,
-        )
+        self.llm = get_llm("llama3-8b-8192", temperature=0.3)
 
     # ────────────────── utilitaire parse JSON ──────────────────
     @staticmethod
@@ -124,7 +121,7 @@ User input:
             )
 
             try:
-                message = self.llm.invoke(prompt).content.strip()
+                message = stream_llm(self.llm, prompt)
             except Exception as e:
                 message = "⚠️ Failed to generate a response: " + str(e)
 
@@ -7,7 +7,10 @@ Version corrigée avec synchronisation améliorée et gestion de la mémoire uni
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
+import os
 import time
 import uuid
 from collections import defaultdict
@@ -21,27 +24,37 @@ from fastapi import (
     Header,
     Depends,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage, AIMessage
 
 from features.user_management.api import get_current_user
 from features.cours_management.memory_course.memory_singleton import MemorySingleton
+from features.cours_management.utils.pdf_cache import PDFHandle
 from features.cours_management.utils.conversation_utils import normalize_conversation_id, create_conversation_key
-from features.cours_management.utils.pdf_cache import PDFCache
-from features.cours_management.workflow.cours_graph import workflow, suggestion_agent
+from features.cours_management.workflow.cours_graph import workflow, suggestion_agent, index_pdf, prefetch_pool
 from features.cours_management.agents.ContentAgent import ContentAgent
-from features.cours_management.agents.rag_agent import RAGAgent
+from features.cours_management.agents.review_ia import analyze_submissions_batch
 from features.cours_management.tools.cours_tools import CourseTools
 from features.cours_management.tools.schedule_tools import ScheduleTools
 from features.chatbot.agents.chatbot_agent import ChatbotAgent
+from features.common.streaming import TokenStream, wants_stream, sse_event
+from features.common.websocket_manager import progress_target
+from infrastructure.llm_rate_limiter import LLMBackpressureError, rate_limiter_stats
+from infrastructure.llm_hedging import hedging_stats
+from infrastructure.llm_cache import llm_cache_stats
+from infrastructure.service_container import services
+from features.cours_management.utils.concurrency import singleflight, timed
 logger = logging.getLogger(__name__)
 
-# Initialisation des singletons pour une gestion unifiée de la mémoire
-conversation_memory = MemorySingleton.get_conversation_memory()
-qdrant_rag = MemorySingleton.get_qdrant_rag()
-pdf_cache = PDFCache(ttl_seconds=15 * 60)  # 15 minutes
-rag_agent = RAGAgent()
+EMBEDDING_WARMUP_BATCH = int(os.getenv("EMBEDDING_WARMUP_BATCH", "8"))
+
+# Singletons partagés avec le graphe, construits au premier usage (ou au préchauffage)
+conversation_memory = services.register("conversation_memory", MemorySingleton.get_conversation_memory)
+qdrant_rag = services.register("qdrant_rag", MemorySingleton.get_qdrant_rag)
+# modèle d'embedding chargé et session ONNX initialisée : condition de /ready
+services.register("embedding_model", lambda: qdrant_rag.warm_up(EMBEDDING_WARMUP_BATCH), required=True)
+pdf_cache = MemorySingleton.get_pdf_cache()  # 15 minutes, partagé avec le graphe
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
@@ -61,6 +74,90 @@ class SearchRequest(BaseModel):
     limit: Optional[int] = 3
 
 
+class ReviewBatchRequest(BaseModel):
+    submission_ids: List[str] = []
+    exam_id: Optional[str] = None
+    include_results: bool = False
+
+
+def _chat_payload(wf_res: Dict[str, Any], user_id: str, conv_id: str,
+                  message: str, pdf: Optional[PDFHandle]) -> Dict[str, Any]:
+    """Réponse JSON de /chat à partir de l'état final du graphe."""
+    # si on avait un PDF en attente → on marque comme traité
+    if pdf:
+        for r in wf_res["results"]:
+            if r.get("operation") == "process_pdf":
+                _, _, k = pdf_cache.retrieve(user_id, conv_id)
+                if k:
+                    pdf_cache.update_status(k, False)
+                break
+
+    # validations… (demande composée : les autres résultats accompagnent la validation)
+    if wf_res["results"]:
+        for r in wf_res["results"]:
+            if r.get("validation_required"):
+                view = "session" if r["operation"] == "schedule_session" else "cours"
+                key  = "session_data" if view == "session" else "course_data"
+                payload = {
+                    "conversation_id": conv_id,
+                    "requires_validation": True,
+                    "view": view,
+                    "message": "Veuillez valider",
+                    key: r[key]
+                }
+                others = [o for o in wf_res["results"] if o is not r]
+                if others:
+                    payload["response"] = others
+                return payload
+        return {"conversation_id": conv_id, "response": wf_res["results"], "message": message}
+
+    return {"conversation_id": conv_id, "response": "Aucune réponse générée."}
+
+
+def _sse_response(func, args: tuple, finalize) -> StreamingResponse:
+    """
+    Exécute `func(*args)` dans un thread et diffuse en SSE :
+    `token` pour chaque fragment généré, puis `done` avec la réponse finale
+    (même contenu qu'en mode JSON) ou `error`.
+    """
+    async def events():
+        stream = TokenStream()
+
+        async def run():
+            with stream.activate():
+                try:
+                    return await asyncio.to_thread(func, *args)
+                finally:
+                    stream.close()
+
+        task = asyncio.create_task(run())
+        async for token in stream:
+            yield sse_event("token", {"text": token})
+        try:
+            yield sse_event("done", finalize(await task))
+        except LLMBackpressureError as e:
+            yield sse_event("error", {"error": str(e), "retry_after": round(e.retry_after, 1)})
+        except Exception as e:
+            logger.exception("streaming error")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _with_progress(user_id: str, conv_id: Optional[str], func, *args):
+    """Exécute `func` en adressant ses messages de progression WebSocket à l'utilisateur."""
+    with progress_target(user_id, conv_id):
+        return func(*args)
+
+
+def _backpressure_response(e: LLMBackpressureError) -> JSONResponse:
+    """Quota LLM saturé : 503 avec Retry-After plutôt qu'une erreur générique."""
+    logger.warning("Backpressure LLM: %s", e)
+    return JSONResponse(status_code=503, content={"error": str(e)},
+                        headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+
 # ───────────────────── /chat ─────────────────────
 @router.post("/chat")
 async def chat_endpoint(
@@ -80,32 +177,39 @@ async def chat_endpoint(
 
         # ───── Message + PDF éventuel ─────────────────────────────
         message   = body_json.get("message","") if body_json else ""
-        pdf_bytes = None
         if "multipart/form-data" in request.headers.get("content-type",""):
             form    = await request.form()
             message = (form.get("message") or "").strip()
             upload  = form.get("file")
             if upload and upload.filename.lower().endswith(".pdf"):
-                pdf_bytes = await upload.read()
-                pdf_cache.store(user_id, pdf_bytes, conv_id, pending=not message)
-        else:
-            pdf_bytes, _, _ = pdf_cache.retrieve(user_id, conv_id)
+                pdf_cache.store(user_id, await upload.read(), conv_id, pending=not message)
+                # index des passages construit dès le dépôt, hors du thread de la requête
+                prefetch_pool.submit(index_pdf, user_id, conv_id)
+        # le graphe ne reçoit qu'une référence (empreinte + clé de cache), jamais les octets
+        pdf = pdf_cache.handle(user_id, conv_id)
 
-        if not message and not pdf_bytes:
+        if not message and not pdf:
             return {"conversation_id": conv_id, "response": "Aucun PDF fourni."}
 
-        # ───── Historique & RAG ───────────────────────────────────
-        hist      = conversation_memory.get_recent_conversations(user_id, conv_id, 10)
-        hist_msgs = conversation_memory.reconstruct_messages(hist)
-        all_msgs  = (hist_msgs + [HumanMessage(content=message)])[-10:]
-
-        rag_ctx = ""
-        try:
-            rag_ctx = rag_agent.process_query(message,
-                                              history_context="\n".join(m.content for m in hist_msgs)
-                                             ).get("enriched_context","")
-        except Exception:
-            pass
+        thread_id = create_conversation_key(user_id, conv_id)
+        config    = {"configurable": {"thread_id": thread_id}}
+
+        # ───── Historique (le RAG est résolu par le graphe, selon la route) ──
+        # conversation checkpointée → l'état est repris tel quel, seul le message est ajouté
+        timings: Dict[str, float] = {}
+        resumed = False
+        if workflow.checkpointer is not None:
+            snapshot = await asyncio.to_thread(timed, timings, "checkpoint", workflow.get_state, config)
+            resumed = bool(snapshot.values.get("messages"))
+        if resumed:
+            hist     = None
+            all_msgs = [HumanMessage(content=message)]
+        else:
+            hist = await asyncio.to_thread(timed, timings, "history",
+                                           conversation_memory.get_recent_conversations, user_id, conv_id, 10)
+            hist_msgs = conversation_memory.reconstruct_messages(hist)
+            all_msgs  = (hist_msgs + [HumanMessage(content=message)])[-10:]
+        logger.info("/chat historique chargé (reprise: %s, durées: %s)", resumed, timings)
 
         # ───── exécution LangGraph ────────────────────────────────
         state = {
@@ -117,43 +221,26 @@ async def chat_endpoint(
             "conversation_id": conv_id,
             "results": [],
             "error": None,
-            "rag_context": rag_ctx,
-            "pdf_bytes": pdf_bytes,
+            "rag_context": None,
+            "pdf": pdf,
+            "recent_conversations": hist,
         }
 
-        thread_id = create_conversation_key(user_id, conv_id)
-        wf_res    = workflow.invoke(state, {"configurable": {"thread_id": thread_id}})
-
-        # si on avait un PDF en attente → on marque comme traité
-        if pdf_bytes:
-            for r in wf_res["results"]:
-                if r.get("operation") == "process_pdf":
-                    _, _, k = pdf_cache.retrieve(user_id, conv_id)
-                    if k:
-                        pdf_cache.update_status(k, False)
-                    break
-
-
-
-        # validations…
-        if wf_res["results"]:
-            for r in wf_res["results"]:
-                if r.get("validation_required"):
-                    view = "session" if r["operation"] == "schedule_session" else "cours"
-                    key  = "session_data" if view == "session" else "course_data"
-                    return {
-                        "conversation_id": conv_id,
-                        "requires_validation": True,
-                        "view": view,
-                        "message": "Veuillez valider",
-                        key: r[key]
-                    }
-            return {"conversation_id": conv_id, "response": wf_res["results"], "message": message}
-
-        return {"conversation_id": conv_id, "response": "Aucune réponse générée."}
+        def finalize(wf_res: Dict[str, Any]) -> Dict[str, Any]:
+            return _chat_payload(wf_res, user_id, conv_id, message, pdf)
+
+        # exécuté hors de la boucle d'événements : les nœuds sont synchrones et
+        # la progression (import PDF…) doit pouvoir partir sur le websocket
+        run = (user_id, conv_id, workflow.invoke, state, config)
+        if wants_stream(request):
+            return _sse_response(_with_progress, run, finalize)
+        wf_res = await asyncio.to_thread(_with_progress, *run)
+        return finalize(wf_res)
 
     except HTTPException:
         raise
+    except LLMBackpressureError as e:
+        return _backpressure_response(e)
     except Exception as e:
         logger.exception("/chat error")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -166,7 +253,7 @@ async def chat_endpoint(
 @router.get("/suggestion/{user_id}")
 async def get_suggestion(user_id: str):
     try:
-        return {"suggestion": suggestion_agent.suggest(user_id)}
+        return {"suggestion": await asyncio.to_thread(suggestion_agent.suggest, user_id)}
     except Exception as e:
         logger.error("Suggestion error: %s", e)
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -177,7 +264,10 @@ async def get_suggestion(user_id: str):
 # ────────────────────────────────────────────────
 
 @router.post("/validate")
-async def validate(request: Request):
+async def validate(
+        request: Request,
+        x_conversation_id: Optional[str] = Header(None, alias="X-Conversation-Id"),
+):
     try:
         raw = await request.json()
         data = raw.get("data", raw)
@@ -192,7 +282,9 @@ async def validate(request: Request):
             )
             if not course_data:
                 raise HTTPException(400, "Missing course_data")
-            result = await CourseTools.create_course(course_data)
+            owner = course_data.get("user_id") or course_data.get("owner_id")
+            with progress_target(owner, x_conversation_id) if owner else contextlib.nullcontext():
+                result = await CourseTools.create_course(course_data)
             if err := result.get("error"):
                 return JSONResponse(content={"error": err}, status_code=500)
 
@@ -259,8 +351,8 @@ async def search_knowledge(search: SearchRequest, current_user: dict = Depends(g
 # Génération de chapitre (LLM)
 # ────────────────────────────────────────────────
 
-content_agent = ContentAgent()
-chatbot_agent = ChatbotAgent()
+content_agent = services.register("content_agent", ContentAgent)
+chatbot_agent = services.register("chatbot_agent", ChatbotAgent)
 
 
 @router.post("/askme")
@@ -272,9 +364,14 @@ async def askme_endpoint(request: Request):
             raise HTTPException(400, "Message cannot be empty.")
 
         # Get chatbot response
-        response = chatbot_agent.get_response(message)
+        if wants_stream(request):
+            return _sse_response(chatbot_agent.get_response, (message,),
+                                 lambda response: {"response": response})
+        response = await asyncio.to_thread(chatbot_agent.get_response, message)
 
         return {"response": response}
+    except LLMBackpressureError as e:
+        return _backpressure_response(e)
     except Exception as e:
         logger.exception("/askme error")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -338,6 +435,36 @@ async def index_all_courses(current_user: dict = Depends(get_current_user)):
         return JSONResponse(500, content={"error": str(e)})
 
 
+# ────────────────────────────────────────────────
+# Revue IA par lot (fin d'examen)
+# ────────────────────────────────────────────────
+
+@router.post("/reviews/batch")
+async def review_batch(
+        req: ReviewBatchRequest,
+        current_user: dict = Depends(get_current_user),
+        x_conversation_id: Optional[str] = Header(None, alias="X-Conversation-Id"),
+):
+    try:
+        if current_user.get("user_role", "").lower() not in {"instructor", "professor", "admin"}:
+            raise HTTPException(403, "Non autorisé")
+        if not req.submission_ids and req.exam_id is None:
+            raise HTTPException(400, "submission_ids or exam_id required")
+        user_id = current_user.get("user_id") or current_user.get("id")
+        with progress_target(user_id, x_conversation_id) if user_id else contextlib.nullcontext():
+            return await analyze_submissions_batch(
+                os.getenv("OPENROUTER_API_KEY", ""),
+                submission_ids=req.submission_ids,
+                exam_id=req.exam_id,
+                include_results=req.include_results,
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Review batch error: %s", e)
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
 # ────────────────────────────────────────────────
 # Health endpoint
 # ────────────────────────────────────────────────
@@ -350,3 +477,10 @@ async def qdrant_status():
     }
 
 
+
+
+@router.get("/llm_status")
+async def llm_status():
+    """Limiteurs de débit, appels couverts, disjoncteurs, regroupement des appels identiques et cache des réponses."""
+    return {"rate_limiters": rate_limiter_stats(), "hedging": hedging_stats(),
+            "singleflight": singleflight.stats(), "llm_cache": llm_cache_stats()}
@@ -12,11 +12,13 @@ from langchain_core.messages import (
     HumanMessage, AIMessage, SystemMessage, BaseMessage
 )
 
+from features.cours_management.utils.prompt_budget import count_tokens, truncate_tokens
+
 # ────────────────────────────── CONFIG
-_MAX_ASSISTANT_CHARS = 800  # tronque la réponse enregistrée
+_MAX_ASSISTANT_TOKENS = 200  # tronque la réponse enregistrée
 _COLLECTION_NAME = "conversation_memory"
 _VECTOR_DUMMY = [0.0]
-_MAX_CONTEXT_LENGTH = 3000  # limite de taille pour le contexte
+_MAX_CONTEXT_TOKENS = 750  # limite de taille pour le contexte
 
 log = logging.getLogger(__name__)
 
@@ -90,14 +92,14 @@ class ConversationMemory:
 
             # Ajouter le message système en premier s'il existe
             if system_message:
-                messages.append({"role": "system", "content": system_message[:_MAX_CONTEXT_LENGTH]})
+                messages.append({"role": "system", "content": truncate_tokens(system_message, _MAX_CONTEXT_TOKENS)})
 
             if user_message:
                 messages.append({"role": "user", "content": user_message})
 
             if assistant_message:
                 # on tronque SEULEMENT si non vide
-                assistant_trim = assistant_message[:_MAX_ASSISTANT_CHARS]
+                assistant_trim = truncate_tokens(assistant_message, _MAX_ASSISTANT_TOKENS)
                 messages.append({"role": "assistant", "content": assistant_trim})
 
             payload = {
@@ -253,13 +255,13 @@ class ConversationMemory:
     # ----------------------- RECONSTRUCT
     @staticmethod
     def reconstruct_messages(conversations: List[Dict[str, Any]],
-                             max_length: int = _MAX_CONTEXT_LENGTH) -> List[BaseMessage]:
+                             max_tokens: int = _MAX_CONTEXT_TOKENS) -> List[BaseMessage]:
         """
         Transforme la liste JSON ↦ objets LangChain.
-        Respecte la limite de taille du contexte et structure les rôles explicitement.
+        Respecte la limite de tokens du contexte et structure les rôles explicitement.
         """
         chain_msgs: List[BaseMessage] = []
-        total_length = 0
+        total_tokens = 0
 
         # Traiter les conversations dans l'ordre chronologique inverse (plus récentes d'abord)
         for conv in sorted(conversations, key=lambda x: x.get("timestamp", ""), reverse=True):
@@ -278,14 +280,14 @@ class ConversationMemory:
                 elif role == "system":
                     conv_msgs.append(SystemMessage(content=txt))
 
-                total_length += len(txt)
+                total_tokens += count_tokens(txt)
 
             # Ajouter les messages de cette conversation
             chain_msgs.extend(conv_msgs)
 
             # Vérifier si on a atteint la limite de taille
-            if total_length >= max_length:
-                log.info(f"Limite de contexte atteinte ({total_length}/{max_length}), troncature appliquée")
+            if total_tokens >= max_tokens:
+                log.info(f"Limite de contexte atteinte ({total_tokens}/{max_tokens} tokens), troncature appliquée")
                 break
 
         return chain_msgs
@@ -1,27 +1,46 @@
 # Nouveau fichier: features/cours_management/memory_course/memory_singleton.py
+import threading
 from typing import Optional
 from features.cours_management.memory_course.conversation_memory import ConversationMemory
 from features.cours_management.rag.qdrant_rag import QdrantRAG
+from features.cours_management.utils.pdf_cache import PDFCache
 
 
 class MemorySingleton:
     _conversation_memory_instance: Optional[ConversationMemory] = None
     _qdrant_rag_instance: Optional[QdrantRAG] = None
+    _pdf_cache_instance: Optional[PDFCache] = None
+    # un verrou par ressource : le préchauffage et les requêtes n'en construisent qu'une
+    _conversation_memory_lock = threading.RLock()
+    _qdrant_rag_lock = threading.RLock()
+    _pdf_cache_lock = threading.Lock()
 
     @classmethod
     def get_conversation_memory(cls, collection_name="conversation_memory") -> ConversationMemory:
         if cls._conversation_memory_instance is None:
-            try:
-                cls._conversation_memory_instance = ConversationMemory(collection_name=collection_name)
-            except Exception:
-                cls._conversation_memory_instance = ConversationMemory(collection_name=f"{collection_name}_backup")
+            with cls._conversation_memory_lock:
+                if cls._conversation_memory_instance is None:
+                    try:
+                        cls._conversation_memory_instance = ConversationMemory(collection_name=collection_name)
+                    except Exception:
+                        cls._conversation_memory_instance = ConversationMemory(collection_name=f"{collection_name}_backup")
         return cls._conversation_memory_instance
 
     @classmethod
     def get_qdrant_rag(cls, collection_name="course_knowledge") -> QdrantRAG:
         if cls._qdrant_rag_instance is None:
-            try:
-                cls._qdrant_rag_instance = QdrantRAG(collection_name=collection_name)
-            except Exception:
-                cls._qdrant_rag_instance = QdrantRAG(collection_name=f"{collection_name}_backup")
+            with cls._qdrant_rag_lock:
+                if cls._qdrant_rag_instance is None:
+                    try:
+                        cls._qdrant_rag_instance = QdrantRAG(collection_name=collection_name)
+                    except Exception:
+                        cls._qdrant_rag_instance = QdrantRAG(collection_name=f"{collection_name}_backup")
         return cls._qdrant_rag_instance
+
+    @classmethod
+    def get_pdf_cache(cls, ttl_seconds: int = 15 * 60) -> PDFCache:
+        if cls._pdf_cache_instance is None:
+            with cls._pdf_cache_lock:
+                if cls._pdf_cache_instance is None:
+                    cls._pdf_cache_instance = PDFCache(ttl_seconds=ttl_seconds)
+        return cls._pdf_cache_instance
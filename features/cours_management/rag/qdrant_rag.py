@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -8,6 +9,8 @@ from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
 
+from features.cours_management.utils.concurrency import singleflight, make_key
+
 
 class QdrantRAG:
     def __init__(self, collection_name="course_knowledge", host="localhost", port=6333):
@@ -19,6 +22,7 @@ class QdrantRAG:
         self.client = None
         self.vectorstore = None
         self.is_available = False
+        self.is_warm = False
         self.embeddings = None
 
         # Modèle d'embedding
@@ -55,6 +59,22 @@ class QdrantRAG:
             self.logger.error(f"Erreur inattendue lors de l'initialisation de Qdrant: {str(e)}")
             self.logger.warning("QdrantRAG fonctionnera en mode dégradé (sans persistance)")
 
+    def warm_up(self, batch_size: int = 8) -> float:
+        """
+        Initialise la session ONNX du modèle d'embedding avec un lot factice
+        (documents puis requête), pour que la première vraie recherche ne paie
+        pas ce coût. Retourne la durée en secondes.
+        """
+        if self.embeddings is None:
+            raise RuntimeError("Modèle d'embedding indisponible")
+        start = time.perf_counter()
+        self.embeddings.embed_documents(["warm-up"] * batch_size)
+        self.embeddings.embed_query("warm-up")
+        self.is_warm = True
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"Modèle d'embedding préchauffé en {elapsed:.2f}s")
+        return elapsed
+
     def _create_collection_if_not_exists(self):
         """Crée la collection pour le RAG si elle n'existe pas"""
         if not self.client:
@@ -198,7 +218,9 @@ class QdrantRAG:
 
         try:
             k = max(1, min(k, 10))  # Limiter k entre 1 et 10
-            results = self.vectorstore.similarity_search(query, k=k)
+            # requêtes identiques simultanées : une seule recherche (embedding + Qdrant)
+            results = singleflight.do(make_key("rag_search", self.collection_name, query, k),
+                                      self.vectorstore.similarity_search, query, k=k)
             self.logger.info(f"Recherche effectuée avec succès: {len(results)} résultats trouvés")
             return results
         except Exception as e:
@@ -217,7 +239,8 @@ class QdrantRAG:
 
         try:
             k = max(1, min(k, 10))  # Limiter k entre 1 et 10
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
+            results = singleflight.do(make_key("rag_search_score", self.collection_name, query, k),
+                                      self.vectorstore.similarity_search_with_score, query, k=k)
             self.logger.info(f"Recherche avec score effectuée avec succès: {len(results)} résultats trouvés")
             return results
         except Exception as e:
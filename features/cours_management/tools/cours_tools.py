@@ -8,7 +8,7 @@ import logging
 import json
 from features.common.websocket_manager import send_progress
 import httpx
-from features.cours_management.rag.qdrant_rag import QdrantRAG
+from features.cours_management.utils.concurrency import coalesce
 
 from features.cours_management.agents.quizzAgent import QuizAgent
 from features.cours_management.tools.quizz_tools import QuizTools
@@ -25,12 +25,12 @@ HEADERS = {
 TIMEOUT = 15
 
 save_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-qdrant_rag = QdrantRAG()
 
 class CourseTools:
 
     @staticmethod
     @tool("get_courses")
+    @coalesce("get_courses")
     def get_courses(filters: Optional[Dict[str, Any]] = None):
         """Récupère la liste des cours avec leurs chapitres."""
         try:
@@ -253,6 +253,7 @@ class CourseTools:
 
     @staticmethod
     @tool("search_courses_advanced")
+    @coalesce("search_courses_advanced")
     def search_courses_advanced(
             title: Optional[str] = None,
             tags: Optional[str] = None,
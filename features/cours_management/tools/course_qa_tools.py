@@ -1,13 +1,13 @@
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
+from features.common.streaming import stream_llm
 from langchain_core.tools import tool
-from features.cours_management.rag.qdrant_rag import QdrantRAG
-import os
+from features.cours_management.memory_course.memory_singleton import MemorySingleton
 @tool
 def answer_about_course(question: str, course_title: str = "") -> str:
     """
     Répond à toute question sur un cours (nombre de chapitres, résumé, quiz, test, etc.).
     """
-    rag = QdrantRAG()
+    rag = MemorySingleton.get_qdrant_rag()  # modèle d'embedding chargé une seule fois
     # Ajoute des mots-clés pour aider la recherche
     query = f"{course_title}. {question}. chapitre, chapitres, titre, section"
     docs = rag.search(query, k=5)
@@ -16,11 +16,7 @@ def answer_about_course(question: str, course_title: str = "") -> str:
     if not context:
         return "Je n'ai pas trouvé d'informations sur ce cours."
 
-    llm = ChatGroq(
-        model_name="llama3-8b-8192",
-        api_key=os.getenv("GROQ_API_KEY"),
-        temperature=0.4
-    )
+    llm = get_llm("llama3-8b-8192", temperature=0.4)
     prompt = f"""Tu es un assistant e-learning. Voici le contexte extrait du cours :
 {context}
 
@@ -34,5 +30,4 @@ Consignes :
 
 .
 """
-    response = llm.invoke(prompt)
-    return response.content.strip()
\ No newline at end of file
+    return stream_llm(llm, prompt)
\ No newline at end of file
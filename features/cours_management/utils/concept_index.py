@@ -0,0 +1,153 @@
+"""
+Index des chapitres et concepts d'un cours pour l'analyse des soumissions.
+Les chapitres (titre + début du contenu) et les concepts qu'ils mettent en
+avant (titres de sections, termes en gras) sont encodés une seule fois avec
+le modèle FastEmbed existant et rangés dans une matrice NumPy normalisée.
+Rattacher les questions d'une copie à un chapitre et à un concept se réduit
+alors à un encodage groupé des questions et un seul produit matriciel, quel
+que soit le sujet du cours ; les copies d'un même examen partageant leurs
+questions, chaque question n'est encodée qu'une fois par index.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from features.common.ttl_cache import TTLCache
+from features.cours_management.utils.concurrency import singleflight, make_key
+
+_LOG = logging.getLogger(__name__)
+
+_CHAPTER_CHARS = 2000                 # le modèle tronque de toute façon à 512 tokens
+_MAX_CONCEPTS_PER_CHAPTER = 8
+_CONCEPT_WORDS = (1, 8)
+_EMPHASIS = re.compile(r"<(h[1-4]|strong|b|dt)\b[^>]*>(.*?)</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+
+_indexes = TTLCache(maxsize=int(os.getenv("CONCEPT_INDEX_CACHE_SIZE", "64")), ttl=3600)
+
+
+class CourseConceptIndex:
+    """
+    Matrice (chapitres + concepts) × dimension, lignes normalisées.
+    `match` retourne, pour chaque question, le chapitre et le concept les
+    plus proches (similarité cosinus).
+    """
+
+    def __init__(self, chapters: List[Dict[str, Any]], concepts: List[Tuple[str, int]],
+                 matrix: np.ndarray, embeddings):
+        self.chapters = chapters            # [{"chapter_id", "chapter_title"}]
+        self.concepts = concepts            # [(libellé, indice du chapitre)]
+        self.matrix = matrix
+        self._embeddings = embeddings
+        self._matched: Dict[str, Dict[str, Any]] = {}   # question → rattachement
+
+    @classmethod
+    def build(cls, chapters: List[Dict[str, Any]], embeddings) -> Optional["CourseConceptIndex"]:
+        """
+        Construit l'index à partir des chapitres d'un cours (format APEX :
+        chapter_id, chapter_title, contents[].content en HTML).
+
+        Returns:
+            Index construit, ou None si le cours est vide ou l'encodage échoue
+        """
+        if not chapters or embeddings is None:
+            return None
+
+        meta, chapter_texts, concepts, seen = [], [], [], set()
+        for i, chapter in enumerate(chapters):
+            title = chapter.get('chapter_title') or f"Chapitre {i + 1}"
+            raw = " ".join(c.get('content') or "" for c in chapter.get('contents', []))
+            meta.append({"chapter_id": str(chapter.get('chapter_id')), "chapter_title": title})
+            chapter_texts.append(f"{title}. {_plain(raw)[:_CHAPTER_CHARS]}")
+            found = [t for t in _emphasized_terms(raw) if t.lower() not in seen][:_MAX_CONCEPTS_PER_CHAPTER]
+            if not found and title.lower() not in seen:
+                found = [title]
+            for term in found:
+                seen.add(term.lower())
+                concepts.append((term, i))
+
+        try:
+            vectors = np.asarray(embeddings.embed_documents(chapter_texts + [c for c, _ in concepts]),
+                                 dtype=np.float32)
+        except Exception as e:
+            _LOG.error("Encodage des chapitres impossible: %s", e)
+            return None
+
+        _LOG.info("Index de concepts construit: %d chapitres, %d concepts", len(meta), len(concepts))
+        return cls(meta, concepts, _normalize(vectors), embeddings)
+
+    def match(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Chapitre et concept les plus proches de chaque question.
+
+        Returns:
+            Une entrée par question : chapter_id, chapter_title, concept, score
+        """
+        questions = [q or "" for q in questions]
+        pending = [q for q in dict.fromkeys(questions) if q not in self._matched]
+        if pending:
+            q = _normalize(np.asarray(self._embeddings.embed_documents([p or " " for p in pending]),
+                                      dtype=np.float32))
+            scores = q @ self.matrix.T
+            n_chapters = len(self.chapters)
+            best_chapter = scores[:, :n_chapters].argmax(axis=1)
+            best_concept = scores[:, n_chapters:].argmax(axis=1)  # chaque chapitre apporte au moins un concept
+            for row, (c, k) in enumerate(zip(best_chapter, best_concept)):
+                self._matched[pending[row]] = {**self.chapters[c], "concept": self.concepts[k][0],
+                                               "score": round(float(scores[row, c]), 3)}
+        return [self._matched[q] for q in questions]
+
+    def chapter_concepts(self, chapter_id: Any) -> List[str]:
+        """Concepts mis en avant dans le chapitre, dans l'ordre du contenu."""
+        idx = next((i for i, c in enumerate(self.chapters) if c["chapter_id"] == str(chapter_id)), None)
+        return [term for term, i in self.concepts if i == idx]
+
+    def __len__(self) -> int:
+        return len(self.chapters)
+
+
+def course_index(course: Dict[str, Any], embeddings) -> Optional[CourseConceptIndex]:
+    """
+    Index du cours, construit une fois par version de son contenu : les
+    analyses d'un même cours (et les constructions simultanées) le partagent.
+    Appel bloquant (encodage) : à exécuter hors de la boucle d'événements.
+    """
+    chapters = course.get('chapters', [])
+    if not chapters or embeddings is None:
+        return None
+    digest = hashlib.sha256(json.dumps(chapters, sort_keys=True, default=str).encode()).hexdigest()
+    key = (str(course.get('course_id')), digest)
+    index = _indexes.get(key)
+    if index is None:
+        # lié au modèle d'encodage (non copiable) : partagé tel quel, comme depuis le cache
+        index = singleflight.do(make_key("concept_index", *key), CourseConceptIndex.build, chapters, embeddings,
+                                copy_result=False)
+        if index is not None:
+            _indexes.set(key, index)
+    return index
+
+
+def _plain(fragment: str) -> str:
+    return re.sub(r"\s+", " ", html.unescape(_TAG.sub(" ", fragment))).strip()
+
+
+def _emphasized_terms(raw_html: str) -> List[str]:
+    terms = []
+    for _, inner in _EMPHASIS.findall(raw_html):
+        term = _plain(inner).strip(" :;,.-–")
+        if term and _CONCEPT_WORDS[0] <= len(term.split()) <= _CONCEPT_WORDS[1] and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -4,9 +4,17 @@ Ce module fournit des classes pour gérer les ressources partagées et isoler
 les états des agents de manière thread-safe.
 """
 
+import copy
+import functools
+import hashlib
+import json
+import logging
 import threading
+import time
 from typing import Dict, Any, Optional, Callable, TypeVar, Generic
 
+_LOG = logging.getLogger(__name__)
+
 T = TypeVar('T')
 
 
@@ -93,3 +101,156 @@ class AgentStateManager:
                 del self._states[key]
             if key in self._locks:
                 del self._locks[key]
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error", "waiters", "copy_result")
+
+    def __init__(self, copy_result: bool = True):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.copy_result = copy_result
+
+
+class SingleFlight:
+    """
+    Regroupement des appels identiques simultanés (« singleflight »).
+    Le premier appelant d'une clé exécute la fonction ; ceux qui arrivent
+    pendant l'exécution attendent et reçoivent une copie du même résultat
+    (ou la même exception), ou le même objet avec `copy_result=False` pour
+    les résultats lourds ou non copiables (index, modèles). Rien n'est
+    conservé après la fin de l'appel : ce n'est pas un cache.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[..., T], *args, copy_result: bool = True, **kwargs) -> T:
+        """
+        Exécute `fn(*args, **kwargs)` une seule fois par clé en vol.
+
+        Args:
+            key: Clé de l'opération (voir `make_key`)
+            fn: Fonction à exécuter
+            copy_result: False pour partager le résultat tel quel entre les
+                appelants (objet immuable ou non copiable) ; fixé par le premier
+
+        Returns:
+            Résultat de l'appel partagé
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(copy_result)
+            else:
+                flight.waiters += 1
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result) if flight.copy_result else flight.result
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            # instantané figé pour les appelants regroupés : le premier peut muter le sien
+            try:
+                flight.result = copy.deepcopy(result) if flight.waiters and flight.copy_result else result
+            except Exception as e:
+                # résultat non copiable : les appelants regroupés reçoivent l'erreur, pas None
+                _LOG.warning("Résultat de %s non copiable: %s", key, e)
+                flight.error = e
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls, coalesced = self._stats["calls"], self._stats["coalesced"]
+            return {"calls": calls, "coalesced": coalesced, "in_flight": len(self._flights),
+                    "coalesced_rate": round(coalesced / calls, 3) if calls else 0.0}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(operation: str, *args, **kwargs) -> str:
+    """Clé d'opération : nom + arguments normalisés (espaces, None ignorés, ordre des clés)."""
+    payload = json.dumps([_normalize(list(args)), _normalize(kwargs)],
+                         sort_keys=True, default=str, ensure_ascii=False)
+    return f"{operation}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+
+singleflight = SingleFlight()
+
+
+def coalesce(operation: str):
+    """Décorateur : regroupe les appels simultanés de la fonction ayant les mêmes arguments."""
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return singleflight.do(make_key(operation, *args, **kwargs), fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed(timings: Dict[str, float], name: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Exécute `fn` et enregistre sa durée (secondes) dans `timings[name]`, même en cas d'erreur."""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+
+class Deferred(Generic[T]):
+    """
+    Dépendance évaluée à la demande.
+    `start` peut lancer le calcul de façon spéculative dans un pool ; `get`
+    attend ce calcul ou l'exécute sur place ; `cancel` l'abandonne s'il n'a
+    pas encore démarré (un calcul en cours s'achève, son résultat est ignoré).
+    """
+
+    def __init__(self, fn: Callable[..., T], *args, **kwargs):
+        self._call = functools.partial(fn, *args, **kwargs)
+        self._future = None
+        self._lock = threading.Lock()
+
+    def start(self, executor) -> "Deferred[T]":
+        with self._lock:
+            if self._future is None:
+                self._future = executor.submit(self._call)
+        return self
+
+    def get(self) -> T:
+        with self._lock:
+            future = self._future
+        if future is not None:
+            return future.result()
+        return self._call()
+
+    def cancel(self) -> bool:
+        """True si le calcul spéculatif a été évité."""
+        with self._lock:
+            future = self._future
+        return future is None or future.cancel()
@@ -4,9 +4,18 @@ Ce module fournit une classe pour stocker et récupérer des fichiers PDF
 avec une gestion de durée de vie et de synchronisation.
 """
 
+import hashlib
 import threading
 import time
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, TypedDict
+
+
+class PDFHandle(TypedDict):
+    """Référence légère vers un PDF en cache, à placer dans l'état du graphe à la place des octets."""
+    sha256: str
+    size: int
+    user_id: str
+    conversation_id: Optional[str]
 
 
 class PDFCache:
@@ -14,6 +23,10 @@ class PDFCache:
     Gestionnaire de cache PDF thread-safe avec TTL.
     Permet de stocker temporairement des PDF et de les récupérer
     avec une gestion de la durée de vie et des accès concurrents.
+    Chaque entrée peut porter un index vectoriel éphémère (voir PDFIndex)
+    qui expire en même temps que le PDF. Les PDF sont identifiés par leur
+    empreinte SHA-256 : le graphe ne manipule qu'un `PDFHandle`, résolu en
+    octets par `resolve` dans les seuls nœuds qui lisent le contenu.
     """
 
     def __init__(self, ttl_seconds: int = 900):  # 15 minutes par défaut
@@ -35,7 +48,7 @@ class PDFCache:
         return f"{user_id}:{conv_id or '*'}"
 
     def store(self, user_id: str, pdf_bytes: bytes,
-              conv_id: Optional[str] = None, pending: bool = False) -> None:
+              conv_id: Optional[str] = None, pending: bool = False) -> str:
         """
         Stocke un PDF dans le cache avec horodatage.
 
@@ -44,24 +57,74 @@ class PDFCache:
             pdf_bytes: Contenu binaire du PDF
             conv_id: Identifiant de conversation, peut être None
             pending: Indique si le PDF est en attente de traitement
+
+        Returns:
+            Empreinte SHA-256 du PDF
         """
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
         with self._lock:
             timestamp = time.time()
             # Clé spécifique
             specific_key = self._create_key(user_id, conv_id)
             self._cache[specific_key] = {
                 "pdf": pdf_bytes,
+                "sha256": digest,
                 "ts": timestamp,
-                "pending": pending
+                "pending": pending,
+                "index": None
             }
 
             # Clé générique (fallback)
             generic_key = self._create_key(user_id)
             self._cache[generic_key] = {
                 "pdf": pdf_bytes,
+                "sha256": digest,
                 "ts": timestamp,
-                "pending": pending
+                "pending": pending,
+                "index": None
             }
+        return digest
+
+    def handle(self, user_id: str, conv_id: Optional[str] = None) -> Optional[PDFHandle]:
+        """
+        Référence vers le PDF en cache pour cet utilisateur / cette conversation.
+
+        Args:
+            user_id: Identifiant de l'utilisateur
+            conv_id: Identifiant de conversation, peut être None
+
+        Returns:
+            PDFHandle, ou None si aucun PDF valide n'est en cache
+        """
+        with self._lock:
+            pdf_bytes, _, key = self.retrieve(user_id, conv_id)
+            if not key:
+                return None
+            return PDFHandle(sha256=self._cache[key]["sha256"], size=len(pdf_bytes),
+                             user_id=str(user_id), conversation_id=conv_id)
+
+    def resolve(self, handle: Optional[PDFHandle]) -> Optional[bytes]:
+        """
+        Retrouve le contenu d'un PDF à partir de sa référence.
+
+        Args:
+            handle: Référence obtenue par `handle`
+
+        Returns:
+            Contenu binaire du PDF, ou None s'il a expiré ou été remplacé
+        """
+        if not handle:
+            return None
+        with self._lock:
+            pdf_bytes, _, key = self.retrieve(handle["user_id"], handle.get("conversation_id"))
+            if key and self._cache[key]["sha256"] == handle["sha256"]:
+                return pdf_bytes
+            # PDF remplacé entre-temps sous cette clé : recherche par empreinte
+            now = time.time()
+            for entry in self._cache.values():
+                if entry["sha256"] == handle["sha256"] and now - entry["ts"] <= self._ttl_seconds:
+                    return entry["pdf"]
+            return None
 
     def retrieve(self, user_id: str, conv_id: Optional[str] = None) -> Tuple[Optional[bytes], bool, Optional[str]]:
         """
@@ -109,6 +172,47 @@ class PDFCache:
 
         return entry["pdf"], entry["pending"], key
 
+    def get_index(self, user_id: str, conv_id: Optional[str] = None) -> Optional[Any]:
+        """
+        Récupère l'index vectoriel associé au PDF en cache.
+
+        Args:
+            user_id: Identifiant de l'utilisateur
+            conv_id: Identifiant de conversation, peut être None
+
+        Returns:
+            Index construit pour ce PDF, ou None s'il n'existe pas ou a expiré
+        """
+        with self._lock:
+            _, _, key = self.retrieve(user_id, conv_id)
+            if not key:
+                return None
+            return self._cache[key].get("index")
+
+    def set_index(self, user_id: str, index: Any, conv_id: Optional[str] = None) -> bool:
+        """
+        Associe un index vectoriel au PDF en cache.
+        L'index est partagé par toutes les clés pointant vers le même PDF
+        et disparaît avec elles à l'expiration du TTL.
+
+        Args:
+            user_id: Identifiant de l'utilisateur
+            index: Index à associer
+            conv_id: Identifiant de conversation, peut être None
+
+        Returns:
+            True si un PDF correspondant était en cache, False sinon
+        """
+        with self._lock:
+            _, _, key = self.retrieve(user_id, conv_id)
+            if not key:
+                return False
+            digest = self._cache[key]["sha256"]
+            for entry in self._cache.values():
+                if entry["sha256"] == digest:
+                    entry["index"] = index
+            return True
+
     def update_status(self, key: str, pending: bool) -> bool:
         """
         Met à jour le statut d'une entrée du cache.
@@ -0,0 +1,101 @@
+"""
+Index vectoriel éphémère pour les PDF déposés dans une conversation.
+Ce module découpe le texte d'un PDF en chunks, les encode une seule fois avec
+le modèle FastEmbed existant et conserve les vecteurs dans une matrice NumPy,
+afin que chaque question de suivi n'envoie au LLM que les passages pertinents.
+"""
+
+import logging
+from typing import List, Optional
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+_LOG = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1000
+_CHUNK_OVERLAP = 100
+_DEFAULT_TOP_K = 4
+
+
+class PDFIndex:
+    """
+    Index de similarité en mémoire pour un seul PDF.
+    Les vecteurs sont normalisés à la construction : la recherche se réduit
+    à un produit matrice-vecteur suivi d'une sélection des k meilleurs scores.
+    """
+
+    def __init__(self, chunks: List[str], matrix: np.ndarray, embeddings):
+        self.chunks = chunks
+        self.matrix = matrix
+        self._embeddings = embeddings
+
+    @classmethod
+    def build(cls, text: str, embeddings,
+              chunk_size: int = _CHUNK_SIZE,
+              chunk_overlap: int = _CHUNK_OVERLAP) -> Optional["PDFIndex"]:
+        """
+        Construit l'index à partir du texte brut du PDF.
+
+        Args:
+            text: Texte extrait du PDF
+            embeddings: Modèle d'embedding LangChain (FastEmbedEmbeddings)
+            chunk_size: Taille maximale d'un chunk en caractères
+            chunk_overlap: Recouvrement entre deux chunks consécutifs
+
+        Returns:
+            Index construit, ou None si le texte est vide ou l'encodage échoue
+        """
+        if not text or not text.strip() or embeddings is None:
+            return None
+
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        chunks = [c for c in splitter.split_text(text) if c.strip()]
+        if not chunks:
+            return None
+
+        try:
+            vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+        except Exception as e:
+            _LOG.error("Encodage des chunks PDF impossible: %s", e)
+            return None
+
+        _LOG.info("Index PDF construit: %d chunks", len(chunks))
+        return cls(chunks, _normalize(vectors), embeddings)
+
+    def search(self, query: str, k: int = _DEFAULT_TOP_K) -> List[str]:
+        """
+        Retourne les k chunks les plus proches de la requête.
+
+        Args:
+            query: Question de l'utilisateur
+            k: Nombre de chunks à retourner
+
+        Returns:
+            Chunks retenus, dans l'ordre du document
+        """
+        if not self.chunks or k <= 0:
+            return []
+        if not query or not query.strip() or k >= len(self.chunks):
+            return self.chunks[:k]
+
+        q = _normalize(np.asarray([self._embeddings.embed_query(query)], dtype=np.float32))[0]
+        scores = self.matrix @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.chunks[i] for i in sorted(top)]
+
+    def context(self, query: str, k: int = _DEFAULT_TOP_K) -> str:
+        """Concatène les chunks pertinents pour les injecter dans un prompt."""
+        return "\n\n".join(self.search(query, k))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -0,0 +1,158 @@
+"""
+Découpage local d'un PDF en sections de cours.
+Ce module détecte les frontières de sections sans appel LLM, à partir du
+sommaire (outline) du PDF, puis à défaut de la taille de police et de motifs
+de titres ("Chapitre 2", "3. Introduction"...). Les sections sont ensuite
+rééquilibrées pour tenir dans le contexte des modèles 8k.
+"""
+
+import io
+import logging
+import re
+import statistics
+from typing import Dict, List, Tuple
+
+from PyPDF2 import PdfReader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+_LOG = logging.getLogger(__name__)
+
+_MIN_SECTION_CHARS = 800
+_MAX_PART_CHARS = 5000
+_HEADING_MAX_CHARS = 120
+_FONT_RATIO = 1.25
+
+# seul le mot-clé est insensible à la casse ; il doit être suivi d'un numéro ou d'un délimiteur
+_HEADING_RE = re.compile(
+    r"^((?i:chapitre|chapter|partie|part|section|module|leçon|lesson)"
+    r"(\s+(\d{1,3}(\.\d{1,3})*|[IVXLC]{1,5}|[A-Z])\b[.:)]?|\s*[:–—-])(\s.{0,100})?"
+    r"|(\d{1,2}|[IVXLC]{1,5})[.)]?\s+[A-ZÀ-Ý].{2,100})$"
+)
+
+
+def split_pdf_sections(pdf_bytes: bytes) -> List[Dict[str, object]]:
+    """
+    Découpe un PDF en sections prêtes à être structurées indépendamment.
+
+    Args:
+        pdf_bytes: Contenu binaire du PDF
+
+    Returns:
+        Liste ordonnée de sections {"title": str, "parts": List[str]} ;
+        chaque partie tient dans la fenêtre de contexte d'un appel LLM
+    """
+    with io.BytesIO(pdf_bytes) as buf:
+        reader = PdfReader(buf)
+        pages = [page.extract_text() or "" for page in reader.pages]
+
+        sections = _sections_from_outline(reader, pages)
+        source = "outline"
+        if not sections:
+            sections = _sections_from_headings(reader, pages)
+            source = "headings"
+
+    if not sections:
+        sections = [("", "\n".join(pages))]
+        source = "none"
+
+    result = _rebalance(sections)
+    _LOG.info("PDF découpé en %d sections (source: %s)", len(result), source)
+    return result
+
+
+# ───────────────────── OUTLINE
+def _sections_from_outline(reader: PdfReader, pages: List[str]) -> List[Tuple[str, str]]:
+    try:
+        outline = reader.outline
+    except Exception:
+        return []
+
+    marks = []
+    for item in outline or []:
+        if isinstance(item, list):  # sous-niveaux : ignorés, on découpe au premier niveau
+            continue
+        try:
+            marks.append((reader.get_destination_page_number(item), str(item.title).strip()))
+        except Exception:
+            continue
+
+    marks = sorted({page: title for page, title in marks}.items())
+    if len(marks) < 2:
+        return []
+
+    sections = []
+    for i, (start, title) in enumerate(marks):
+        # le texte qui précède le premier signet est rattaché à la première section
+        first = 0 if i == 0 else start
+        end = marks[i + 1][0] if i + 1 < len(marks) else len(pages)
+        sections.append((title, "\n".join(pages[first:end])))
+    return sections
+
+
+# ───────────────────── HEADINGS
+def _sections_from_headings(reader: PdfReader, pages: List[str]) -> List[Tuple[str, str]]:
+    large = _large_font_fragments(reader)
+
+    sections: List[Tuple[str, List[str]]] = []
+    current_title, current_lines = "", []
+    for page in pages:
+        for line in page.splitlines():
+            stripped = line.strip()
+            if _is_heading(stripped, large):
+                if current_title or any(l.strip() for l in current_lines):
+                    sections.append((current_title, current_lines))
+                current_title, current_lines = stripped, []
+            else:
+                current_lines.append(line)
+    sections.append((current_title, current_lines))
+
+    if sum(1 for title, _ in sections if title) < 2:
+        return []
+    return [(title, "\n".join(lines)) for title, lines in sections]
+
+
+def _is_heading(line: str, large: set) -> bool:
+    if not (3 <= len(line) <= _HEADING_MAX_CHARS) or line.endswith((".", ",", ";")):
+        return False
+    return bool(_HEADING_RE.match(line)) or line in large
+
+
+def _large_font_fragments(reader: PdfReader) -> set:
+    """Fragments de texte écrits nettement plus gros que le corps du document."""
+    fragments: List[Tuple[str, float]] = []
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        text = (text or "").strip()
+        if text and font_size:
+            scale = abs(tm[3]) if tm and tm[3] else 1.0
+            fragments.append((text, float(font_size) * scale))
+
+    for page in reader.pages:
+        try:
+            page.extract_text(visitor_text=visitor)
+        except Exception:
+            continue
+
+    if not fragments:
+        return set()
+    body = statistics.median(size for _, size in fragments)
+    return {text for text, size in fragments if size >= body * _FONT_RATIO}
+
+
+# ───────────────────── REBALANCE
+def _rebalance(sections: List[Tuple[str, str]]) -> List[Dict[str, object]]:
+    merged: List[List[str]] = []
+    for title, text in sections:
+        if merged and len(text.strip()) < _MIN_SECTION_CHARS:
+            merged[-1][1] += "\n" + (f"{title}\n" if title else "") + text
+        else:
+            merged.append([title, text])
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=_MAX_PART_CHARS, chunk_overlap=0)
+    result = []
+    for title, text in merged:
+        parts = splitter.split_text(text) if len(text) > _MAX_PART_CHARS else [text]
+        parts = [p for p in parts if p.strip()]
+        if parts:
+            result.append({"title": title, "parts": parts})
+    return result
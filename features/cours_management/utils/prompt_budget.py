@@ -0,0 +1,170 @@
+"""
+Gestion du budget de tokens des prompts.
+Ce module compte les tokens avec tiktoken et répartit la fenêtre de contexte
+d'un modèle entre les différentes parties d'un prompt (message système,
+historique, passages RAG, message utilisateur) selon leur priorité.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Union
+
+_LOG = logging.getLogger(__name__)
+
+# Fenêtres de contexte connues (tokens)
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "llama3-8b-8192": 8192,
+    "deepseek/deepseek-chat:latest": 64000,
+    "deepseek/deepseek-coder:6.7b": 16000,
+}
+_DEFAULT_CONTEXT_WINDOW = 8192
+_DEFAULT_OUTPUT_RESERVE = 1024
+_CHARS_PER_TOKEN = 4  # approximation si l'encodeur tiktoken est indisponible
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                _LOG.warning("tiktoken indisponible (%s) → estimation par caractères", e)
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens d'un texte (cl100k_base, proche des tokenizers Llama/DeepSeek)."""
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if not enc:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    Tronque un texte à `max_tokens` tokens.
+
+    Args:
+        text: Texte à tronquer
+        max_tokens: Nombre maximal de tokens conservés
+        keep: "head" pour garder le début, "tail" pour garder la fin
+
+    Returns:
+        Texte tronqué (suffixé/préfixé par « … » si coupé)
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    enc = _get_encoding()
+    if not enc:
+        limit = max_tokens * _CHARS_PER_TOKEN
+        if len(text) <= limit:
+            return text
+        return text[:limit] + "…" if keep == "head" else "…" + text[-limit:]
+
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    if keep == "head":
+        return enc.decode(tokens[:max_tokens]) + "…"
+    return "…" + enc.decode(tokens[-max_tokens:])
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, _DEFAULT_CONTEXT_WINDOW)
+
+
+def prompt_tokens(prompt) -> int:
+    """Tokens de la partie fixe d'un ChatPromptTemplate (gabarits sans variables)."""
+    total = 0
+    for message in getattr(prompt, "messages", []):
+        template = getattr(getattr(message, "prompt", None), "template", "")
+        total += count_tokens(template) if isinstance(template, str) else 0
+    return total
+
+
+class PromptBudget:
+    """
+    Répartit le budget de tokens d'un modèle entre les sections d'un prompt.
+    Les sections sont servies par priorité croissante (0 = la plus importante) ;
+    une section texte est tronquée si nécessaire, une section liste (historique,
+    chunks RAG) est remplie élément par élément tant que le budget le permet.
+    """
+
+    def __init__(self, model: str = "llama3-8b-8192",
+                 reserved_tokens: int = 0,
+                 output_tokens: int = _DEFAULT_OUTPUT_RESERVE):
+        """
+        Args:
+            model: Nom du modèle cible (détermine la fenêtre de contexte)
+            reserved_tokens: Tokens déjà consommés par la partie fixe du prompt
+            output_tokens: Tokens réservés à la génération
+        """
+        self.model = model
+        self.total = context_window(model) - reserved_tokens - output_tokens
+        self.remaining = max(self.total, 0)  # mis à jour par `pack`
+        self._sections: List[Dict] = []
+
+    def add(self, name: str, content: Union[str, List[str]], priority: int,
+            max_tokens: Optional[int] = None, keep: str = "head",
+            reverse: bool = False) -> "PromptBudget":
+        """
+        Déclare une section du prompt.
+
+        Args:
+            name: Nom de la section (clé du résultat de `pack`)
+            content: Texte, ou liste d'éléments ordonnés du plus au moins utile
+            priority: Priorité (0 = servie en premier)
+            max_tokens: Plafond propre à la section
+            keep: Partie conservée lors d'une troncature de texte ("head" / "tail")
+            reverse: Restitue les éléments retenus d'une liste dans l'ordre inverse
+                (historique rempli du plus récent au plus ancien, affiché chronologiquement)
+        """
+        self._sections.append({
+            "name": name, "content": content, "priority": priority,
+            "max_tokens": max_tokens, "keep": keep, "reverse": reverse,
+            "order": len(self._sections)
+        })
+        return self
+
+    def pack(self, separator: str = "\n") -> Dict[str, str]:
+        """
+        Remplit glouton les sections par priorité.
+
+        Returns:
+            Dictionnaire nom de section → texte retenu
+        """
+        remaining = max(self.total, 0)
+        packed: Dict[str, str] = {}
+
+        for sec in sorted(self._sections, key=lambda s: (s["priority"], s["order"])):
+            cap = remaining if sec["max_tokens"] is None else min(remaining, sec["max_tokens"])
+            content = sec["content"]
+
+            if isinstance(content, list):
+                kept, used = [], 0
+                sep_cost = count_tokens(separator)
+                for item in content:
+                    cost = count_tokens(item) + (sep_cost if kept else 0)
+                    if used + cost > cap:
+                        break
+                    kept.append(item)
+                    used += cost
+                packed[sec["name"]] = separator.join(reversed(kept) if sec["reverse"] else kept)
+            else:
+                text = truncate_tokens(content or "", cap, keep=sec["keep"])
+                used = count_tokens(text)
+                packed[sec["name"]] = text
+
+            remaining -= used
+
+        self.remaining = remaining
+        _LOG.debug("Budget %s: %d/%d tokens utilisés", self.model, self.total - remaining, self.total)
+        return packed
@@ -1,13 +1,14 @@
 # features/cours_management/workflow/cours_graph.py
 # ──────────────────────────────────────────────────────────────────────────────
-import io, logging, operator
-from typing import TypedDict, Annotated, List, Optional
+import contextlib, contextvars, functools, io, logging, re
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Annotated, List, Optional, Tuple
 
 from langgraph.graph          import StateGraph, END
-from langchain_core.messages  import HumanMessage, SystemMessage
+from langgraph.types          import Send
+from langchain_core.messages  import AIMessage, BaseMessage
 from PyPDF2                   import PdfReader
 
-from features.cours_management.memory_course.conversation_memory import ConversationMemory
 from features.cours_management.agents.rag_agent        import RAGAgent
 from features.cours_management.agents.SummarizeAgent   import UnifiedCourseAgent
 from features.cours_management.agents.PDFInteractionAgent import PDFInteractionAgent
@@ -21,44 +22,120 @@ from features.user_management.tools.user_tools         import UserTools
 from features.cours_management.tools.cours_tools       import CourseTools
 from features.chatbot.tools.chatbot_tools              import ChatbotTools
 from features.cours_management.memory_course.agent_memory import AgentMemory
+from features.cours_management.memory_course.memory_singleton import MemorySingleton
+from features.cours_management.utils.pdf_index import PDFIndex
+from features.cours_management.utils.pdf_cache import PDFHandle
+from features.cours_management.utils.prompt_budget import PromptBudget, prompt_tokens, truncate_tokens, count_tokens
+from features.cours_management.utils.concurrency import Deferred, timed, singleflight, make_key
+from features.common.streaming import suspend_stream
+from infrastructure.llm_rate_limiter import LLMBackpressureError
+from infrastructure.checkpointer import get_checkpointer
+from infrastructure.service_container import services
 
 # ──────────────────────────────────────────────────────────────────────────────
 
 # 1. État ─────────────────────────────────────────────────────────────────────
+MAX_STATE_MESSAGES = 40  # messages conservés dans l'état (et donc dans les checkpoints)
+
+def _append_messages(left: List[BaseMessage], right: List[BaseMessage]) -> List[BaseMessage]:
+    """Réducteur de `messages` : ajout en fin de liste, borné aux derniers messages."""
+    return (list(left or []) + list(right or []))[-MAX_STATE_MESSAGES:]
+
+def _merge_op_results(left: Optional[List[dict]], right: Optional[List[dict]]) -> List[dict]:
+    """Réducteur de `op_results` : fusion des branches parallèles ; None remet à zéro (nouveau tour)."""
+    if right is None:
+        return []
+    return list(left or []) + list(right)
+
 class GraphState(TypedDict):
-    messages           : Annotated[List[HumanMessage], operator.add]
+    messages           : Annotated[List[BaseMessage], _append_messages]
     detected_operations: List[dict]
     pending_operations : List[dict]
-    results            : List[dict]
+    results            : List[dict]  # résultats fusionnés, dans l'ordre de la demande
+    op_results         : Annotated[List[dict], _merge_op_results]  # un par opération exécutée
     error              : Optional[str]
-    pdf_bytes          : Optional[bytes]
+    pdf                : Optional[PDFHandle]  # référence, le contenu reste dans pdf_cache
     user_role          : Optional[str]
     user_id            : Optional[str]
     conversation_id    : str
     rag_context        : Optional[str]
     history_list       : Optional[List[str]]
+    recent_conversations: Optional[List[dict]]
 
 # 2. Instances globales ───────────────────────────────────────────────────────
-conversation_memory = ConversationMemory()
-schedule_agent   = ScheduleAgent()
-course_agent     = CourseAgent()
-user_agent       = UserAgent()
-chatbot_tools    = ChatbotTools()
-suggestion_agent = SuggestionAgent()
-rag_agent        = RAGAgent()
-router           = OperationDetectionAgent()
-summ_agent       = UnifiedCourseAgent()
-quiz_agent       = QuizAgent()
-pdf_agent = PDFInteractionAgent()
-system_memory    = AgentMemory(agent_type="system")
+# construites au premier usage (ou au préchauffage, voir main.py) : importer le
+# graphe ne charge ni modèle d'embedding ni connexion Qdrant
+conversation_memory = services.register("conversation_memory", MemorySingleton.get_conversation_memory)
+schedule_agent   = services.register("schedule_agent", ScheduleAgent)
+course_agent     = services.register("course_agent", CourseAgent)
+user_agent       = services.register("user_agent", UserAgent)
+chatbot_tools    = services.register("chatbot_tools", ChatbotTools)
+suggestion_agent = services.register("suggestion_agent", SuggestionAgent)
+rag_agent        = services.register("rag_agent", RAGAgent)
+router           = services.register("router", OperationDetectionAgent)
+summ_agent       = services.register("summ_agent", UnifiedCourseAgent, warm=False)
+quiz_agent       = services.register("quiz_agent", QuizAgent)
+pdf_agent        = services.register("pdf_agent", PDFInteractionAgent)
+system_memory    = services.register("system_memory", lambda: AgentMemory(agent_type="system"))
+pdf_cache        = MemorySingleton.get_pdf_cache()
+# préférences et routage lancés en parallèle à chaque tour
+prefetch_pool    = ThreadPoolExecutor(max_workers=8, thread_name_prefix="detect")
 
 builder            = StateGraph(GraphState)
-MAX_CONTEXT_LENGTH = 3_000
+CONTEXT_MODEL      = "llama3-8b-8192"
 MAX_HISTORY        = 10
+PDF_TOP_K          = 4
+MAX_INPUT_TOKENS   = 1_500
+MAX_PREFS_TOKENS   = 200
+OUTPUT_TOKENS      = 1_024
+RAG_CONTEXT_TOKENS = 2_000
+MAX_STATE_ASSISTANT_TOKENS = 200
+RAG_ROUTES         = {"course", "qa", "chat"}  # routes qui consomment le contexte RAG
+SPECULATIVE_RAG    = True  # lance la recherche pendant le routage, abandonnée si inutile
 
 # 3. Utilitaires ──────────────────────────────────────────────────────────────
-def truncate(txt: str, n: int = MAX_CONTEXT_LENGTH) -> str:
-    return txt if len(txt) <= n else txt[:n] + "…"
+@functools.lru_cache(maxsize=1)
+def _course_prompt_tokens() -> int:
+    """Tokens du prompt système de CourseAgent, qui reçoit l'historique et le RAG."""
+    return prompt_tokens(course_agent.prompt)
+
+def _context_budget(last: str, history: List[str]) -> Tuple[dict, int]:
+    """
+    Répartit la fenêtre du modèle : message > historique récent, puis RAG et
+    préférences dans le reste. Seuls le message et l'historique sont nécessaires
+    au routage ; RAG et préférences peuvent donc arriver après lui.
+    """
+    budget = PromptBudget(CONTEXT_MODEL,
+                          reserved_tokens=_course_prompt_tokens(),
+                          output_tokens=OUTPUT_TOKENS)
+    budget.add("input", last, priority=0, max_tokens=MAX_INPUT_TOKENS)
+    budget.add("history", history, priority=1, reverse=True)
+    packed = budget.pack()
+    return packed, budget.remaining
+
+def _rag_context(query: str) -> str:
+    try:
+        return rag_agent.process_query(query, max_tokens=RAG_CONTEXT_TOKENS).get("enriched_context", "")
+    except Exception as e:
+        logging.warning("RAG indisponible: %s", e)
+        return ""
+
+def _turns_from_messages(messages: List[BaseMessage]) -> List[List[str]]:
+    """Échanges précédents tirés de l'état checkpointé, du plus récent au plus ancien."""
+    turns: List[List[str]] = []
+    for msg in messages:
+        if msg.type == "human" or not turns:
+            turns.append([])
+        role = "User" if msg.type == "human" else "Assistant"
+        turns[-1].append(f"{role}: {msg.content}")
+    return turns[::-1]
+
+def _user_preferences(user_id: str) -> str:
+    try:
+        prefs = system_memory.get_user_preferences(user_id)
+        return f"Préférences utilisateur: {prefs}\n"
+    except Exception:
+        return ""
 
 def _extract_text(pdf: bytes) -> str:
     try:
@@ -68,258 +145,470 @@ def _extract_text(pdf: bytes) -> str:
         logging.warning("PDF extraction failed: %s", e)
         return ""
 
+# demandes portant sur tout le document : le texte complet, pas quelques passages
+_WHOLE_PDF_RE = re.compile(
+    r"\b(r[ée]sum[ée]r?|r[ée]sume[zs]?|summar(y|ize|ise)|synth[èe]se|de quoi (parle|traite)|what is (it|this) about)\b"
+    r"(?!.{0,40}\b(section|chapitre|chapter|partie|part|page|paragraphe|paragraph)\b)",
+    re.IGNORECASE,
+)
+
+
+def _is_whole_pdf_request(message: str) -> bool:
+    return not message.strip() or bool(_WHOLE_PDF_RE.search(message))
+
+
+def index_pdf(user_id: str, conv_id: Optional[str]) -> Optional[PDFIndex]:
+    """
+    Index vectoriel du PDF en cache pour cette conversation, construit une
+    seule fois par dépôt : appelé en arrière-plan dès l'upload, les questions
+    arrivées pendant la construction attendent le même calcul.
+    """
+    pdf = pdf_cache.handle(user_id, conv_id)
+    if pdf is None:
+        return None
+    index = pdf_cache.get_index(user_id, conv_id)
+    if index is None:
+        # index en lecture seule, lié au modèle d'encodage (non copiable) : partagé tel quel
+        index = singleflight.do(make_key("pdf_index", pdf["sha256"]), _build_pdf_index, pdf,
+                                copy_result=False)
+        current = pdf_cache.handle(user_id, conv_id)
+        if index is not None and current and current["sha256"] == pdf["sha256"]:
+            pdf_cache.set_index(user_id, index, conv_id)
+    return index
+
+
+def _build_pdf_index(pdf: PDFHandle) -> Optional[PDFIndex]:
+    text = _extract_text(pdf_cache.resolve(pdf) or b"")
+    embeddings = getattr(MemorySingleton.get_qdrant_rag(), "embeddings", None)
+    return PDFIndex.build(text, embeddings)
+
+
+def _pdf_context(user_id: str, conv_id: str, pdf: PDFHandle, question: str) -> str:
+    """
+    Contexte PDF pour la demande : texte complet pour un résumé global,
+    sinon les passages pertinents pour la question.
+    """
+    if not _is_whole_pdf_request(question):
+        index = index_pdf(user_id, conv_id)
+        if index is not None:
+            return index.context(question, k=PDF_TOP_K)
+    return _extract_text(pdf_cache.resolve(pdf) or b"")
+
 # 4. Routage ─ detect_operations ─────────────────────────────────────────────
+def _operation_for(label: str, text: str, ctx: dict) -> dict:
+    """Opération correspondant à une catégorie du routeur, pour la partie `text` du message."""
+    role, pdf = ctx["role"], ctx["pdf"]
+
+    if label == "process_pdf":
+        if not pdf:
+            return {"operation": "response", "parameters": {"response": "Aucun PDF fourni."}}
+        if role not in {"instructor", "professor"}:
+            return {"operation": "response", "parameters": {"response": "Vous n'êtes pas autorisé à importer un PDF."}}
+        return {"operation": "process_pdf", "parameters": {"pdf": pdf}}
+
+    if label == "summarize":
+        raw_text = _pdf_context(ctx["user_id"], ctx["conv_id"], pdf, text) if pdf else text
+        return {"operation": "summarize", "parameters": {"text": raw_text, "user_message": text}}
+
+    if label == "qa":
+        return {"operation": "qa", "parameters": {"question": text}}
+
+    if label == "quiz":
+        return {"operation": "quiz", "parameters": {}}
+
+    if label == "show_calendar":
+        return {"operation": "show_calendar", "parameters": {}}
+
+    if label == "schedule_session":
+        if role in {"instructor", "professor"}:
+            return schedule_agent.detect_operation(text)
+        return {"operation": "response", "parameters": {"response": "Seuls les instructeurs peuvent planifier une session live."}}
+
+    if label == "get_user_memories":
+        mem = conversation_memory.get_recent_conversations(ctx["user_id"])
+        ans = course_agent.answer_about_memories(mem, text)
+        return {"operation": "response", "parameters": {"response": ans.get("response", "")}}
+
+    if label == "user":
+        return user_agent.detect_operation(text)
+
+    if label == "course":
+        return course_agent.detect_operation(user_input=truncate_tokens(text, MAX_INPUT_TOKENS),
+                                             history=ctx["history"], memories=ctx["rag"])
+
+    # fallback
+    return {"operation": "chat", "parameters": {"input": text, "history": ctx["history"]}}
+
+def _operations_for(routes: List[Tuple[str, str]], message: str, ctx: dict) -> List[dict]:
+    """
+    Opérations des catégories détectées ; une demande simple garde le message
+    entier. Pour une demande multiple, les sous-détections (appels LLM des
+    agents cours / utilisateur / planning) partent en parallèle, chacune dans
+    une copie du contexte de la requête.
+    """
+    if len(routes) == 1:
+        return [_operation_for(routes[0][0], message, ctx)]
+
+    def detect(label: str, text: str) -> dict:
+        with suspend_stream():
+            return _operation_for(label, text, ctx)
+
+    futures = [prefetch_pool.submit(contextvars.copy_context().run, detect, label, text)
+               for label, text in routes]
+    return [f.result() for f in futures]
+
+# ressource touchée par chaque opération, et si elle la modifie
+_OP_RESOURCES = {
+    "update_course": ("course", True), "delete_course": ("course", True),
+    "create_course": ("course", False), "get_course_by_id": ("course", False),
+    "search_courses_advanced": ("course", False), "answer_course": ("course", False),
+    "summarize": ("pdf", False), "process_pdf": ("pdf", False),
+}
+
+def _resource(name: str) -> Tuple[Optional[str], bool]:
+    if name.startswith(("create_user", "update_user", "delete_user")):
+        return "user", True
+    if name.startswith("get_user"):
+        return "user", False
+    return _OP_RESOURCES.get(name, (None, False))
+
+def _with_dependencies(ops: List[dict]) -> List[dict]:
+    """
+    Ajoute `depends_on` à chaque opération : elle attend les opérations
+    précédentes qui touchent la même ressource si l'une des deux l'écrit.
+    Les autres s'exécutent en parallèle.
+    """
+    for i, op in enumerate(ops):
+        res, writes = _resource(op["operation"])
+        op["depends_on"] = [
+            j for j in range(i)
+            if res and _resource(ops[j]["operation"])[0] == res
+            and (writes or _resource(ops[j]["operation"])[1])
+        ]
+    return ops
+
 def detect_operations(state: GraphState) -> GraphState:
     last      = state["messages"][-1].content
     role      = (state.get("user_role") or "public").lower()
     user_id   = state.get("user_id") or ""
     conv_id   = state["conversation_id"]
-    pdf       = state.get("pdf_bytes")
+    pdf       = state.get("pdf")
     has_pdf   = bool(pdf)
+    state["op_results"] = None  # remet à zéro les résultats du tour précédent (voir réducteur)
 
     # 0️⃣ PDF sans message → suggestions
     if has_pdf and not last.strip():
         suggestions = course_agent.generate_pdf_suggestions(role)
-        op = {"operation": "response", "parameters": {"response": suggestions}}
+        op = {"operation": "response", "parameters": {"response": suggestions}, "depends_on": []}
         state["detected_operations"] = [op]
         state["pending_operations"]  = [op]
         state["history_list"] = []
         return state
 
-    # 1️⃣ Historique + Mémoire enrichie
-    raw_history = []
-    hist_ctx = ""
-    for conv in conversation_memory.get_recent_conversations(user_id, conv_id, MAX_HISTORY):
-        for m in conv.get("messages", []):
-            entry = f"{m['role'].capitalize()}: {m['content']}"
-            raw_history.append(entry)
-            hist_ctx += entry + "\n"
-    hist_ctx = truncate(hist_ctx)
+    # 1️⃣ Historique + Mémoire enrichie (préférences en parallèle, pour CourseAgent)
+    timings: dict = {}
+    prefs = Deferred(timed, timings, "prefs", _user_preferences, user_id).start(prefetch_pool)
+
+    convs = state.get("recent_conversations")
+    prior = state["messages"][:-1]
+    if convs is not None:  # préchargé par l'endpoint
+        turn_entries = [[f"{m['role'].capitalize()}: {m['content']}" for m in conv.get("messages", [])]
+                        for conv in convs]
+    elif prior:            # conversation reprise depuis le checkpoint
+        turn_entries = _turns_from_messages(prior)[:MAX_HISTORY]
+    else:
+        convs = timed(timings, "history", conversation_memory.get_recent_conversations,
+                      user_id, conv_id, MAX_HISTORY)
+        turn_entries = [[f"{m['role'].capitalize()}: {m['content']}" for m in conv.get("messages", [])]
+                        for conv in convs]
+    raw_history = [entry for entries in turn_entries for entry in entries]
+    hist_turns  = ["\n".join(entries) for entries in turn_entries if entries]  # du plus récent au plus ancien
     state["history_list"] = raw_history
 
-    try:
-        prefs = system_memory.get_user_preferences(user_id)
-        mem_info = f"Préférences utilisateur: {prefs}\n"
-    except Exception:
-        mem_info = ""
-
-    rag_info = state.get("rag_context", "")
-    system_intro = f"Vous êtes un assistant intelligent.\n{mem_info}\n{hist_ctx}\nConnaissances disponibles:\n{rag_info}".strip()
-    state["messages"].insert(0, SystemMessage(content=truncate(system_intro, MAX_CONTEXT_LENGTH)))
-
-    # 2️⃣ Détection
-    label = router.detect_category(
-        last, role, has_pdf,
-        history=hist_ctx,
-        user_id=user_id,
-        conversation_id=conv_id
-    )
-    print (label)
-    # 3️⃣ Mapping label → opération
-    if label == "process_pdf":
-        if not has_pdf:
-            op = {"operation": "response", "parameters": {"response": "Aucun PDF fourni."}}
-        elif role not in {"instructor", "professor"}:
-            op = {"operation": "response", "parameters": {"response": "Vous n'êtes pas autorisé à importer un PDF."}}
-        else:
-            op = {"operation": "process_pdf", "parameters": {"pdf_bytes": pdf}}
-
-    elif label == "summarize":
-        raw_text = _extract_text(pdf) if has_pdf else last
-        op = {"operation": "summarize", "parameters": {
-            "text": raw_text,
-            "user_message": last
-        }}
-
-    elif label == "qa":
-        op = {"operation": "qa", "parameters": {"question": last}}
-
-    elif label == "quiz":
-        op = {"operation": "quiz", "parameters": {}}
-
-    elif label == "show_calendar":
-        op = {"operation": "show_calendar", "parameters": {}}
-
-    elif label == "schedule_session":
-        op = schedule_agent.detect_operation(last) if role in {"instructor", "professor"} else {"operation": "response", "parameters": {"response": "Seuls les instructeurs peuvent planifier une session live."}}
-
-   
-    elif label == "get_user_memories":
-        mem = conversation_memory.get_recent_conversations(user_id)
-        ans = course_agent.answer_about_memories(mem, last)
-        op  = {"operation": "response", "parameters": {"response": ans.get("response", "")}}
-
-    elif label == "user":
-        op = user_agent.detect_operation(last)
-
-    elif label == "course":
-        op = course_agent.detect_operation(user_input=last, history=hist_ctx, memories=rag_info)
-
-    else:  # fallback
-        op = {"operation": "chat", "parameters": {"input": last, "history": hist_ctx}}
+    packed, remaining = _context_budget(last, hist_turns)
+    hist_ctx = packed["history"]
+
+    # Contexte RAG : dépendance paresseuse, fourni par l'appelant ou recherché
+    # seulement si la route l'utilise (éventuellement en spéculatif)
+    if state.get("rag_context") is not None:
+        rag = Deferred(lambda: state["rag_context"])
+    else:
+        rag = Deferred(timed, timings, "rag", _rag_context, last)
+        if SPECULATIVE_RAG and last.strip():
+            rag.start(prefetch_pool)
+
+    # 2️⃣ Détection (une ou plusieurs catégories), pendant que préférences et RAG se chargent
+    routes = timed(timings, "route", router.detect_categories,
+                   last, role, has_pdf,
+                   history=hist_ctx,
+                   user_id=user_id,
+                   conversation_id=conv_id)
+    labels = [label for label, _ in routes]
+
+    if RAG_ROUTES.intersection(labels):
+        rag_info = truncate_tokens(rag.get(), remaining)
+    else:
+        rag.cancel()  # une recherche déjà lancée s'achève, son résultat est ignoré
+        rag_info = ""
+    state["rag_context"] = rag_info
+
+    # préférences : seul le prompt de CourseAgent les reçoit, dans le budget restant
+    if "course" in labels:
+        prefs_budget = min(remaining - count_tokens(rag_info), MAX_PREFS_TOKENS)
+        memories = f"{truncate_tokens(prefs.get(), prefs_budget)}{rag_info}"
+    else:
+        prefs.cancel()
+        memories = rag_info
+
+    # 3️⃣ Mapping label → opération (sous-détections en parallèle)
+    ctx = {"role": role, "user_id": user_id, "conv_id": conv_id, "pdf": pdf,
+           "history": hist_ctx, "rag": memories}
+    ops = timed(timings, "operations", _operations_for, routes, last, ctx)
+    logging.info("detect_operations → %s (durées: %s)", labels, timings)
 
     # 4️⃣ Contrôle accès étudiant
-    if op["operation"] in {"create_course", "update_course", "delete_course"} and role == "student":
-        op = {"operation": "response", "parameters": {"response": "Vous n’êtes pas autorisé à modifier les cours."}}
+    for i, op in enumerate(ops):
+        if op["operation"] in {"create_course", "update_course", "delete_course"} and role == "student":
+            ops[i] = {"operation": "response", "parameters": {"response": "Vous n’êtes pas autorisé à modifier les cours."}}
 
-    state["detected_operations"] = [op]
-    state["pending_operations"]  = [op]
+    ops = _with_dependencies(ops)
+    state["detected_operations"] = ops
+    state["pending_operations"]  = ops
     return state
 
 # 5. Exécution ─ execute_operation ───────────────────────────────────────────
-def execute_operation(state: GraphState) -> GraphState:
-    if state.get("error") or not state["pending_operations"]:
-        return state
-
-    op       = state["pending_operations"].pop(0)
+class OperationTask(TypedDict):
+    """Entrée d'une branche d'exécution (une opération, envoyée par `Send`)."""
+    index          : int
+    operation      : dict
+    blocked_by     : Optional[str]
+    parallel       : bool
+    user_role      : Optional[str]
+    user_id        : Optional[str]
+    conversation_id: str
+    pdf            : Optional[PDFHandle]
+
+def _run_operation(op: dict, task: OperationTask) -> List[dict]:
+    """Exécute une opération et retourne ses résultats ; lève une exception en cas d'échec."""
     name     = op["operation"]
-    params   = op.get("parameters", {}) or {}
-    role     = (state.get("user_role") or "public").lower()
-    user_id  = state.get("user_id") or ""
-    conv_id  = state["conversation_id"]
-    history  = state.get("history_list") or []
-
+    params   = dict(op.get("parameters", {}) or {})
+    role     = (task.get("user_role") or "public").lower()
+    user_id  = task.get("user_id") or ""
+    conv_id  = task["conversation_id"]
+
+    # Calendrier --------------------------------------------------------
+    if name == "show_calendar":
+        return [{"requires_validation": True, "view": "calendar"}]
+
+    # Import PDF --------------------------------------------------------
+    if name == "process_pdf":
+        pdf = pdf_cache.resolve(task.get("pdf") or params.get("pdf"))
+        if not pdf:
+            raise ValueError("Aucun PDF fourni (ou PDF expiré).")
+        res = course_agent.process_pdf(pdf)
+        if "error" in res:
+            raise RuntimeError(res["error"])
+        res["parameters"]["user_role"] = role
+        return [{
+            "validation_required": True,
+            "operation": "create_course",
+            "course_data": res["parameters"]
+        }]
+
+    # Résumé ------------------------------------------------------------
+    if name == "summarize":
+        summary = pdf_agent.run(
+            raw_text=params.get("text", ""),
+            user_message=params.get("user_message", ""),
+            user_id=user_id,
+            conversation_id=conv_id
+        )
+        return [{"response": summary}]
+
+    # Création de cours (owner_id auto) ---------------------------------
+    if name == "create_course":
+        params["owner_id"] = user_id
+        return [{
+            "validation_required": True,
+            "operation": "create_course",
+            "course_data": params
+        }]
+
+    # Update / Delete : contrôle propriétaire ---------------------------
+    if name in {"update_course", "delete_course"}:
+        if role == "student":
+            return [{"error": "Action non autorisée pour les étudiants."}]
+        course_id = params.get("course_id")
+        if not course_id:
+            return [{"error": "course_id manquant"}]
+        course = CourseTools.get_course_by_id.invoke({"course_id": course_id}).get("course")
+        owner_id = course.get("owner_id") if course else None
+        if owner_id and str(owner_id) != user_id and role in {"instructor", "professor"}:
+            return [{"error": "Vous ne pouvez modifier que vos propres cours."}]
+        return [getattr(CourseTools, name).invoke(params)]
+
+    # Lecture / recherche cours ----------------------------------------
+    if name in {"get_course_by_id", "search_courses_advanced"}:
+        return [getattr(CourseTools, name).invoke(params)]
+
+    if name == "schedule_session":
+        # contrôle simple des dates
+        if params["start_time"] >= params["end_time"]:
+            raise ValueError("La date de fin doit être après la date de début")
+        return [{
+            "validation_required": True,
+            "operation": "schedule_session",
+            "session_data": params
+        }]
+
+    # Quiz --------------------------------------------------------------
+    if name == "quiz":
+        quizzes = quiz_agent.generate_quiz_for_chapters_async(-1, params.get("chapters", []))
+        return [{"response": quizzes}]
+
+    # Chat --------------------------------------------------------------
+    if name == "chat":
+        return [{"response": chatbot_tools.chat_tool.invoke(params.pop("input"))}]
+
+    if name == "answer_course":
+        # Nouvelle prise en charge de la question sur le cours
+        ans = course_agent.answer_course_question(params.get("question", ""), params.get("course_title", ""))
+        return [{"response": ans.get("parameters", {}).get("response", "")}]
+
+    # Réponse prête -----------------------------------------------------
+    if name == "response":
+        return [{"response": params.get("response", "")}]
+
+    # Opération utilisateur (CRUD) -------------------------------------
+    if name.startswith(("get_user", "create_user", "update_user", "delete_user")):
+        return [getattr(UserTools, name).invoke(params)]
+
+    return [{"error": f"Opération inconnue : {name}"}]
+
+def execute_operation(task: OperationTask) -> dict:
+    """Branche d'exécution d'une opération ; son résultat est fusionné par le réducteur `op_results`."""
+    op = task["operation"]
+    outcome = {"index": task["index"], "operation": op["operation"], "results": [], "error": None}
+    if task.get("blocked_by"):
+        outcome["error"] = task["blocked_by"]
+        return {"op_results": [outcome]}
+
+    timings: dict = {}
     try:
-        # Calendrier --------------------------------------------------------
-        if name == "show_calendar":
-            state["results"] = [{"requires_validation": True, "view": "calendar"}]
-
-        # Import PDF --------------------------------------------------------
-        elif name == "process_pdf":
-            pdf = state.get("pdf_bytes") or params.get("pdf_bytes")
-            if not pdf:
-                raise ValueError("Aucun PDF fourni.")
-            res = course_agent.process_pdf(pdf)
-            if "error" in res:
-                raise RuntimeError(res["error"])
-            res["parameters"]["user_role"] = role
-            state["results"] = [{
-                "validation_required": True,
-                "operation": "create_course",
-                "course_data": res["parameters"]
-            }]
-
-        # Résumé ------------------------------------------------------------
-        elif name == "summarize":
-            text = params.get("text", "")
-            user_msg = params.get("user_message", "")
-            summary = pdf_agent.run(
-                raw_text=text,
-                user_message=user_msg,
-                user_id=user_id,
-                conversation_id=conv_id
-            )
+        # plusieurs branches simultanées : leurs tokens s'entremêleraient dans le flux SSE,
+        # la réponse fusionnée n'est alors livrée qu'à la fin
+        with (suspend_stream() if task.get("parallel") else contextlib.nullcontext()):
+            outcome["results"] = timed(timings, op["operation"], _run_operation, op, task)
+        logging.info("execute_operation[%d] %s (durées: %s)", task["index"], op["operation"], timings)
+    except LLMBackpressureError:
+        raise  # remonté à l'endpoint (503 + Retry-After)
+    except Exception as e:
+        outcome["error"] = str(e)
+    return {"op_results": [outcome]}
+
+def dispatch_operations(state: GraphState):
+    """
+    Fan-out : envoie en parallèle toutes les opérations dont les dépendances
+    sont terminées ; quand il n'en reste plus, passe à la fusion.
+    """
+    ops  = state.get("pending_operations") or []
+    done = {r["index"]: r for r in state.get("op_results") or []}
+    wave = [i for i, op in enumerate(ops)
+            if i not in done and all(d in done for d in op.get("depends_on", []))]
+    if state.get("error") or not wave:
+        return "collect_results"
+
+    tasks = []
+    for i in wave:
+        failed = [ops[d]["operation"] for d in ops[i].get("depends_on", []) if done[d].get("error")]
+        tasks.append(Send("execute_operation", {
+            "index": i,
+            "operation": ops[i],
+            "blocked_by": f"Annulée : échec de {', '.join(failed)}" if failed else None,
+            "parallel": len(wave) > 1,
+            "user_role": state.get("user_role"),
+            "user_id": state.get("user_id"),
+            "conversation_id": state["conversation_id"],
+            "pdf": state.get("pdf"),
+        }))
+    return tasks
+
+def join_operations(state: GraphState) -> dict:
+    """Fan-in d'une vague : point de synchronisation avant la vague suivante."""
+    return {}
+
+def collect_results(state: GraphState) -> GraphState:
+    """Fusionne les résultats dans l'ordre de la demande et enregistre l'échange."""
+    outcomes = sorted(state.get("op_results") or [], key=lambda r: r["index"])
+    errors   = [r for r in outcomes if r.get("error")]
+    results: List[dict] = []
+    for r in outcomes:
+        if r.get("error"):
+            if len(outcomes) > 1:  # échec partiel : signalé sans masquer les autres réponses
+                results.append({"operation": r["operation"], "error": r["error"]})
+        else:
+            results.extend(r["results"])
+    state["results"] = results
+    if errors and len(errors) == len(outcomes):
+        state["error"] = "; ".join(r["error"] for r in errors)
+        return state
 
-            print (summary)
-            state["results"].append({"response": summary})
-
-        # QA ---------------------------------------------------------------
-
-
-        # Création de cours (owner_id auto) ---------------------------------
-        elif name == "create_course":
-            params["owner_id"] = user_id
-            state["results"].append({
-                "validation_required": True,
-                "operation": "create_course",
-                "course_data": params
-            })
-
-        # Update / Delete : contrôle propriétaire ---------------------------
-        elif name in {"update_course", "delete_course"}:
-            if role == "student":
-                state["results"].append({"error": "Action non autorisée pour les étudiants."})
-            else:
-                course_id = params.get("course_id")
-                if not course_id:
-                    state["results"].append({"error": "course_id manquant"})
-                else:
-                    course = CourseTools.get_course_by_id.invoke({"course_id": course_id}).get("course")
-                    owner_id = course.get("owner_id") if course else None
-                    if owner_id and str(owner_id) != user_id and role in {"instructor", "professor"}:
-                        state["results"].append({"error": "Vous ne pouvez modifier que vos propres cours."})
-                    else:
-                        tool = getattr(CourseTools, name)
-                        state["results"].append(tool.invoke(params))
-
-        # Lecture / recherche cours ----------------------------------------
-        elif name in {"get_course_by_id", "search_courses_advanced"}:
-            tool = getattr(CourseTools, name)
-            state["results"].append(tool.invoke(params))
-        elif name == "schedule_session":
-            # contrôle simple des dates
-            if params["start_time"] >= params["end_time"]:
-                state["error"] = "La date de fin doit être après la date de début"
-                return state
-
-            state["results"].append({
-                "validation_required": True,
-                "operation": "schedule_session",
-                "session_data": params
-            })
-            return state
-        # Quiz --------------------------------------------------------------
-        elif name == "quiz":
-            quizzes = quiz_agent.generate_quiz_for_chapters_async(-1, params.get("chapters", []))
-            state["results"].append({"response": quizzes})
-
-        # Chat --------------------------------------------------------------
-        elif name == "chat":
-            txt = chatbot_tools.chat_tool.invoke(params.pop("input"))
-            state["results"].append({"response": txt})
-        elif name == "answer_course":
-            # Nouvelle prise en charge de la question sur le cours
-            ans = course_agent.answer_course_question(params.get("question", ""), params.get("course_title", ""))
-            state["results"] = [{"response": ans.get("parameters", {}).get("response", "")}]
-
-        # Réponse prête -----------------------------------------------------
-        elif name == "response":
-            state["results"].append({"response": params.get("response", "")})
-
-        # Opération utilisateur (CRUD) -------------------------------------
-        elif name.startswith(("get_user", "create_user", "update_user", "delete_user")):
-            tool = getattr(UserTools, name)
-            state["results"].append(tool.invoke(params))
-
-        else:  # inconnu
-            state["results"].append({"error": f"Opération inconnue : {name}"})
-
-        # Enregistrement de la réponse assistant avec le dernier message user
-        if state["results"]:
-            responses = []
-            for r in state["results"]:
-                if "response" in r:
-                    responses.append(str(r["response"]))
-                else:
-                    responses.append(str(r))
-            ai_txt = "\n".join(responses)
-
-            user_msg = ""
-            for msg in reversed(state["messages"]):
-                if msg.type == "human":
-                    user_msg = msg.content
-                    break
-
-            if user_msg.strip() or ai_txt.strip():
-                conversation_memory.save_conversation(
-                    user_id=user_id,
-                    user_message=user_msg,
-                    assistant_message=ai_txt,
-                    conversation_id=conv_id,
-                    meta={"stage": "exchange", "user_role": role}
-                )
+    # Enregistrement de la réponse assistant avec le dernier message user
+    if results:
+        role    = (state.get("user_role") or "public").lower()
+        ai_txt  = "\n".join(str(r["response"]) if "response" in r else str(r) for r in results)
 
-    except Exception as e:
-        state["error"] = str(e)
+        user_msg = ""
+        for msg in reversed(state["messages"]):
+            if msg.type == "human":
+                user_msg = msg.content
+                break
+
+        if ai_txt.strip():
+            # nouveau message ajouté à l'état par le réducteur (voir _node)
+            state["messages"] = [AIMessage(content=truncate_tokens(ai_txt, MAX_STATE_ASSISTANT_TOKENS))]
 
+        if user_msg.strip() or ai_txt.strip():
+            conversation_memory.save_conversation(
+                user_id=state.get("user_id") or "",
+                user_message=user_msg,
+                assistant_message=ai_txt,
+                conversation_id=state["conversation_id"],
+                meta={"stage": "exchange", "user_role": role}
+            )
     return state
 
 # 6. Compilation du graphe ───────────────────────────────────────────────────
+_REDUCED_CHANNELS = ("messages", "op_results")
+
+def _node(fn):
+    """
+    Les nœuds retournent l'état complet : les canaux à réducteur reçus tels quels
+    (`messages`, `op_results`) sont retirés de la sortie pour que le réducteur
+    n'ajoute que les nouvelles valeurs (une liste remplacée par le nœud est
+    traitée comme un ajout).
+    """
+    @functools.wraps(fn)
+    def wrapper(state: GraphState) -> dict:
+        incoming = {key: state.get(key) for key in _REDUCED_CHANNELS}
+        out = dict(fn(state))
+        for key, value in incoming.items():
+            if key in out and out[key] is value:
+                out.pop(key)
+        return out
+    return wrapper
+
+# detect → [execute ×N en parallèle] → join → [vague suivante…] → collect
 builder.set_entry_point("detect_operations")
-builder.add_node("detect_operations", detect_operations)
-builder.add_node("execute_operation",  execute_operation)
-builder.add_edge("detect_operations", "execute_operation")
-builder.add_edge("execute_operation", END)
-
-workflow = builder.compile()
+builder.add_node("detect_operations", _node(detect_operations))
+builder.add_node("execute_operation", execute_operation)
+builder.add_node("join_operations",   join_operations)
+builder.add_node("collect_results",   _node(collect_results))
+builder.add_conditional_edges("detect_operations", dispatch_operations, ["execute_operation", "collect_results"])
+builder.add_edge("execute_operation", "join_operations")
+builder.add_conditional_edges("join_operations", dispatch_operations, ["execute_operation", "collect_results"])
+builder.add_edge("collect_results", END)
+
+# état persisté par thread_id (SQLite, msgpack+zstd) ; None si désactivé
+workflow = builder.compile(checkpointer=get_checkpointer())
 # ──────────────────────────────────────────────────────────────────────────────
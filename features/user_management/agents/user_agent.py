@@ -1,9 +1,8 @@
 import json
-import os
 
 from dotenv import load_dotenv
 from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
+from infrastructure.langchain_setup import get_llm
 
 from features.user_management.prompts.user_prompt import build_operation_prompt
 
@@ -19,11 +18,7 @@ class UserAgent:
     def __init__(self):
         load_dotenv()
 
-        self.llm = ChatGroq(
-            model_name="llama3-8b-8192",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.2,
-        )
+        self.llm = get_llm("llama3-8b-8192", temperature=0.2)
 
         self.prompt, self.parser = build_operation_prompt()
         self.chain = LLMChain(llm=self.llm, prompt=self.prompt, verbose=True)
@@ -2,14 +2,12 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import Optional
-from features.cours_management.memory_course.conversation_memory import ConversationMemory
 
-from .auth import authenticate_user, verify_token
+from .auth import authenticate_user, verify_token, revoke_token
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["authentication"])
-conversation_memory = ConversationMemory()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -54,6 +52,13 @@ async def login(credentials: LoginCredentials):
             detail="An error occurred during login"
         )
 
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme)):
+    """Révoque le jeton courant jusqu'à son expiration."""
+    verify_token(token)
+    revoke_token(token)
+    return {"message": "Logged out"}
+
 @router.get("/me", response_model=dict)
 async def read_users_me(current_user: dict = Depends(get_current_user)):
     return current_user
@@ -1,11 +1,19 @@
 import os
 import jwt
+import asyncio
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, status
 from passlib.context import CryptContext
 import logging
-import requests
+import httpx
+
+from features.common.ttl_cache import TTLCache
 BASE_URL = "https://apex.oracle.com/pls/apex/naxxum/"
 # Headers
 HEADERS = {
@@ -20,11 +28,33 @@ logging.basicConfig(filename="debug.log", level=logging.DEBUG)
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt coûte 100–300 ms de CPU : hors de la boucle d'événements, dans un pool
+# plafonné (une vague de connexions attend son tour sans bloquer les autres routes)
+BCRYPT_CONCURRENCY = int(os.getenv("BCRYPT_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_CONCURRENCY, thread_name_prefix="bcrypt")
+
+# Fiches utilisateur APEX gardées quelques secondes (une classe qui se connecte
+# en même temps ne déclenche qu'une requête par email)
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+_user_cache = TTLCache(maxsize=2048, ttl=USER_CACHE_TTL)
+_user_inflight: Dict[str, asyncio.Future] = {}
+_http: Optional[httpx.AsyncClient] = None
+
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
+# Jetons déjà vérifiés : claims gardés jusqu'à leur `exp` (clé = empreinte du jeton)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+_TOKEN_NO_EXP_TTL = 300.0
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=_TOKEN_NO_EXP_TTL)
+# Jetons révoqués : empreinte → `exp`. Jamais évincés avant leur expiration
+# (un cache LRU pourrait « oublier » une révocation), purgés une fois expirés.
+_revoked: Dict[str, float] = {}
+_revoked_lock = threading.Lock()
+_revoked_pruned = 0.0
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -34,6 +64,12 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password exécuté dans le pool bcrypt."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -45,23 +81,75 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     return encoded_jwt
 
 
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Claims du jeton. Un jeton déjà vérifié est servi depuis le cache jusqu'à son
+    `exp` (simple recherche en dictionnaire) ; un jeton révoqué est refusé.
+    """
+    digest = _token_digest(token)
+    if digest in _revoked:
+        logging.error("Token has been revoked")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    claims = _token_cache.get(digest)
+    if claims is not None:
+        return dict(claims)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         logging.error("Token has expired")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired"
         )
-    except jwt.JWTError as e:
+    except jwt.PyJWTError as e:
         logging.error(f"Invalid token: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
+    exp = payload.get("exp")
+    _token_cache.set(digest, payload, expires_at=float(exp) if exp is not None else None)
+    return dict(payload)
+
+
+def revoke_token(token: str) -> None:
+    """Refuse ce jeton jusqu'à son expiration (déconnexion, compte suspendu)."""
+    digest = _token_digest(token)
+    _token_cache.pop(digest)
+    exp = None
+    try:
+        exp = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False}).get("exp")
+    except jwt.PyJWTError:
+        pass
+    with _revoked_lock:
+        # sans `exp`, le jeton reste valide indéfiniment : la révocation aussi
+        _revoked[digest] = float(exp) if exp is not None else float("inf")
+        _prune_revoked()
+
+
+def _prune_revoked() -> None:
+    """Retire les révocations de jetons expirés (au plus une fois par minute)."""
+    global _revoked_pruned
+    now = time.time()
+    if now - _revoked_pruned < 60:
+        return
+    _revoked_pruned = now
+    for digest in [d for d, exp in _revoked.items() if exp <= now]:
+        del _revoked[digest]
+
+
+def token_cache_stats() -> Dict[str, Any]:
+    return {"verified": _token_cache.stats(), "revoked": len(_revoked)}
+
 
 def refresh_token(token: str) -> Optional[str]:
     """Refresh an expired token if it's still valid for refresh"""
@@ -98,46 +186,81 @@ def refresh_token(token: str) -> Optional[str]:
         return None
 
 
-async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
-    try:
-        logging.debug(f"Attempting to authenticate user with email: {email}")
+def _apex_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(headers=HEADERS, timeout=10,
+                                  limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+    return _http
 
-        # Get user from database
-        url = f"{BASE_URL}elearning/users"
-        logging.debug(f"Making request to: {url}")
 
-        response = requests.get(
-            url,
-            params={"email": email},
-            headers=HEADERS
-        )
-        logging.debug(f"Response status code: {response.status_code}")
-        logging.debug(f"Response headers: {response.headers}")
+async def _load_user(email: str) -> Optional[Dict[str, Any]]:
+    url = f"{BASE_URL}elearning/users"
+    logging.debug(f"Making request to: {url}")
 
-        if response.status_code != 200:
-            logging.error(f"Failed to get user data. Status code: {response.status_code}")
-            logging.error(f"Response content: {response.text}")
-            return None
+    response = await _apex_client().get(url, params={"email": email})
+    logging.debug(f"Response status code: {response.status_code}")
 
-        response.raise_for_status()
+    if response.status_code != 200:
+        logging.error(f"Failed to get user data. Status code: {response.status_code}")
+        logging.error(f"Response content: {response.text}")
+        return None
 
-        users = response.json()
-        logging.debug(f"Received users data: {users}")
+    items = (response.json() or {}).get("items") or []
+    return items[0] if items else None
 
-        if not users or len(users) == 0:
-            logging.warning(f"No user found with email: {email}")
-            return None
 
-        user = users.get('items')[0]
-        logging.debug(f"Found user: {user}")
+async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    """
+    Fiche utilisateur APEX, depuis le cache si elle a moins de USER_CACHE_TTL s.
+    Les recherches simultanées du même email partagent une seule requête.
+    """
+    key = email.strip().lower()
+    user = _user_cache.get(key)
+    if user is not None:
+        return user
+    pending = _user_inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
 
-        # For testing purposes, if the password is not hashed, hash it
-        if not user.get("user_password", "").startswith("$2b$"):
-            logging.debug("Password not hashed, hashing it now")
-            user["user_password"] = get_password_hash(password)
+    future = asyncio.get_running_loop().create_future()
+    _user_inflight[key] = future
+    try:
+        user = await _load_user(email)
+        if user is not None:
+            _user_cache.set(key, user)
+        future.set_result(user)
+        return user
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        _user_inflight.pop(key, None)
+        if not future.done():  # requête annulée : les appelants en attente ne restent pas bloqués
+            future.cancel()
+        elif not future.cancelled():
+            future.exception()  # marque l'exception comme consultée si aucun autre appelant n'attendait
+
+
+async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
+    try:
+        logging.debug(f"Attempting to authenticate user with email: {email}")
+
+        # Get user from database (cache + client HTTP asynchrone)
+        user = await get_user_by_email(email)
+        if not user:
+            logging.warning(f"No user found with email: {email}")
+            return None
 
-        # Verify password
-        if not verify_password(password, user.get("user_password", "")):
+        stored = user.get("user_password") or ""
+        if stored.startswith("$2b$"):
+            # Verify password (bcrypt, hors de la boucle)
+            valid = await verify_password_async(password, stored)
+        else:
+            # For testing purposes: mot de passe stocké en clair, comparé sans bcrypt
+            logging.debug("Password not hashed, comparing plaintext")
+            valid = hmac.compare_digest(password.encode(), stored.encode())
+        if not valid:
             logging.warning(f"Invalid password for user: {email}")
             return None
 
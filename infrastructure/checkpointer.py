@@ -0,0 +1,115 @@
+"""
+Checkpointer persistant des graphes LangGraph.
+Adossé à SQLite (WAL), il sérialise l'état en msgpack compressé zstd,
+ne conserve que les N derniers checkpoints par conversation et n'écrit jamais
+les champs volumineux ou transitoires (`pdf_bytes`) : reprendre une
+conversation se résume à une lecture indexée sur thread_id.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Optional, Tuple
+
+import zstandard
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+_LOG = logging.getLogger(__name__)
+
+_DEFAULT_PATH = os.getenv("GRAPH_CHECKPOINT_PATH", "graph_checkpoints.db")
+_ENABLED = os.getenv("GRAPH_CHECKPOINTER", "sqlite").lower() not in {"", "0", "off", "none", "false"}
+_KEEP_LAST = int(os.getenv("GRAPH_CHECKPOINT_KEEP", "5"))
+_COMPRESS_MIN_BYTES = 512
+_ZSTD_SUFFIX = "+zstd"
+
+EXCLUDED_KEYS = frozenset({"pdf_bytes"})
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """Sérialisation msgpack de LangGraph, compressée en zstd au-delà de quelques centaines d'octets."""
+
+    def __init__(self, level: int = 3):
+        super().__init__()
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = super().dumps_typed(obj)
+        if isinstance(data, (bytes, bytearray)) and len(data) >= _COMPRESS_MIN_BYTES:
+            return type_ + _ZSTD_SUFFIX, self._compressor.compress(data)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(_ZSTD_SUFFIX):
+            type_, payload = type_[:-len(_ZSTD_SUFFIX)], self._decompressor.decompress(payload)
+        return super().loads_typed((type_, payload))
+
+
+def _strip(value: Any) -> Any:
+    """Retire récursivement les clés exclues (dictionnaires, listes, tuples)."""
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in EXCLUDED_KEYS}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_strip(v) for v in value)
+    return value
+
+
+class CompactSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver qui filtre l'état persisté et élague l'historique des checkpoints.
+    Seuls les `keep_last` checkpoints les plus récents (et leurs écritures en
+    attente) sont conservés pour chaque (thread_id, checkpoint_ns).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, keep_last: int = _KEEP_LAST):
+        super().__init__(conn, serde=CompactSerializer())
+        self.keep_last = keep_last
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        checkpoint = {**checkpoint, "channel_values": _strip(checkpoint.get("channel_values", {}))}
+        metadata = _strip(metadata)
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._prune(next_config)
+        return next_config
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        writes = [(channel, _strip(value)) for channel, value in writes if channel not in EXCLUDED_KEYS]
+        return super().put_writes(config, writes, task_id, *args, **kwargs)
+
+    def _prune(self, config) -> None:
+        conf = config.get("configurable", {})
+        thread_id, ns = str(conf.get("thread_id")), conf.get("checkpoint_ns", "")
+        keep = """SELECT checkpoint_id FROM checkpoints
+                  WHERE thread_id = ? AND checkpoint_ns = ?
+                  ORDER BY checkpoint_id DESC LIMIT ?"""
+        with self.cursor() as cur:
+            for table in ("checkpoints", "writes"):
+                cur.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                    f"AND checkpoint_id NOT IN ({keep})",
+                    (thread_id, ns, thread_id, ns, self.keep_last))
+
+
+_instance: Optional[CompactSqliteSaver] = None
+_instance_lock = threading.Lock()
+
+
+def get_checkpointer(path: str = _DEFAULT_PATH) -> Optional[CompactSqliteSaver]:
+    """Checkpointer partagé, ou None si désactivé (GRAPH_CHECKPOINTER=off)."""
+    global _instance
+    if not _ENABLED:
+        return None
+    with _instance_lock:
+        if _instance is None:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _instance = CompactSqliteSaver(conn)
+            _LOG.info("Checkpointer LangGraph: %s (%d derniers checkpoints par conversation)",
+                      path, _instance.keep_last)
+        return _instance
@@ -0,0 +1,149 @@
+"""
+Registre partagé des clients LLM.
+Tous les agents obtiennent leur modèle de chat via `get_llm` : une instance
+par (fournisseur, modèle, paramètres), adossée à un pool de connexions HTTP
+unique par fournisseur. Les modèles retournés sont des Runnables LangChain
+standards (invoke / ainvoke / stream / astream) et se composent avec les
+prompts existants (`prompt | llm`). Chaque appel passe par le limiteur de
+débit du fournisseur (llm_rate_limiter), selon la priorité déclarée.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_groq import ChatGroq
+from langchain_openai import ChatOpenAI
+
+from infrastructure.llm_cache import get_llm_cache
+from infrastructure.llm_hedging import HedgedLLM, register_hedged
+from infrastructure.llm_rate_limiter import INTERACTIVE, BACKGROUND, get_rate_limiter
+
+load_dotenv()
+_LOG = logging.getLogger(__name__)
+
+GROQ = "groq"
+OPENROUTER = "openrouter"
+DEFAULT_MODEL = "llama3-8b-8192"
+
+_PROVIDERS: Dict[str, Dict[str, Any]] = {
+    GROQ: {
+        "api_key_env": "GROQ_API_KEY",
+        "max_connections": int(os.getenv("GROQ_MAX_CONNECTIONS", "16")),
+    },
+    OPENROUTER: {
+        "api_key_env": "OPENROUTER_API_KEY",
+        "base_url": "https://openrouter.ai/api/v1",
+        "max_connections": int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "8")),
+    },
+}
+
+
+class LLMRegistry:
+    """
+    Fabrique thread-safe de modèles de chat partagés.
+    Le nombre de connexions simultanées par fournisseur est borné par le pool
+    HTTP : c'est la limite de concurrence globale, quel que soit l'agent appelant.
+    """
+
+    def __init__(self, providers: Dict[str, Dict[str, Any]] = None):
+        self._providers = providers or _PROVIDERS
+        self._models: Dict[Tuple, BaseChatModel] = {}
+        self._http: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+        self._lock = threading.RLock()
+
+    def _http_clients(self, provider: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        with self._lock:
+            if provider not in self._http:
+                size = self._providers[provider]["max_connections"]
+                limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+                self._http[provider] = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+            return self._http[provider]
+
+    def get(self, model: str = DEFAULT_MODEL, temperature: float = 0.2,
+            provider: str = GROQ, priority: int = INTERACTIVE, **kwargs) -> BaseChatModel:
+        """
+        Retourne le modèle partagé correspondant aux paramètres demandés.
+
+        Args:
+            model: Nom du modèle chez le fournisseur
+            temperature: Température d'échantillonnage
+            provider: Fournisseur ("groq" ou "openrouter")
+            priority: INTERACTIVE (tours de chat) ou BACKGROUND (travail de masse)
+            **kwargs: Paramètres supplémentaires du modèle (timeout, max_tokens…) ;
+                `cache=True` active le cache persistant des réponses (llm_cache)
+
+        Returns:
+            Instance de modèle de chat LangChain, créée au premier appel
+        """
+        if provider not in self._providers:
+            raise ValueError(f"Fournisseur LLM inconnu : {provider}")
+
+        key = (provider, model, temperature, priority, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None:
+                llm = self._build(provider, model, temperature, priority, **kwargs)
+                self._models[key] = llm
+                _LOG.info("Client LLM créé: %s/%s (t=%s)", provider, model, temperature)
+            return llm
+
+    def _build(self, provider: str, model: str, temperature: float,
+               priority: int, **kwargs) -> BaseChatModel:
+        conf = self._providers[provider]
+        http_client, http_async_client = self._http_clients(provider)
+        if kwargs.get("cache") is True:
+            kwargs["cache"] = get_llm_cache()
+        bucket = get_rate_limiter(provider)
+        if bucket is not None and "rate_limiter" not in kwargs:
+            kwargs["rate_limiter"] = bucket.for_priority(priority)
+        common = dict(
+            api_key=os.getenv(conf["api_key_env"]),
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **kwargs,
+        )
+        if provider == GROQ:
+            return ChatGroq(model_name=model, **common)
+        return ChatOpenAI(model=model, base_url=conf["base_url"], **common)
+
+    def close(self) -> None:
+        """Ferme les pools HTTP synchrones (les clients asynchrones meurent avec la boucle)."""
+        with self._lock:
+            for client, _ in self._http.values():
+                client.close()
+            self._http.clear()
+            self._models.clear()
+
+
+llm_registry = LLMRegistry()
+
+
+def get_llm(model: str = DEFAULT_MODEL, temperature: float = 0.2,
+            provider: str = GROQ, priority: int = INTERACTIVE, **kwargs) -> BaseChatModel:
+    """Raccourci vers `llm_registry.get`."""
+    return llm_registry.get(model, temperature, provider, priority, **kwargs)
+
+
+def get_hedged_llm(name: str, candidates: List[Dict[str, Any]],
+                   validate: Optional[Callable[[str], bool]] = None) -> HedgedLLM:
+    """
+    Appel couvert sur plusieurs modèles du registre (voir llm_hedging).
+
+    Args:
+        name: Nom de l'appel dans les métriques
+        candidates: Paramètres `get_llm` de chaque modèle, principal en premier
+        validate: Prédicat de validité du texte retourné
+    """
+    models = []
+    for conf in candidates:
+        conf = dict(conf)
+        model = conf.pop("model", DEFAULT_MODEL)
+        provider = conf.pop("provider", GROQ)
+        models.append((provider, model, get_llm(model, provider=provider, **conf)))
+    return register_hedged(HedgedLLM(name, models, validate))
@@ -0,0 +1,150 @@
+"""
+Cache persistant des réponses LLM.
+Implémente l'interface `BaseCache` de LangChain sur SQLite : les réponses sont
+indexées par modèle + paramètres + hash du prompt normalisé, compressées en
+zstd et évincées en LRU au-delà d'une taille maximale. Le cache est activé
+agent par agent via `get_llm(..., cache=True)`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import zstandard
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+_LOG = logging.getLogger(__name__)
+
+_DEFAULT_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+_DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+_STATS_LOG_EVERY = 100
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Cache LLM thread-safe sur disque, borné en taille.
+    Les hits mettent à jour la date d'accès ; l'éviction supprime les entrées
+    les moins récemment utilisées jusqu'à repasser sous la taille maximale.
+    """
+
+    def __init__(self, path: str = _DEFAULT_PATH, max_bytes: int = _DEFAULT_MAX_BYTES,
+                 compression_level: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._hits = 0
+        self._misses = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key         TEXT PRIMARY KEY,
+                value       BLOB NOT NULL,
+                size        INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    # ───────────────────── INTERNAL
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(f"{llm_string}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k, _ in rows])
+            self._total_bytes -= sum(size for _, size in rows)
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+        if (self._hits + self._misses) % _STATS_LOG_EVERY == 0:
+            _LOG.info("Cache LLM: %s", self.stats())
+
+    # ───────────────────── BaseCache
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._record(False)
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._record(True)
+        try:
+            payload = json.loads(self._decompressor.decompress(row[0]))
+            return [loads(g) for g in payload]
+        except Exception as e:
+            _LOG.warning("Entrée de cache LLM illisible, ignorée: %s", e)
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        blob = self._compressor.compress(json.dumps([dumps(g) for g in return_val]).encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()))
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    # ───────────────────── METRICS
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de hits / misses depuis le démarrage et occupation du cache."""
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0,
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_instance: Optional[SQLiteLLMCache] = None
+_instance_lock = threading.Lock()
+
+
+def get_llm_cache() -> SQLiteLLMCache:
+    """Instance partagée du cache, ouverte au premier usage."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = SQLiteLLMCache()
+        return _instance
+
+
+def llm_cache_stats() -> Optional[Dict[str, Any]]:
+    """Statistiques du cache partagé, None s'il n'a pas encore été ouvert."""
+    with _instance_lock:
+        cache = _instance
+    return cache.stats() if cache is not None else None
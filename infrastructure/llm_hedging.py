@@ -0,0 +1,283 @@
+"""
+Appels LLM couverts (hedged requests) et bascule entre fournisseurs.
+Un appel part vers le modèle principal ; s'il n'a pas répondu après un délai
+dérivé du p95 observé, la même requête part vers le modèle suivant et la
+première réponse valide l'emporte. Un disjoncteur par fournisseur écarte
+temporairement celui qui échoue en série. Les taux de couverture et de
+victoire sont journalisés et exposés par `hedging_stats`. Dès qu'une réponse
+l'emporte, les appels perdants qui n'ont pas encore obtenu de jeton du
+limiteur sont abandonnés : ils ne consomment pas le quota du fournisseur.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
+
+from infrastructure.llm_rate_limiter import LLMBackpressureError, LLMCallCancelled, cancel_event
+
+_LOG = logging.getLogger(__name__)
+
+_LATENCY_WINDOW = 200
+_MIN_SAMPLES = 20
+_DEFAULT_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0"))
+_MIN_HEDGE_DELAY = 0.3
+_MAX_HEDGE_DELAY = 10.0
+_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+_STATS_LOG_EVERY = 100
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "16")),
+                               thread_name_prefix="llm-hedge")
+
+
+class LatencyTracker:
+    """Fenêtre glissante des latences réussies d'un modèle."""
+
+    def __init__(self, window: int = _LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < _MIN_SAMPLES:
+                return None
+            return float(np.percentile(np.fromiter(self._samples, dtype=float), q))
+
+    def hedge_delay(self) -> float:
+        p95 = self.percentile(95)
+        if p95 is None:
+            return _DEFAULT_HEDGE_DELAY
+        return min(max(p95, _MIN_HEDGE_DELAY), _MAX_HEDGE_DELAY)
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur d'un fournisseur : ouvert après N échecs consécutifs,
+    puis demi-ouvert après un délai de refroidissement (un seul appel d'essai).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failures: int = _BREAKER_FAILURES, cooldown: float = _BREAKER_COOLDOWN):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                _LOG.info("Disjoncteur LLM %s refermé", self.name)
+            self._state = self.CLOSED
+            self._consecutive = 0
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._consecutive >= self.failures:
+                if self._state != self.OPEN:
+                    _LOG.warning("Disjoncteur LLM %s ouvert (%d échecs)", self.name, self._consecutive)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Appel d'essai terminé sans verdict sur le fournisseur (quota local, annulation) : l'état ne change pas."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+
+_trackers: Dict[Tuple[str, str], LatencyTracker] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def _tracker(provider: str, model: str) -> LatencyTracker:
+    with _registry_lock:
+        return _trackers.setdefault((provider, model), LatencyTracker())
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _registry_lock:
+        return _breakers.setdefault(provider, CircuitBreaker(provider))
+
+
+class HedgedLLM:
+    """
+    Appel couvert sur une liste ordonnée de modèles (principal puis secours).
+
+    Args:
+        name: Nom de l'appel dans les métriques (ex. "router")
+        candidates: Liste de (fournisseur, modèle, instance de chat)
+        validate: Prédicat sur le texte retourné ; une réponse invalide compte comme un échec
+    """
+
+    def __init__(self, name: str, candidates: List[Tuple[str, str, BaseChatModel]],
+                 validate: Optional[Callable[[str], bool]] = None):
+        if not candidates:
+            raise ValueError("HedgedLLM : au moins un modèle est requis")
+        self.name = name
+        self.candidates = candidates
+        self.validate = validate
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedged": 0, "primary_wins": 0, "hedge_wins": 0, "failures": 0}
+
+    # ───────────────────── INTERNAL
+    def _attempt(self, provider: str, model: str, llm: BaseChatModel, payload: Any,
+                 settled: threading.Event) -> str:
+        breaker = get_breaker(provider)
+        start = time.monotonic()
+        # l'appel est abandonné s'il n'a pas encore de jeton quand un autre a déjà répondu
+        token = cancel_event.set(settled)
+        try:
+            if settled.is_set():
+                raise LLMCallCancelled(f"Appel LLM {provider}/{model} devenu inutile")
+            text = llm.invoke(payload).content.strip()
+            if self.validate is not None and not self.validate(text):
+                raise ValueError(f"réponse invalide de {provider}/{model}")
+        except (LLMBackpressureError, LLMCallCancelled):
+            breaker.release()  # quota local saturé ou appel annulé : le fournisseur n'est pas en cause
+            raise
+        except Exception:
+            breaker.failure()
+            raise
+        finally:
+            cancel_event.reset(token)
+        breaker.success()
+        _tracker(provider, model).record(time.monotonic() - start)
+        return text
+
+    def _abandon(self, settled: threading.Event, pending: Dict[Any, int]) -> None:
+        """Les appels perdants non encore partis sont retirés ; ceux en attente de jeton abandonnent."""
+        settled.set()
+        for future, idx in pending.items():
+            if future.cancel():  # jamais exécuté : rend l'éventuel appel d'essai du disjoncteur
+                get_breaker(self.candidates[idx][0]).release()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+            log_now = key == "calls" and self._stats["calls"] % _STATS_LOG_EVERY == 0
+        if log_now:
+            _LOG.info("Hedging LLM %s: %s", self.name, self.stats())
+
+    # ───────────────────── PUBLIC
+    def invoke(self, payload: Any) -> str:
+        """
+        Exécute l'appel couvert et retourne le premier texte valide.
+
+        Raises:
+            RuntimeError: tous les modèles ont échoué ou sont écartés par leur disjoncteur
+        """
+        self._count("calls")
+        settled = threading.Event()
+        pending: Dict[Any, int] = {}
+        queue = list(range(len(self.candidates)))
+        errors: List[str] = []
+
+        def launch_next() -> bool:
+            while queue:
+                idx = queue.pop(0)
+                provider, model, llm = self.candidates[idx]
+                if not get_breaker(provider).allow():
+                    errors.append(f"{provider}: disjoncteur ouvert")
+                    continue
+                pending[_executor.submit(self._attempt, provider, model, llm, payload, settled)] = idx
+                return True
+            return False
+
+        launch_next()
+        while pending:
+            first_idx = min(pending.values())
+            provider, model, _ = self.candidates[first_idx]
+            timeout = _tracker(provider, model).hedge_delay() if queue else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:  # délai de couverture écoulé : on lance le suivant
+                if launch_next():
+                    self._count("hedged")
+                continue
+
+            for future in done:
+                idx = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors.append(f"{self.candidates[idx][0]}: {e}")
+                    continue
+                self._count("primary_wins" if idx == 0 else "hedge_wins")
+                self._abandon(settled, pending)
+                return text
+
+            if not pending:  # tous les appels en vol ont échoué : bascule immédiate
+                launch_next()
+
+        self._count("failures")
+        raise RuntimeError(f"Appel LLM {self.name} impossible : " + "; ".join(errors))
+
+    def as_runnable(self) -> RunnableLambda:
+        """Forme Runnable, composable avec un prompt (`prompt | hedged.as_runnable()`)."""
+        return RunnableLambda(self.invoke, name=f"hedged_{self.name}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        hedged = s["hedged"]
+        s["hedge_rate"] = round(hedged / s["calls"], 3) if s["calls"] else 0.0
+        s["hedge_win_rate"] = round(s["hedge_wins"] / hedged, 3) if hedged else 0.0
+        s["delays"] = {f"{p}/{m}": round(_tracker(p, m).hedge_delay(), 3) for p, m, _ in self.candidates}
+        return s
+
+
+_hedged: Dict[str, HedgedLLM] = {}
+
+
+def register_hedged(hedged: HedgedLLM) -> HedgedLLM:
+    with _registry_lock:
+        _hedged[hedged.name] = hedged
+    return hedged
+
+
+def hedging_stats() -> Dict[str, Any]:
+    """Métriques des appels couverts et état des disjoncteurs."""
+    with _registry_lock:
+        hedged = dict(_hedged)
+        breakers = dict(_breakers)
+    return {
+        "calls": {name: h.stats() for name, h in hedged.items()},
+        "breakers": {name: b.state for name, b in breakers.items()},
+    }
@@ -0,0 +1,228 @@
+"""
+Limitation de débit globale des appels LLM.
+Un seau à jetons par fournisseur (Groq, OpenRouter) est partagé par tous les
+agents. Les appels sont servis par classe de priorité : un tour de chat
+interactif passe toujours avant le travail de fond (génération de quiz,
+d'examens, import de PDF), qui laisse en plus une réserve de jetons au
+trafic interactif. Les modèles obtenus via `get_llm(..., priority=...)`
+reçoivent une vue de ce seau comme `rate_limiter` LangChain.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+_LOG = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+_STATS_LOG_EVERY = 100
+
+# Débits par défaut alignés sur les quotas gratuits (30 req/min Groq, 20 req/min OpenRouter)
+_BUCKET_CONFIG: Dict[str, Dict[str, Any]] = {
+    "groq": {
+        "requests_per_second": float(os.getenv("GROQ_RPS", "0.5")),
+        "burst": int(os.getenv("GROQ_BURST", "5")),
+    },
+    "openrouter": {
+        "requests_per_second": float(os.getenv("OPENROUTER_RPS", "0.33")),
+        "burst": int(os.getenv("OPENROUTER_BURST", "3")),
+    },
+}
+_MAX_QUEUE = {INTERACTIVE: int(os.getenv("LLM_MAX_QUEUE_INTERACTIVE", "64")),
+              BACKGROUND: int(os.getenv("LLM_MAX_QUEUE_BACKGROUND", "256"))}
+_MAX_WAIT = {INTERACTIVE: float(os.getenv("LLM_MAX_WAIT_INTERACTIVE", "30")),
+             BACKGROUND: float(os.getenv("LLM_MAX_WAIT_BACKGROUND", "600"))}
+
+
+class LLMBackpressureError(RuntimeError):
+    """File d'attente du fournisseur saturée ou délai d'attente dépassé : réessayer plus tard."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMCallCancelled(RuntimeError):
+    """Appel abandonné avant d'avoir consommé un jeton (requête couverte déjà servie)."""
+
+
+# Événement d'annulation de l'appel en cours dans ce thread (posé par les appels couverts)
+cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("llm_cancel_event", default=None)
+_CANCEL_POLL = 0.25
+
+
+class PriorityTokenBucket:
+    """
+    Seau à jetons thread-safe avec file d'attente par priorité.
+    Le premier de la file (priorité la plus forte, puis ordre d'arrivée) est
+    le seul autorisé à consommer un jeton ; les appels de fond ne consomment
+    que si le seau garde au moins `background_reserve` jetons pour l'interactif.
+    """
+
+    def __init__(self, name: str, requests_per_second: float, burst: int,
+                 background_reserve: float = 1.0):
+        self.name = name
+        self.rate = requests_per_second
+        self.capacity = float(max(burst, 1))
+        self.background_reserve = min(background_reserve, self.capacity - 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._queued = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._stats = {p: {"acquired": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0}
+                       for p in _PRIORITY_NAMES}
+
+    # ───────────────────── INTERNAL
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _threshold(self, priority: int) -> float:
+        return 1.0 + (self.background_reserve if priority >= BACKGROUND else 0.0)
+
+    def _record(self, priority: int, waited: float) -> None:
+        stats = self._stats[priority]
+        stats["acquired"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        if sum(s["acquired"] for s in self._stats.values()) % _STATS_LOG_EVERY == 0:
+            _LOG.info("Limiteur LLM %s: %s", self.name, self.stats())
+
+    def _reject(self, priority: int, reason: str) -> None:
+        self._stats[priority]["rejected"] += 1
+        retry_after = max(len(self._waiters), 1) / self.rate if self.rate > 0 else 1.0
+        raise LLMBackpressureError(f"Limiteur LLM {self.name} ({_PRIORITY_NAMES[priority]}) : {reason}",
+                                   retry_after=retry_after)
+
+    # ───────────────────── PUBLIC
+    def acquire(self, priority: int = INTERACTIVE, blocking: bool = True) -> bool:
+        """
+        Réserve un jeton pour un appel LLM.
+
+        Args:
+            priority: INTERACTIVE ou BACKGROUND
+            blocking: Attendre un jeton (True) ou répondre immédiatement (False)
+
+        Returns:
+            True si un jeton a été obtenu ; False en mode non bloquant sinon
+
+        Raises:
+            LLMBackpressureError: file saturée ou attente supérieure au plafond de la priorité
+            LLMCallCancelled: l'événement `cancel_event` du contexte a été levé pendant l'attente
+        """
+        start = time.monotonic()
+        cancel = cancel_event.get()
+        if cancel is not None and cancel.is_set():
+            raise LLMCallCancelled(f"Appel LLM {self.name} annulé")
+        with self._cond:
+            self._refill()
+            if not self._waiters and self._tokens >= self._threshold(priority):
+                self._tokens -= 1
+                self._record(priority, 0.0)
+                return True
+            if not blocking:
+                return False
+            if self._queued[priority] >= _MAX_QUEUE[priority]:
+                self._reject(priority, "file d'attente saturée")
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            self._queued[priority] += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry and self._tokens >= self._threshold(priority):
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        break
+                    if cancel is not None and cancel.is_set():
+                        self._waiters.remove(entry)
+                        heapq.heapify(self._waiters)
+                        raise LLMCallCancelled(f"Appel LLM {self.name} annulé")
+                    waited = time.monotonic() - start
+                    if waited >= _MAX_WAIT[priority]:
+                        self._waiters.remove(entry)
+                        heapq.heapify(self._waiters)
+                        self._reject(priority, f"attente > {_MAX_WAIT[priority]:.0f}s")
+                    missing = self._threshold(priority) - self._tokens
+                    timeout = max(missing / self.rate, 0.01) if self.rate > 0 else 1.0
+                    if cancel is not None:
+                        timeout = min(timeout, _CANCEL_POLL)
+                    self._cond.wait(min(timeout, _MAX_WAIT[priority] - waited))
+            finally:
+                self._queued[priority] -= 1
+                self._cond.notify_all()
+
+            self._record(priority, time.monotonic() - start)
+            return True
+
+    def for_priority(self, priority: int) -> "PriorityRateLimiter":
+        return PriorityRateLimiter(self, priority)
+
+    def stats(self) -> Dict[str, Any]:
+        """Jetons disponibles, profondeur de file et temps d'attente par priorité."""
+        with self._cond:
+            self._refill()
+            result: Dict[str, Any] = {"tokens": round(self._tokens, 2), "queued": len(self._waiters)}
+            for priority, name in _PRIORITY_NAMES.items():
+                s = self._stats[priority]
+                result[name] = {
+                    "acquired": s["acquired"],
+                    "rejected": s["rejected"],
+                    "queued": self._queued[priority],
+                    "wait_avg": round(s["wait_total"] / s["acquired"], 3) if s["acquired"] else 0.0,
+                    "wait_max": round(s["wait_max"], 3),
+                }
+            return result
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Vue d'un seau à une priorité donnée, branchée comme `rate_limiter` d'un modèle LangChain."""
+
+    def __init__(self, bucket: PriorityTokenBucket, priority: int):
+        self.bucket = bucket
+        self.priority = priority
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        return self.bucket.acquire(self.priority, blocking)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        # l'attente est bornée par le seau ; on la sort de la boucle d'événements
+        if not blocking:
+            return self.bucket.acquire(self.priority, blocking=False)
+        return await asyncio.to_thread(self.bucket.acquire, self.priority, True)
+
+
+_buckets: Dict[str, PriorityTokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> Optional[PriorityTokenBucket]:
+    """Seau partagé du fournisseur, ou None si aucun débit n'est configuré."""
+    with _buckets_lock:
+        if provider not in _buckets:
+            conf = _BUCKET_CONFIG.get(provider)
+            if not conf or conf["requests_per_second"] <= 0:
+                return None
+            _buckets[provider] = PriorityTokenBucket(provider, **conf)
+        return _buckets[provider]
+
+
+def rate_limiter_stats() -> Dict[str, Any]:
+    """Métriques de tous les seaux ouverts."""
+    with _buckets_lock:
+        buckets = dict(_buckets)
+    return {name: bucket.stats() for name, bucket in buckets.items()}
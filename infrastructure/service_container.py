@@ -0,0 +1,175 @@
+"""
+Conteneur de services à construction paresseuse.
+Les agents et clients lourds (modèle d'embedding, connexions Qdrant, LLM)
+sont déclarés au chargement des modules mais construits au premier usage,
+ou préchauffés en arrière-plan une fois que le serveur accepte les requêtes.
+`register` retourne un mandataire : le code appelant garde ses globales
+de module (`course_agent.detect_operation(...)`) sans rien savoir du délai.
+Les services déclarés `required` sont préchauffés en premier et conditionnent
+`ready()` (endpoint /ready).
+SERVICES_EAGER=1 rétablit la construction à l'import (utile au benchmark).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_LOG = logging.getLogger(__name__)
+
+_EAGER = os.getenv("SERVICES_EAGER", "0").lower() in {"1", "true", "yes"}
+
+PENDING, BUILDING, READY, FAILED = "pending", "building", "ready", "failed"
+
+
+class _Service:
+    __slots__ = ("name", "factory", "warm", "required", "instance", "state", "error", "seconds", "lock")
+
+    def __init__(self, name: str, factory: Callable[[], Any], warm: bool, required: bool):
+        self.name = name
+        self.factory = factory
+        self.warm = warm or required
+        self.required = required
+        self.instance: Any = None
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+class LazyService:
+    """Mandataire d'un service : le premier accès à un attribut construit l'instance."""
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: "ServiceContainer", name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._container.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._container.get(self._name), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<LazyService {self._name} ({self._container.state(self._name)})>"
+
+
+class ServiceContainer:
+    """Registre thread-safe : chaque service est construit une seule fois, par le premier appelant."""
+
+    def __init__(self, eager: bool = _EAGER):
+        self.eager = eager
+        self._services: Dict[str, _Service] = {}
+        self._lock = threading.Lock()
+        self._warm_thread: Optional[threading.Thread] = None
+
+    # ───────────────────── PUBLIC
+    def register(self, name: str, factory: Callable[[], Any], warm: bool = True,
+                 required: bool = False) -> LazyService:
+        """
+        Déclare un service et retourne son mandataire.
+
+        Args:
+            name: Nom unique du service
+            factory: Constructeur sans argument (classe, getter de singleton, lambda)
+            warm: Construire ce service pendant le préchauffage d'arrière-plan
+            required: Le worker n'est prêt qu'une fois ce service construit
+        """
+        with self._lock:
+            if name not in self._services:
+                self._services[name] = _Service(name, factory, warm, required)
+        if self.eager:
+            self.get(name)
+        return LazyService(self, name)
+
+    def lazy(self, name: str) -> LazyService:
+        """Mandataire d'un service déjà déclaré (ailleurs)."""
+        if name not in self._services:
+            raise KeyError(f"Service inconnu : {name}")
+        return LazyService(self, name)
+
+    def get(self, name: str) -> Any:
+        """Instance du service, construite au premier appel (les appels concurrents l'attendent)."""
+        service = self._services[name]
+        if service.state == READY:
+            return service.instance
+        with service.lock:
+            if service.state != READY:
+                service.state = BUILDING
+                start = time.perf_counter()
+                try:
+                    service.instance = service.factory()
+                except Exception as e:
+                    service.state, service.error = FAILED, str(e)
+                    _LOG.error("Service %s : échec de construction (%s)", name, e)
+                    raise
+                service.seconds = time.perf_counter() - start
+                service.state, service.error = READY, None
+                _LOG.info("Service %s construit en %.2fs", name, service.seconds)
+        return service.instance
+
+    def state(self, name: str) -> str:
+        return self._services[name].state
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Optional[float]]:
+        """
+        Construit les services (par défaut ceux marqués `warm`, les `required`
+        d'abord, puis dans l'ordre de déclaration) ; un échec est journalisé
+        sans interrompre les suivants.
+
+        Returns:
+            Durée de construction par service (None en cas d'échec)
+        """
+        with self._lock:
+            targets: List[str] = list(names) if names is not None else \
+                [s.name for s in sorted(self._services.values(), key=lambda s: not s.required) if s.warm]
+        durations: Dict[str, Optional[float]] = {}
+        for name in targets:
+            try:
+                self.get(name)
+            except Exception:
+                pass
+            durations[name] = self._services[name].seconds
+        return durations
+
+    def start_warm_up(self, names: Optional[Iterable[str]] = None) -> threading.Thread:
+        """Lance `warm_up` dans un thread démon (sauf s'il tourne déjà) et le retourne."""
+        with self._lock:
+            if self._warm_thread is None or not self._warm_thread.is_alive():
+                self._warm_thread = threading.Thread(target=self._warm_and_log, args=(names,),
+                                                     name="services-warmup", daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
+
+    def ready(self) -> bool:
+        """Tous les services `required` sont construits."""
+        with self._lock:
+            return all(s.state == READY for s in self._services.values() if s.required)
+
+    def warming(self) -> bool:
+        with self._lock:
+            return self._warm_thread is not None and self._warm_thread.is_alive()
+
+    def status(self) -> Dict[str, Any]:
+        """État et durée de construction de chaque service."""
+        with self._lock:
+            services = list(self._services.values())
+        return {s.name: {"state": s.state,
+                         "required": s.required,
+                         "seconds": round(s.seconds, 3) if s.seconds is not None else None,
+                         **({"error": s.error} if s.error else {})}
+                for s in services}
+
+    # ───────────────────── INTERNAL
+    def _warm_and_log(self, names: Optional[Iterable[str]]) -> None:
+        start = time.perf_counter()
+        durations = self.warm_up(names)
+        _LOG.info("Préchauffage des services terminé en %.2fs : %s",
+                  time.perf_counter() - start,
+                  {k: round(v, 2) if v is not None else "échec" for k, v in durations.items()})
+
+
+services = ServiceContainer()
@@ -1,48 +1,34 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from features.cours_management.api import router as cours_router
 from features.user_management.api import router as auth_router
-from features.common.websocket_manager import websocket_endpoint
+from features.common.websocket_manager import websocket_endpoint, hub
 from features.cours_management.agents.schedule_agent import ScheduleAgent
 from features.common.reminder_api import router as ws_router
-from features.common.reminder_api import schedule_reminder
+from features.common.reminder_api import load_reminders, release_reminders, scheduler as reminder_scheduler
+from infrastructure.service_container import services
 
-import requests
 import asyncio
-from datetime import datetime, timezone
+import os
 
 # 🔄 Gestion du cycle de vie (startup/shutdown)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("🔁 [Startup] Loading reminders from Oracle APEX...")
-    now = datetime.now(timezone.utc)
-
-    try:
-
-            url = f"https://apex.oracle.com/pls/apex/naxxum/elearning/reminderbyuser/1"
-            resp = requests.get(url, headers={
-                "Content-Type": "application/json",
-                "User-Agent": "Mozilla/5.0"
-            }, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            items = data.get("items", data)
-
-            for r in items:
-                if r.get("status") == "active":
-                    reminder_time = datetime.fromisoformat(r["reminder_time"])
-                    delay = (reminder_time - now).total_seconds()
-                    if delay > 0:
-                        print(f"⏳ Scheduling reminder for user {r['user_id']} in {delay:.2f} seconds...")
-                        asyncio.create_task(schedule_reminder(r["user_id"], r["session_id"], delay))
-                    else:
-                        print(f"⚠️ Missed reminder for user {r['user_id']} (past time)")
-    except Exception as e:
-        print(f"🔥 Error loading reminders: {str(e)}")
+    # rien de bloquant ici : le serveur accepte les requêtes tout de suite,
+    # rappels APEX et construction des agents se font en arrière-plan
+    await hub.start()
+    await reminder_scheduler.start()
+    reminders = asyncio.create_task(load_reminders())
+    services.start_warm_up()
 
     yield
+    reminders.cancel()
+    await release_reminders()
+    await reminder_scheduler.stop()
+    await hub.stop()
     print("👋 [Shutdown] Application stopped.")
 
 
@@ -64,7 +50,29 @@ app.include_router(auth_router, prefix='/api')
 app.include_router(cours_router)
 app.websocket("/ws")(websocket_endpoint)
 
+
+# ────────────────────── Readiness ──────────────────────
+@app.get("/ready")
+async def ready():
+    """
+    Sonde de disponibilité pour le load balancer : 200 seulement quand les
+    services requis (modèle d'embedding préchauffé) sont construits, 503 sinon.
+    Distincte de /courses/qdrant_status, qui décrit l'état de Qdrant.
+    """
+    if services.ready():
+        return {"ready": True}
+    failed = [name for name, s in services.status().items() if s["required"] and s["state"] == "failed"]
+    if failed and not services.warming():
+        services.start_warm_up(failed)  # nouvelle tentative, en arrière-plan
+    return JSONResponse(status_code=503, content={
+        "ready": False,
+        "services": {name: s for name, s in services.status().items() if s["required"]},
+    })
+
 # ────────────────────── Launch ──────────────────────
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
+    # ping/pong WebSocket du serveur : détecte les clients partis (voir websocket_manager)
+    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info",
+                ws_ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+                ws_ping_timeout=float(os.getenv("WS_PING_TIMEOUT", "20")))